@@ -0,0 +1,175 @@
+"""dag_parse_benchmark.py: Measures the per-phase parse time of the dags generated from the valid DSL payload
+                           fixtures and from synthetic payloads, and compares the timings to a saved baseline"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+import synthetic_payloads
+
+BENCHMARK_DIR = os.path.dirname(Path(__file__))
+DIR_DAGS_VALID = os.path.join(BENCHMARK_DIR, "..", "unit", "dag", "payloads", "valid")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "dag_parse_baseline.json")
+PHASES = ['generation', 'file_io', 'module_import', 'operator_construction', 'test_cycle']
+
+
+def measure_phases(payload):
+    """
+    Measures the parse phases of a single dag; executed in a fresh interpreter so that the module import
+    phase includes the cold import of Airflow and of the operator modules used by the dag.
+    Args:
+        payload (dict): the JSON DSL payload of the dag
+    Returns:
+        a dict of phase name to elapsed seconds
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    from composer.dag import dag_generator
+    dag_data = dag_generator.DagGenerator(payload).generate_dag()
+    timings['generation'] = time.perf_counter() - start
+
+    # the scheduler reads the dag file, and the template reads the json file, before anything is executed
+    start = time.perf_counter()
+    for generated_file in dag_data.values():
+        if generated_file:
+            with open(generated_file, 'rb') as f:
+                f.read()
+    timings['file_io'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from airflow import models
+    from composer.dag import dag_validator
+    validator = dag_validator.DagValidator(dag_data['dag_file'])
+    validator.load_dag_module()
+    cold_load = time.perf_counter() - start
+
+    # a second load only constructs the dag and its operators, the imported modules are already cached
+    start = time.perf_counter()
+    dag_module = validator.load_dag_module()
+    timings['operator_construction'] = time.perf_counter() - start
+    timings['module_import'] = max(cold_load - timings['operator_construction'], 0.0)
+
+    start = time.perf_counter()
+    for dag in vars(dag_module).values():
+        if isinstance(dag, models.DAG):
+            dag.test_cycle()
+    timings['test_cycle'] = time.perf_counter() - start
+    return timings
+
+
+def run_in_subprocess(payload, repeat):
+    """
+    Measures the parse phases of a dag in repeat fresh interpreters.
+    Args:
+        payload (dict): the JSON DSL payload of the dag
+        repeat (int): the number of fresh interpreters
+    Returns:
+        a dict of phase name to the median elapsed seconds
+    """
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, __file__, '--measure'],
+            input=json.dumps(payload),
+            check=True,
+            capture_output=True,
+            text=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {phase: round(statistics.median(run[phase] for run in runs), 6) for phase in PHASES}
+
+
+def load_payloads(synthetic_tasks):
+    """
+    Loads the valid payload fixtures and builds a synthetic payload for each requested task count.
+    Args:
+        synthetic_tasks (list): the task counts of the synthetic payloads
+    Returns:
+        a dict of payload name to payload
+    """
+    payloads = {}
+    for payload_file in sorted(os.listdir(DIR_DAGS_VALID)):
+        if payload_file.endswith(".json"):
+            with open(os.path.join(DIR_DAGS_VALID, payload_file)) as f:
+                payloads[payload_file] = json.load(f)
+    for tasks in synthetic_tasks:
+        name = f"synthetic_{tasks}_tasks"
+        payloads[name] = synthetic_payloads.build_payload(name, tasks)
+    return payloads
+
+
+def compare_to_baseline(results, baseline, threshold, min_delta):
+    """
+    Compares the phase timings of a run to a baseline. A phase regresses when it is slower than the baseline
+    by more than threshold (relative) and by more than min_delta seconds (absolute), which ignores the noise
+    of very short phases.
+    Args:
+        results (dict): payload name to phase timings of the current run
+        baseline (dict): payload name to phase timings of the baseline
+        threshold (float): the allowed relative slowdown, 0.25 == 25%
+        min_delta (float): the allowed absolute slowdown in seconds
+    Returns:
+        a list of regression descriptions, empty when no phase regressed
+    """
+    regressions = []
+    for name, timings in results.items():
+        if name not in baseline:
+            continue
+        for phase in PHASES:
+            previous = baseline[name].get(phase)
+            if previous is None:
+                continue
+            current = timings[phase]
+            if current > previous * (1 + threshold) and current - previous > min_delta:
+                regressions.append(f"{name} {phase}: {previous:.6f}s -> {current:.6f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--tasks', type=int, nargs='*', default=[100, 1000],
+                        help='task counts of the synthetic payloads')
+    parser.add_argument('--repeat', type=int, default=3, help='number of fresh interpreters per payload')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='path of the baseline json file')
+    parser.add_argument('--update-baseline', action='store_true', help='saves the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative slowdown of a phase')
+    parser.add_argument('--min-delta', type=float, default=0.005, help='allowed absolute slowdown of a phase')
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure_phases(json.load(sys.stdin))))
+        return
+
+    try:
+        import airflow
+    except ImportError:
+        sys.exit("Airflow is required to measure the parse time of a dag.")
+
+    results = {name: run_in_subprocess(payload, args.repeat) for name, payload in load_payloads(args.tasks).items()}
+    print(json.dumps(results, indent=4))
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+        print(f"Saved baseline: {args.baseline}")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(results, baseline, args.threshold, args.min_delta)
+    if regressions:
+        print("Phase regressions against the baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("No phase regressed against the baseline.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""import_time_benchmark.py: Measures the cold import time of the dags generated from the valid DSL payload fixtures"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from composer.dag import dag_generator
+
+DIR_DAGS_VALID = os.path.join(os.path.dirname(Path(__file__)), "..", "unit", "dag", "payloads", "valid")
+KUBERNETES_MODULE = "airflow.contrib.operators.kubernetes_pod_operator"
+
+# imports a dag file in a fresh interpreter, so that every measurement includes the cold imports of the dag
+IMPORT_DAG = f"""
+import importlib.util
+import json
+import sys
+import time
+start = time.perf_counter()
+if sys.argv[1]:
+    spec = importlib.util.spec_from_file_location('benchmark_dag', sys.argv[1])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+else:
+    import airflow
+print(json.dumps({{
+    'seconds': time.perf_counter() - start,
+    'modules': len(sys.modules),
+    'kubernetes_imported': '{KUBERNETES_MODULE}' in sys.modules
+}}))
+"""
+
+
+def import_dag(dag_file, repeat):
+    """
+    Imports a dag file in repeat fresh interpreters.
+    Args:
+        dag_file (string): the path to the dag file, or an empty string to only import airflow
+        repeat (int): the number of fresh interpreters
+    Returns:
+        a dict containing the median import time in seconds, the number of loaded modules and
+        whether the kubernetes pod operator was imported
+    """
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_DAG, dag_file],
+            check=True,
+            capture_output=True,
+            text=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'seconds': round(statistics.median(run['seconds'] for run in runs), 4),
+        'modules': runs[-1]['modules'],
+        'kubernetes_imported': runs[-1]['kubernetes_imported']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5, help='number of fresh interpreters per measurement')
+    args = parser.parse_args()
+
+    results = {'airflow_only': import_dag("", args.repeat), 'payloads': {}}
+    for payload_file in sorted(os.listdir(DIR_DAGS_VALID)):
+        if not payload_file.endswith(".json"):
+            continue
+        with open(os.path.join(DIR_DAGS_VALID, payload_file)) as f:
+            payload = json.load(f)
+        results['payloads'][payload_file] = {
+            'template': import_dag(dag_generator.DagGenerator(payload).generate_dag()['dag_file'], args.repeat),
+            'compiled': import_dag(
+                dag_generator.DagGenerator(payload, compiled=True).generate_dag()['dag_file'],
+                args.repeat
+            )
+        }
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == '__main__':
+    main()
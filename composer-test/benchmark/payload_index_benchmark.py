@@ -0,0 +1,114 @@
+"""payload_index_benchmark.py: Compares the payload key lookups of dag_template.py before and after the
+                               single-pass payload index, on a synthetic 5,000 task payload"""
+
+import argparse
+import ast
+import json
+import os
+import time
+from pathlib import Path
+import synthetic_payloads
+
+DAG_TEMPLATE = os.path.join(os.path.dirname(Path(__file__)), "..", "..", "composer", "dag", "dag_template.py")
+
+# the keys looked up over the whole payload by each parse of the template
+DAG_LOOKUPS = [
+    'default_args', 'retry_delay', 'start_date', 'schedule_interval', 'dagrun_timeout',
+    'bash_operators', 'python_operators', 'kubernetes_pod_operators',
+    'bash_operators', 'python_operators', 'kubernetes_pod_operators',
+    'execution_sequence', 'dependencies'
+]
+
+
+def find_key_in_dict(key, dictionary):
+    """The recursive key search used by dag_template.py before the payload index was introduced."""
+    for k, v in dictionary.items():
+        if k == key:
+            yield v
+        elif isinstance(v, dict):
+            for result in find_key_in_dict(key, v):
+                yield result
+        elif isinstance(v, list):
+            for d in v:
+                if isinstance(d, dict):
+                    for result in find_key_in_dict(key, d):
+                        yield result
+
+
+def load_index_payload():
+    """Loads index_payload from dag_template.py without executing the template (which requires Airflow)."""
+    with open(DAG_TEMPLATE) as f:
+        tree = ast.parse(f.read())
+    functions = [node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == 'index_payload']
+    namespace = {}
+    exec(compile(ast.Module(body=functions, type_ignores=[]), DAG_TEMPLATE, 'exec'), namespace)
+    return namespace['index_payload']
+
+
+def secret_lookup_count(payload):
+    return sum(
+        len(operator.get('pod_secret_refs', [])) + len(operator.get('image_pull_secret_refs', []))
+        for operator in payload.get('kubernetes_pod_operators', [])
+    )
+
+
+def legacy_lookups(payload):
+    for key in DAG_LOOKUPS:
+        list(find_key_in_dict(key, payload))
+    for _ in range(secret_lookup_count(payload)):
+        list(find_key_in_dict('kubernetes_secrets', payload))
+
+
+def indexed_lookups(index_payload, payload):
+    payload_index = index_payload(payload)
+    for key in DAG_LOOKUPS:
+        key in payload_index
+    for _ in range(secret_lookup_count(payload)):
+        'kubernetes_secrets' in payload_index
+
+
+def time_it(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def time_dag_parse(payload):
+    """Times a full parse of the generated dag, only possible when Airflow is installed."""
+    try:
+        from composer.dag import dag_generator, dag_validator
+    except ImportError:
+        return None
+    dag_data = dag_generator.DagGenerator(payload).generate_dag()
+    start = time.perf_counter()
+    dag_validator.DagValidator(dag_data['dag_file']).load_dag_module()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=5000, help='number of tasks of the synthetic payload')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed repetitions, the best is reported')
+    args = parser.parse_args()
+
+    payload = synthetic_payloads.build_payload('payload_index_benchmark', args.tasks)
+    index_payload = load_index_payload()
+
+    legacy = time_it(lambda: legacy_lookups(payload), args.repeat)
+    indexed = time_it(lambda: indexed_lookups(index_payload, payload), args.repeat)
+    results = {
+        'tasks': args.tasks,
+        'payload_bytes': len(json.dumps(payload)),
+        'find_key_in_dict_seconds': round(legacy, 6),
+        'payload_index_seconds': round(indexed, 6),
+        'speedup': round(legacy / indexed, 1),
+        'dag_parse_seconds': time_dag_parse(payload)
+    }
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""sidecar_format_benchmark.py: Compares the bucket bytes and the parse time of the sidecar formats of the json data
+                                file of a dag, on synthetic payloads"""
+
+import argparse
+import importlib.util
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+import synthetic_payloads
+from composer.dag import dag_generator
+
+
+def get_sidecar_formats():
+    """Gets the sidecar formats which can be benchmarked, msgpack is only benchmarked when it is installed."""
+    return [
+        sidecar_format for sidecar_format in dag_generator.DagGenerator.SIDECAR_FORMATS
+        if sidecar_format != 'msgpack' or importlib.util.find_spec('msgpack') is not None
+    ]
+
+
+def time_loader(generator, repeat):
+    """
+    Times the payload loader which the generated dag executes each time it is parsed by the Airflow scheduler.
+    Args:
+        generator (DagGenerator): the generator of the dag, whose files have been written
+        repeat (int): the number of timed repetitions, the best is reported
+    Returns:
+        the best elapsed seconds of the loader
+    """
+    loader = compile("".join(generator.render_payload_loader()), generator.dag_file, 'exec')
+    timings = []
+    for _ in range(repeat):
+        namespace = {'os': os, 'json': json, 'Path': Path, '__file__': generator.dag_file}
+        start = time.perf_counter()
+        exec(loader, namespace)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, nargs='*', default=[1000, 10000],
+                        help='task counts of the synthetic payloads')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed repetitions, the best is reported')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workspace_dir:
+        for task_count in args.tasks:
+            payload = synthetic_payloads.build_payload('sidecar_format_benchmark', task_count)
+            for sidecar_format in get_sidecar_formats():
+                generator = dag_generator.DagGenerator(
+                    payload,
+                    workspace_dir=workspace_dir,
+                    sidecar_format=sidecar_format
+                )
+                generator.generate_dag()
+                results.append({
+                    'tasks': task_count,
+                    'sidecar_format': sidecar_format,
+                    'sidecar_bytes': os.path.getsize(generator.json_file),
+                    'parse_seconds': round(time_loader(generator, args.repeat), 6)
+                })
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == '__main__':
+    main()
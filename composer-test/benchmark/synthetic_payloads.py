@@ -0,0 +1,90 @@
+"""synthetic_payloads.py: Builds synthetic JSON DSL payloads of a configurable size for the benchmarks"""
+
+SECRET_COUNT = 5
+
+
+def build_kubernetes_secrets():
+    return {
+        f"secret_{i:02d}": {
+            "deploy_type": "env",
+            "deploy_target": f"SECRET_{i:02d}",
+            "secret": "airflow-secrets",
+            "key": f"key_{i:02d}"
+        }
+        for i in range(SECRET_COUNT)
+    }
+
+
+def build_bash_operator(i):
+    return {
+        "task_id": f"bash_operator_{i:05d}",
+        "command": [f"echo 'Hello from synthetic Bash Operator {i}'"]
+    }
+
+
+def build_python_operator(i):
+    return {
+        "task_id": f"python_operator_{i:05d}",
+        "function_def": [
+            f"def python_operator_func_{i}():",
+            f"   print('Hello from synthetic Python Operator {i}')"
+        ],
+        "function_name": f"python_operator_func_{i}"
+    }
+
+
+def build_kubernetes_pod_operator(i):
+    return {
+        "task_id": f"k8s_pod_operator_{i:05d}",
+        "name": f"k8s-pod-{i:05d}",
+        "image": "bash",
+        "cmds": ["echo"],
+        "arguments": [f"'Hello from synthetic Kubernetes Pod Operator {i}'"],
+        "env_vars": {"INDEX": str(i)},
+        "pod_secret_refs": [f"secret_{s:02d}" for s in range(SECRET_COUNT)]
+    }
+
+
+def build_payload(dag_name, task_count, execution_sequence=True):
+    """
+    Builds a synthetic payload with task_count tasks, split evenly between bash, python and kubernetes pod operators.
+    Args:
+        dag_name (string): the name of the dag
+        task_count (int): the total number of tasks of the dag
+        execution_sequence (bool): chains every task of the dag in an execution_sequence when True
+    Returns:
+        a dict containing the JSON DSL payload
+    """
+    bash_operators = [build_bash_operator(i) for i in range(0, task_count, 3)]
+    python_operators = [build_python_operator(i) for i in range(1, task_count, 3)]
+    kubernetes_pod_operators = [build_kubernetes_pod_operator(i) for i in range(2, task_count, 3)]
+
+    payload = {
+        "dag_name": dag_name,
+        "mode": "INLINE",
+        "default_args": {
+            "owner": "Composer Benchmark",
+            "retries": 1
+        },
+        "dynamic_functions": {
+            "retry_delay": {
+                "retry_delay_def": [
+                    "def retry_delay_func():",
+                    "   import datetime",
+                    "   return datetime.timedelta(minutes=5)"
+                ],
+                "retry_delay_name": "retry_delay_func"
+            }
+        },
+        "kubernetes_secrets": build_kubernetes_secrets()
+    }
+    if bash_operators:
+        payload["bash_operators"] = bash_operators
+    if python_operators:
+        payload["python_operators"] = python_operators
+    if kubernetes_pod_operators:
+        payload["kubernetes_pod_operators"] = kubernetes_pod_operators
+    if execution_sequence:
+        operators = bash_operators + python_operators + kubernetes_pod_operators
+        payload["execution_sequence"] = [operator["task_id"] for operator in operators]
+    return payload
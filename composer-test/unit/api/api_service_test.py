@@ -1,9 +1,14 @@
+import base64
+import hashlib
 import json
 import os
+import shutil
 import pytest
 from pathlib import Path
 from unittest import TestCase, main, mock
 from composer.api import api_service
+from composer.utils import workspace_service, timing_service
+from composer.dag import dag_serializer, dag_validator, dag_validator_pool
 
 
 class ApiServiceTests(TestCase):
@@ -61,6 +66,322 @@ class ApiServiceTests(TestCase):
         assert 'is_valid' in dag_details
         assert 'dag_definition' in dag_details
 
+    @staticmethod
+    def test_validate_dag_gcs_cached():
+        test_dag = os.path.join(os.path.dirname(Path(__file__)), 'static', 'dag_workflow_simple.py')
+        api_service.validation_cache.memory_cache.entries.clear()
+        with mock.patch('composer.dag.dag_validator.DagValidator.inspect_dag', autospec=True,
+                        return_value='{"dag_id": "dag_workflow_simple"}') as mock_inspect_dag:
+            dag_details = api_service.validate_dag('GCS', test_dag)
+            # the same file contents are not validated again, whatever the mode
+            assert api_service.validate_dag('GIT', test_dag) == dag_details
+            assert mock_inspect_dag.call_count == 1
+            # a different Airflow version does not reuse the validation
+            with mock.patch('composer.dag.dag_validator.get_airflow_version', return_value='0.0.0'):
+                api_service.validate_dag('GCS', test_dag)
+            assert mock_inspect_dag.call_count == 2
+        assert dag_details['dag_definition'] == '{"dag_id": "dag_workflow_simple"}'
+
+    @staticmethod
+    def test_validate_dag_gcs_view():
+        test_dag = os.path.join(os.path.dirname(Path(__file__)), 'static', 'dag_workflow_simple.py')
+        view = dag_serializer.get_view('task_id,upstream,downstream', 0, 1)
+        dag_details = api_service.validate_dag('GCS', test_dag, view=view)
+        dag_definition = json.loads(dag_details['dag_definition'])
+        assert len(dag_definition['tasks_details']) == 1
+        assert set(dag_definition['tasks_details'][0]) == {'task_id', 'upstream', 'downstream'}
+        # the dag definition json string is written to the response as is
+        dag_details['next_actions'] = {'deploy': '/api/v1/dag/deploy'}
+        assert json.loads("".join(api_service.stream_dag_details(dag_details))) == {
+            'is_valid': True,
+            'next_actions': {'deploy': '/api/v1/dag/deploy'},
+            'dag_definition': dag_definition
+        }
+
+    @staticmethod
+    def test_validate_dag_gcs_streamed():
+        test_dag = os.path.join(os.path.dirname(Path(__file__)), 'static', 'dag_workflow_simple.py')
+        api_service.validation_cache.memory_cache.entries.clear()
+        dag_details = api_service.validate_dag('GCS', test_dag, stream=True)
+        assert not isinstance(dag_details['dag_definition'], str)
+        # the dag definition is only cached once it has been streamed entirely
+        assert not api_service.validation_cache.memory_cache.entries
+        streamed_details = json.loads("".join(api_service.stream_dag_details(dag_details)))
+        with mock.patch('composer.dag.dag_validator.DagValidator.iter_inspect_dag') as mock_iter_inspect_dag:
+            cached_details = api_service.validate_dag('GCS', test_dag, stream=True)
+            mock_iter_inspect_dag.assert_not_called()
+        assert streamed_details == {
+            'is_valid': True,
+            'dag_definition': json.loads(cached_details['dag_definition'])
+        }
+
+    @staticmethod
+    def test_validate_dag_inline_cached():
+        payload = {
+            'dag_name': 'test_validate_dag_inline_cached',
+            'mode': 'INLINE',
+            'bash_operators': [{'task_id': 'bash_operator_01', 'command': ['echo 01']}]
+        }
+        dag_details = api_service.validate_dag('INLINE', payload)
+        with mock.patch('composer.dag.dag_validator.DagValidator.inspect_dag') as mock_inspect_dag:
+            # a payload which renders the same dag is not validated again, even in another location
+            assert api_service.validate_dag('INLINE', dict(payload, project_id='mock_project_id')) == dag_details
+            mock_inspect_dag.assert_not_called()
+
+    @staticmethod
+    def test_validate_dag_batch():
+        static_dir = os.path.join(os.path.dirname(Path(__file__)), 'static')
+
+        def git_clone(git_url, repo_dir, file_path, workspace_dir=None):
+            shutil.copytree(static_dir, os.path.join(workspace_dir, repo_dir))
+
+        git_payload = {
+            'dag_name': 'dag_workflow_simple',
+            'mode': 'GIT',
+            'git_url': 'mock_git_url',
+            'repo_name': 'mock_repo',
+            'file_path': 'dag_workflow_simple.py'
+        }
+        payloads = [
+            {
+                'dag_name': 'test_validate_dag_batch',
+                'mode': 'INLINE',
+                'bash_operators': [{'task_id': 'bash_operator_01', 'command': ['echo 01']}]
+            },
+            {'dag_name': 'test_validate_dag_batch_invalid', 'mode': 'INLINE', 'bash_operators': [{'task_id': 'a'}]},
+            {
+                'dag_name': 'dag_workflow_simple',
+                'mode': 'GCS',
+                'project_id': 'mock_project_id',
+                'location': 'mock_gcp_location',
+                'composer_environment': 'mock_composer_environment',
+                'bucket_name': 'mock_bucket',
+                'file_path': 'dags/dag_workflow_simple.py'
+            },
+            git_payload,
+            git_payload,
+            ['not a payload']
+        ]
+        with workspace_service.workspace() as workspace_dir, \
+                mock.patch('composer.api.api_service.gcs_download_file',
+                           return_value=os.path.join(static_dir, 'dag_workflow_simple.py')), \
+                mock.patch('composer.api.api_service.git_download_file', side_effect=git_clone) as mock_git:
+            batch_details = api_service.validate_dag_batch(payloads, workspace_dir)
+            lines = "".join(api_service.stream_dag_batch(batch_details)).splitlines()
+            # the repository of the GIT payloads is only cloned once
+            assert mock_git.call_count == 1
+
+        results = sorted((json.loads(line) for line in lines), key=lambda result: result['index'])
+        assert [result['is_valid'] for result in results] == [True, False, True, True, True, False]
+        # the dag definitions are embedded in the lines as json
+        assert results[0]['dag_definition']['dag_id'] == 'test_validate_dag_batch'
+        assert results[1]['dag_name'] == 'test_validate_dag_batch_invalid' and 'error' in results[1]
+        assert results[3]['dag_definition'] == results[4]['dag_definition']
+        assert results[5]['dag_name'] is None
+
+    @staticmethod
+    def test_validate_dag_timings():
+        payload = {
+            'dag_name': 'test_validate_dag_timings',
+            'mode': 'INLINE',
+            'bash_operators': [{'task_id': 'bash_operator_01', 'command': ['echo 01']}]
+        }
+        api_service.validation_cache.memory_cache.entries.clear()
+        api_service.rendered_dag_cache.entries.clear()
+        timing_service.start_timings()
+        try:
+            api_service.validate_dag('INLINE', payload)
+            timings = timing_service.get_timings()
+        finally:
+            timing_service.stop_timings()
+        assert [elem['phase'] for elem in timings['phases']] == [
+            'static_validation', 'generation', 'module_import', 'cycle_test', 'inspect_serialization'
+        ]
+
+    @staticmethod
+    def test_validate_dag_timings_streamed():
+        payload = {
+            'dag_name': 'test_validate_dag_timings_streamed',
+            'mode': 'INLINE',
+            'bash_operators': [{'task_id': 'bash_operator_01', 'command': ['echo 01']}]
+        }
+        api_service.validation_cache.memory_cache.entries.clear()
+        api_service.rendered_dag_cache.entries.clear()
+        timing_service.start_timings()
+        try:
+            dag_details = api_service.validate_dag('INLINE', payload, stream=True)
+            # the dag definition has not been encoded yet
+            assert 'inspect_serialization' not in [elem['phase'] for elem in timing_service.get_timings()['phases']]
+            streamed_details = json.loads("".join(api_service.stream_dag_details(dag_details, with_timings=True)))
+        finally:
+            timing_service.stop_timings()
+        # the timings are written after the dag definition, so they include its encoding
+        assert [elem['phase'] for elem in streamed_details['timings']['phases']] == [
+            'static_validation', 'generation', 'module_import', 'cycle_test', 'inspect_serialization'
+        ]
+        assert streamed_details['dag_definition']['dag_id'] == 'test_validate_dag_timings_streamed'
+
+    @staticmethod
+    def test_validate_dag_batch_pool():
+        static_dir = os.path.join(os.path.dirname(Path(__file__)), 'static')
+        payloads = [
+            {
+                'dag_name': f"test_validate_dag_batch_pool_{index}",
+                'mode': 'INLINE',
+                'bash_operators': [{'task_id': 'bash_operator_01', 'command': [f"echo {index}"]}]
+            } for index in range(2)
+        ]
+        payloads.append({
+            'dag_name': 'dag_workflow_simple',
+            'mode': 'GCS',
+            'project_id': 'mock_project_id',
+            'location': 'mock_gcp_location',
+            'composer_environment': 'mock_composer_environment',
+            'bucket_name': 'mock_bucket',
+            'file_path': 'dags/dag_workflow_simple.py'
+        })
+        pool_class = dag_validator_pool.DagValidatorPool
+        with workspace_service.workspace() as workspace_dir, \
+                mock.patch.dict(os.environ, {'VALIDATOR_POOL_SIZE': '0', 'BATCH_VALIDATION_WORKERS': '2'}), \
+                mock.patch('composer.api.api_service.gcs_download_file') as mock_download, \
+                mock.patch.object(pool_class, 'validate', autospec=True,
+                                  side_effect=pool_class.validate) as mock_validate, \
+                mock.patch.object(pool_class, 'close', autospec=True, side_effect=pool_class.close) as mock_close:
+            # a dag file which has not been validated by another test
+            dag_file = os.path.join(workspace_dir, 'dag_workflow_simple.py')
+            Path(dag_file).write_text(Path(static_dir, 'dag_workflow_simple.py').read_text() + "# batch pool\n")
+            mock_download.return_value = dag_file
+            results = list(api_service.validate_dag_batch(payloads, workspace_dir))
+        assert all(result['is_valid'] for result in results), results
+        # every dag of the batch is validated by the pool which is started for the batch, and the pool is stopped
+        assert mock_validate.call_count == 3
+        assert len({call[0][0] for call in mock_validate.call_args_list}) == 1
+        assert mock_close.call_count == 1
+
+    @staticmethod
+    def test_deploy_dag_inline_sidecar_changed():
+        payload = {
+            'dag_name': 'test_deploy_dag_inline_sidecar_changed',
+            'mode': 'INLINE',
+            'bash_operators': [{'task_id': 'bash_operator_01', 'command': ['echo 01']}]
+        }
+        bucket = {}
+
+        def upload_bytes(project_id, bucket_name, prefix, upload_file_name, contents):
+            bucket[prefix + upload_file_name] = base64.b64encode(hashlib.md5(contents).digest()).decode('utf-8')
+
+        with workspace_service.workspace() as workspace_dir, \
+                mock.patch('composer.api.api_service.gcs_get_md5',
+                           side_effect=lambda project_id, bucket_name, blob_name: bucket.get(blob_name)), \
+                mock.patch('composer.api.api_service.gcs_upload_bytes', side_effect=upload_bytes) as mock_upload:
+            api_service.deploy_dag('mock_project_id', 'INLINE', 'mock_bucket', dag_data=payload,
+                                   workspace_dir=workspace_dir)
+            assert sorted(bucket) == [
+                'dags/test_deploy_dag_inline_sidecar_changed.json', 'dags/test_deploy_dag_inline_sidecar_changed.py'
+            ]
+            assert mock_upload.call_count == 2
+            # an unchanged deployment is not uploaded again
+            api_service.deploy_dag('mock_project_id', 'INLINE', 'mock_bucket', dag_data=payload,
+                                   workspace_dir=workspace_dir)
+            assert mock_upload.call_count == 2
+            # the sidecar is replaced by another deployment, the dag file is the same for every payload of the dag
+            bucket['dags/test_deploy_dag_inline_sidecar_changed.json'] = 'another_md5'
+            api_service.deploy_dag('mock_project_id', 'INLINE', 'mock_bucket', dag_data=payload,
+                                   workspace_dir=workspace_dir)
+            assert mock_upload.call_count == 3
+            assert mock_upload.call_args[0][3] == 'test_deploy_dag_inline_sidecar_changed.json'
+
+    @staticmethod
+    def test_deploy_dag_inline_other_environment():
+        payload = {
+            'project_id': 'mock_project_id',
+            'location': 'mock_gcp_location',
+            'composer_environment': 'mock_composer_environment',
+            'dag_name': 'test_deploy_dag_inline_other_environment',
+            'mode': 'INLINE',
+            'bash_operators': [{'task_id': 'bash_operator_01', 'command': ['echo 01']}]
+        }
+        other_payload = dict(payload, project_id='other_project_id', composer_environment='other_environment')
+        uploads = []
+
+        def upload_bytes(project_id, bucket_name, prefix, upload_file_name, contents):
+            uploads.append((bucket_name, upload_file_name, contents))
+
+        with workspace_service.workspace() as workspace_dir, \
+                mock.patch('composer.api.api_service.gcs_get_md5', return_value=None), \
+                mock.patch('composer.api.api_service.gcs_upload_bytes', side_effect=upload_bytes):
+            api_service.deploy_dag('mock_project_id', 'INLINE', 'mock_bucket', dag_data=payload,
+                                   workspace_dir=workspace_dir)
+            api_service.deploy_dag('other_project_id', 'INLINE', 'other_bucket', dag_data=other_payload,
+                                   workspace_dir=workspace_dir)
+        # the files rendered for an environment are uploaded to the other environment unchanged
+        assert [(name, contents) for bucket_name, name, contents in uploads if bucket_name == 'mock_bucket'] == \
+            [(name, contents) for bucket_name, name, contents in uploads if bucket_name == 'other_bucket']
+        sidecar = [contents for bucket_name, name, contents in uploads if name.endswith('.json')][0]
+        assert not {'project_id', 'location', 'composer_environment'} & set(json.loads(sidecar))
+
+    @staticmethod
+    def test_deploy_dag_inline_validates_uploaded_files():
+        payload = {
+            'dag_name': 'test_deploy_dag_inline_validates_uploaded_files',
+            'mode': 'INLINE',
+            'sidecar_format': 'gzip',
+            'bash_operators': [{'task_id': 'bash_operator_01', 'command': ['echo 01']}]
+        }
+        uploads = {}
+        validated_files = []
+        validator_class = dag_validator.DagValidator
+
+        def upload_bytes(project_id, bucket_name, prefix, upload_file_name, contents):
+            uploads[upload_file_name] = contents
+
+        def get_validator(dag_file, serialized_file=None, source=None):
+            # the files of the dag directory when the dag is validated
+            validated_files.append({
+                'source': source,
+                'files': {name: Path(os.path.dirname(dag_file), name).read_bytes()
+                          for name in os.listdir(os.path.dirname(dag_file)) if name.startswith(payload['dag_name'])}
+            })
+            return validator_class(dag_file, serialized_file, source)
+
+        with workspace_service.workspace() as workspace_dir, \
+                mock.patch('composer.api.api_service.gcs_get_md5', return_value=None), \
+                mock.patch('composer.api.api_service.gcs_upload_bytes', side_effect=upload_bytes), \
+                mock.patch('composer.dag.dag_validator.DagValidator', side_effect=get_validator):
+            api_service.deploy_dag('mock_project_id', 'INLINE', 'mock_bucket', dag_data=payload,
+                                   workspace_dir=workspace_dir)
+        # the dag module is loaded from the uploaded dag file, next to the uploaded sidecar, not from an in-memory
+        # render with an embedded payload
+        assert validated_files == [{'source': None, 'files': uploads}]
+        assert sorted(uploads) == [
+            'test_deploy_dag_inline_validates_uploaded_files.json.gz',
+            'test_deploy_dag_inline_validates_uploaded_files.py'
+        ]
+
+    @staticmethod
+    def test_deploy_dag_inline_sidecar_fallback():
+        payload = {
+            'dag_name': 'test_deploy_dag_inline_sidecar_fallback',
+            'mode': 'INLINE',
+            'sidecar_format': 'msgpack',
+            'bash_operators': [{'task_id': 'bash_operator_01', 'command': ['echo 01']}]
+        }
+        uploads = []
+
+        def upload_bytes(project_id, bucket_name, prefix, upload_file_name, contents):
+            uploads.append(upload_file_name)
+
+        with workspace_service.workspace() as workspace_dir, \
+                mock.patch.dict(os.environ, {'COMPOSER_SIDECAR_FORMATS': 'json,compact,gzip'}), \
+                mock.patch('composer.api.api_service.gcs_get_md5', return_value=None), \
+                mock.patch('composer.api.api_service.gcs_upload_bytes', side_effect=upload_bytes):
+            api_service.deploy_dag('mock_project_id', 'INLINE', 'mock_bucket', dag_data=payload,
+                                   workspace_dir=workspace_dir)
+        # msgpack is not known to be installed in the Cloud Composer environment
+        assert sorted(uploads) == [
+            'test_deploy_dag_inline_sidecar_fallback.json.gz', 'test_deploy_dag_inline_sidecar_fallback.py'
+        ]
+
     @staticmethod
     def test_validate_dag_inline_invalid():
         payload = {
@@ -135,6 +135,54 @@ class ApiValidatorTests(TestCase):
         with pytest.raises(ValueError):
             api_validator.validate_payload(json)
 
+    @staticmethod
+    def test_validate_payload_inline_dependencies_valid():
+        json = {
+            'dag_name': 'test_trigger_dag',
+            'mode': 'INLINE',
+            'bash_operators': [
+                {'task_id': 'bash_operator_01', 'command': ['echo 01']},
+                {'task_id': 'bash_operator_02', 'command': ['echo 02']}
+            ],
+            'dependencies': {
+                'bash_operator_02': ['bash_operator_01']
+            }
+        }
+        is_valid = api_validator.validate_payload(json)
+        assert is_valid
+
+    @staticmethod
+    def test_validate_payload_inline_dependencies_invalid():
+        json = {
+            'dag_name': 'test_trigger_dag',
+            'mode': 'INLINE',
+            'bash_operators': [
+                {'task_id': 'bash_operator_01', 'command': ['echo 01']},
+                {'task_id': 'bash_operator_02', 'command': ['echo 02']}
+            ],
+            'dependencies': ['bash_operator_01', 'bash_operator_02']
+        }
+        with pytest.raises(ValueError):
+            api_validator.validate_payload(json)
+        json['dependencies'] = {'bash_operator_02': 'bash_operator_01'}
+        with pytest.raises(ValueError):
+            api_validator.validate_payload(json)
+
+
+    @staticmethod
+    def test_validate_payload_inline_sidecar_format():
+        json = {
+            'dag_name': 'test_trigger_dag',
+            'mode': 'INLINE',
+            'bash_operators': [
+                {'task_id': 'bash_operator_01', 'command': ['echo 01']}
+            ],
+            'sidecar_format': 'gzip'
+        }
+        assert api_validator.validate_payload(json)
+        json['sidecar_format'] = 'yaml'
+        with pytest.raises(ValueError):
+            api_validator.validate_payload(json)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,72 @@
+import pytest
+import tracemalloc
+from composer.dag import dag_dsl
+
+
+def test_expand_operator_without_foreach():
+    operator = {'task_id': 'bash_operator_01', 'command': ['echo 01']}
+    assert list(dag_dsl.expand_operator(operator)) == [operator]
+
+
+def test_expand_operator_values():
+    operator = {
+        'task_id': 'k8s_pod_operator_{{foreach.region}}',
+        'foreach': {'name': 'region', 'values': ['eu', 'us']},
+        'name': 'k8s_pod_{{foreach.region}}',
+        'image': 'bash',
+        'env_vars': {'REGION': '{{foreach.region}}'}
+    }
+    assert list(dag_dsl.expand_operator(operator)) == [
+        {'task_id': 'k8s_pod_operator_eu', 'name': 'k8s_pod_eu', 'image': 'bash', 'env_vars': {'REGION': 'eu'}},
+        {'task_id': 'k8s_pod_operator_us', 'name': 'k8s_pod_us', 'image': 'bash', 'env_vars': {'REGION': 'us'}}
+    ]
+
+
+def test_expand_operator_range():
+    operator = {
+        'task_id': 'k8s_pod_operator_{{foreach.index}}',
+        'foreach': {'name': 'index', 'range': [0, 6, 2]},
+        'name': 'k8s_pod',
+        'image': 'bash',
+        'startup_timeout_seconds': '{{foreach.index}}'
+    }
+    expanded = list(dag_dsl.expand_operator(operator))
+    assert [elem['task_id'] for elem in expanded] == ['k8s_pod_operator_0', 'k8s_pod_operator_2', 'k8s_pod_operator_4']
+    # a string which is exactly the placeholder keeps the type of the value
+    assert [elem['startup_timeout_seconds'] for elem in expanded] == [0, 2, 4]
+
+
+def test_expand_operator_invalid():
+    invalid_operators = [
+        {'task_id': 'bash_operator_01', 'foreach': {'name': 'index', 'range': [0, 3]}},
+        {'task_id': 'bash_operator_{{foreach.index}}', 'foreach': {'range': [0, 3]}},
+        {'task_id': 'bash_operator_{{foreach.index}}', 'foreach': {'name': 'index'}},
+        {'task_id': 'bash_operator_{{foreach.index}}', 'foreach': {'name': 'index', 'range': [0]}},
+        {'task_id': 'bash_operator_{{foreach.index}}', 'foreach': {'name': 'index', 'values': 'abc'}},
+        {'task_id': 'bash_operator_{{foreach.index}}', 'foreach': {'name': 'index', 'values': [1], 'range': [0, 1]}}
+    ]
+    for operator in invalid_operators:
+        with pytest.raises(ValueError):
+            list(dag_dsl.expand_operator(operator))
+
+
+def test_expand_operator_streaming():
+    operator = {
+        'task_id': 'bash_operator_{{foreach.index}}',
+        'foreach': {'name': 'index', 'range': [0, 20000]},
+        'command': ['echo {{foreach.index}}']
+    }
+    tracemalloc.start()
+    count = sum(1 for _ in dag_dsl.expand_operator(operator))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert count == 20000
+    # the expanded operators are yielded one at a time, they are never held in memory together
+    assert peak < 1024 * 1024
+
+
+test_expand_operator_without_foreach()
+test_expand_operator_values()
+test_expand_operator_range()
+test_expand_operator_invalid()
+test_expand_operator_streaming()
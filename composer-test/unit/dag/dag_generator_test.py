@@ -1,10 +1,22 @@
 import os
+import sys
+import gzip
 import json
+import time
+import subprocess
+import threading
+import importlib.util
+import hashlib
+import marshal
+import pytest
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from composer.dag import dag_generator
+from composer.utils import workspace_service
 
 
 DIR_DAGS_VALID = "payloads/valid"
+DIR_DAGS_INVALID = "payloads/invalid"
 PAYLOAD_EXT = ".json"
 
 
@@ -25,4 +37,324 @@ def test_generate_dag_valid():
         assert os.path.exists(dag_data['json_file'])
 
 
+def test_generate_compiled_dag_valid():
+    def json_payload_to_dict(json_file):
+        with open(os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_VALID, json_file)) as f:
+            payload = json.load(f)
+        return payload
+
+    for test_dag in get_test_files(DIR_DAGS_VALID, PAYLOAD_EXT):
+        generator = dag_generator.DagGenerator(json_payload_to_dict(test_dag), compiled=True)
+        dag_data = generator.generate_dag()
+        assert os.path.exists(dag_data['dag_file'])
+        assert dag_data['json_file'] is None
+        assert not os.path.exists(generator.json_file)
+        with open(dag_data['dag_file']) as f:
+            source = f.read()
+        # the compiled dag must be valid python which does not read the json payload
+        compile(source, dag_data['dag_file'], 'exec')
+        assert 'json.load' not in source
+
+
+def test_generate_compiled_dag_invalid():
+    def json_payload_to_dict(json_file):
+        with open(os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_INVALID, json_file)) as f:
+            payload = json.load(f)
+        return payload
+
+    for test_dag in ['empty_operators.json', 'error_no_operators.json']:
+        generator = dag_generator.DagGenerator(json_payload_to_dict(test_dag), compiled=True)
+        with pytest.raises(ValueError):
+            generator.generate_dag()
+
+
+def test_generate_dag_code_cache():
+    function_def = [
+        "def python_operator_func_1():",
+        "   print('Hello from Airflow Python Operator -- DYNAMIC')"
+    ]
+    payload = {
+        'dag_name': 'test_code_cache',
+        'mode': 'INLINE',
+        'python_operators': [
+            {'task_id': 'python_operator_01', 'function_def': function_def, 'function_name': 'python_operator_func_1'},
+            {'task_id': 'python_operator_02', 'function_def': function_def, 'function_name': 'python_operator_func_1'},
+            {'task_id': 'python_operator_03', 'function_def': ["def broken("], 'function_name': 'broken'}
+        ]
+    }
+    generator = dag_generator.DagGenerator(payload)
+    code_cache = generator.build_code_cache()
+    # identical blocks are compiled once and blocks with syntax errors are left to the template to report
+    key = hashlib.sha256("\n".join(function_def).encode('utf-8')).hexdigest()
+    assert list(code_cache.keys()) == [key]
+    namespace = {}
+    exec(marshal.loads(code_cache[key]), namespace)
+    assert callable(namespace['python_operator_func_1'])
+
+    dag_data = generator.generate_dag()
+    with open(dag_data['dag_file']) as f:
+        source = f.read()
+    assert f"'{key}': " in source
+
+
+def test_generate_dag_code_cache_foreach():
+    function_def = ["def python_operator_func():", "   return 'DYNAMIC'"]
+    payload = {
+        'dag_name': 'test_code_cache_foreach',
+        'python_operators': [
+            {
+                'task_id': 'python_operator_{{foreach.index}}',
+                'foreach': {'name': 'index', 'range': [0, 10 ** 8]},
+                'function_def': function_def,
+                'function_name': 'python_operator_func'
+            },
+            {
+                'task_id': 'python_operator_value_{{foreach.index}}',
+                'foreach': {'name': 'index', 'range': [0, 10 ** 8]},
+                'function_def': ["def python_operator_func():", "   return {{foreach.index}}"],
+                'function_name': 'python_operator_func'
+            }
+        ]
+    }
+    start = time.perf_counter()
+    code_cache = dag_generator.DagGenerator(payload).build_code_cache()
+    # the foreach operators are not expanded, the function_def of a foreach operator is compiled once and the
+    # function_def which contains the placeholder is left to the dag template
+    assert time.perf_counter() - start < 1.0
+    assert list(code_cache.keys()) == [hashlib.sha256("\n".join(function_def).encode('utf-8')).hexdigest()]
+
+
+def test_generate_dag_bundle():
+    payloads = dag_generator.DagGenerator.load_payloads(os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_VALID))
+    assert len(payloads) == len(get_test_files(DIR_DAGS_VALID, PAYLOAD_EXT))
+    dag_data = dag_generator.DagGenerator.bundle('test_bundle', payloads).generate_dag()
+    assert os.path.exists(dag_data['dag_file'])
+    with open(dag_data['json_file']) as f:
+        assert [payload['dag_name'] for payload in json.load(f)] == [payload['dag_name'] for payload in payloads]
+
+
+def test_generate_dag_bundle_invalid():
+    payloads = dag_generator.DagGenerator.load_payloads(os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_VALID))
+    with pytest.raises(ValueError):
+        dag_generator.DagGenerator.bundle('test_bundle', payloads + payloads[:1])
+    with pytest.raises(ValueError):
+        dag_generator.DagGenerator.bundle('test_bundle', [])
+
+
+def test_render_dag():
+    with open(os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_VALID, 'dag_complete.json')) as f:
+        payload = json.load(f)
+
+    generator = dag_generator.DagGenerator(payload)
+    generator.remove_previous_versions()
+    files = generator.render()
+    # rendering does not write to disk
+    assert not os.path.exists(generator.dag_file)
+    assert list(files) == [os.path.basename(generator.dag_file), os.path.basename(generator.json_file)]
+    assert json.loads(files[os.path.basename(generator.json_file)]) == payload
+
+    dag_data = generator.generate_dag()
+    for file_path in [dag_data['dag_file'], dag_data['json_file']]:
+        with open(file_path, 'rb') as f:
+            assert f.read() == files[os.path.basename(file_path)]
+
+    embedded_files = generator.render(embedded=True)
+    assert list(embedded_files) == [os.path.basename(generator.dag_file)]
+    embedded_source = embedded_files[os.path.basename(generator.dag_file)].decode('utf-8')
+    assert generator.INSERTION_MARKER in embedded_source
+    assert os.path.basename(generator.json_file) not in embedded_source
+    compile(embedded_source, generator.dag_file, 'exec')
+
+
+def test_generate_dag_concurrent_workspaces():
+    with open(os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_VALID, 'dag_complete.json')) as f:
+        payload = json.load(f)
+
+    def generate(index):
+        # every request generates the same dag_name with its own payload, in its own workspace
+        request_payload = dict(payload, dag_description=f"request {index}")
+        with workspace_service.workspace() as workspace_dir:
+            dag_data = dag_generator.DagGenerator(request_payload, workspace_dir=workspace_dir).generate_dag()
+            assert os.path.dirname(dag_data['dag_file']) == workspace_dir
+            with open(dag_data['json_file']) as f:
+                return json.load(f)["dag_description"], workspace_dir
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(generate, range(200)))
+    assert [description for description, _ in results] == [f"request {index}" for index in range(200)]
+    assert not any(os.path.exists(workspace_dir) for _, workspace_dir in results)
+
+
+def test_generate_many():
+    payloads = dag_generator.DagGenerator.load_payloads(os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_VALID))
+    payloads.append({'dag_name': 'test_generate_many_error', 'compiled': True})
+    with workspace_service.workspace() as workspace_dir:
+        reports = dag_generator.DagGenerator.generate_many(payloads, workspace_dir=workspace_dir, workers=2)
+        assert [report['dag_name'] for report in reports] == [payload['dag_name'] for payload in payloads]
+        for report in reports[:-1]:
+            assert report['status'] == 'SUCCESS'
+            assert report['error'] is None
+            assert set(report['timings']) == {'render', 'write'}
+            for file_path, file_hash in report['files'].items():
+                assert os.path.dirname(file_path) == workspace_dir
+                with open(file_path, 'rb') as f:
+                    assert hashlib.sha256(f.read()).hexdigest() == file_hash
+
+        # a failed payload is reported and does not stop the batch
+        reports = dag_generator.DagGenerator.generate_many(
+            payloads[-1:] + payloads[:1], workspace_dir=workspace_dir, workers=2, compiled=True
+        )
+        assert reports[0]['status'] == 'ERROR'
+        assert reports[0]['error'].startswith('ValueError')
+        assert reports[1]['status'] == 'SUCCESS'
+
+        # a duplicate dag_name is reported on its payload and does not stop the batch
+        reports = dag_generator.DagGenerator.generate_many(
+            payloads[:1] + payloads[:2] + payloads[:1], workspace_dir=workspace_dir, workers=2
+        )
+        assert [report['status'] for report in reports] == ['SUCCESS', 'ERROR', 'SUCCESS', 'ERROR']
+        assert reports[1]['error'] == \
+            f"ValueError: The batch contains the dag {payloads[0]['dag_name']} more than once."
+        assert reports[1]['dag_name'] == payloads[0]['dag_name'] and not reports[1]['files']
+        assert reports[2]['dag_name'] == payloads[1]['dag_name']
+
+
+def test_render_payload_sidecar_formats():
+    with open(os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_VALID, 'dag_complete.json')) as f:
+        payload = json.load(f)
+
+    files = {}
+    for sidecar_format in ['json', 'compact', 'gzip']:
+        generator = dag_generator.DagGenerator(payload, sidecar_format=sidecar_format)
+        assert generator.json_file.endswith(dag_generator.DagGenerator.SIDECAR_FORMATS[sidecar_format])
+        files[sidecar_format] = generator.render()[os.path.basename(generator.json_file)]
+        # an unchanged payload is always rendered to the same bytes
+        assert generator.render_payload() == files[sidecar_format]
+    assert json.loads(files['json']) == payload
+    assert json.loads(files['compact']) == payload
+    assert json.loads(gzip.decompress(files['gzip'])) == payload
+    assert len(files['gzip']) < len(files['compact']) < len(files['json'])
+
+    if importlib.util.find_spec('msgpack') is None:
+        with pytest.raises(ValueError):
+            dag_generator.DagGenerator(payload, sidecar_format='msgpack')
+    with pytest.raises(ValueError):
+        dag_generator.DagGenerator(payload, sidecar_format='yaml')
+
+
+def test_render_dag_deterministic():
+    payload_file = os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_VALID, 'dag_complete.json')
+    with open(payload_file) as f:
+        payload = json.load(f)
+
+    def reorder(value):
+        # reverses the order of the keys of every object and of the operators of each family
+        if isinstance(value, dict):
+            return {k: reorder(value[k]) for k in reversed(list(value))}
+        return value
+
+    reordered_payload = reorder(payload)
+    for operator_family in dag_generator.DagGenerator.OPERATOR_FAMILIES:
+        reordered_payload[operator_family] = list(reversed(reordered_payload[operator_family]))
+
+    for sidecar_format in ['json', 'compact', 'gzip']:
+        files = dag_generator.DagGenerator(payload, sidecar_format=sidecar_format).render()
+        assert dag_generator.DagGenerator(reordered_payload, sidecar_format=sidecar_format).render() == files
+    files = dag_generator.DagGenerator(payload, compiled=True).render()
+    assert dag_generator.DagGenerator(reordered_payload, compiled=True).render() == files
+
+    # the precompiled code blocks of the dag module are also identical when rendered by another interpreter
+    files = dag_generator.DagGenerator(payload).render()
+    script = (
+        "import sys, json, hashlib\n"
+        "from composer.dag import dag_generator\n"
+        "with open(sys.argv[1]) as f:\n"
+        "    files = dag_generator.DagGenerator(json.load(f)).render()\n"
+        "print(json.dumps({k: hashlib.sha256(v).hexdigest() for k, v in files.items()}))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', script, payload_file],
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path), LOG_LEVEL='ERROR'),
+        stdout=subprocess.PIPE,
+        check=True
+    )
+    assert json.loads(result.stdout) == {k: hashlib.sha256(v).hexdigest() for k, v in files.items()}
+
+
+def test_generate_dag_incremental():
+    with open(os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_VALID, 'dag_complete.json')) as f:
+        payload = json.load(f)
+
+    with workspace_service.workspace() as workspace_dir:
+        generator = dag_generator.DagGenerator(payload, workspace_dir=workspace_dir)
+        dag_data = generator.generate_dag()
+        assert dag_data['changed_files'] == [dag_data['dag_file'], dag_data['json_file']]
+        # an unchanged dag is not written again
+        assert dag_generator.DagGenerator(payload, workspace_dir=workspace_dir).generate_dag()['changed_files'] == []
+
+        # the dag module reads the description from the json file, so only the json file changes
+        changed_payload = dict(payload, dag_description='changed description')
+        dag_data = dag_generator.DagGenerator(changed_payload, workspace_dir=workspace_dir).generate_dag()
+        assert dag_data['changed_files'] == [dag_data['json_file']]
+
+        # the json file of the previous sidecar format is removed
+        generator = dag_generator.DagGenerator(changed_payload, workspace_dir=workspace_dir, sidecar_format='gzip')
+        dag_data = generator.generate_dag()
+        assert dag_data['changed_files'] == [
+            dag_data['dag_file'], dag_data['json_file'], os.path.join(workspace_dir, 'dag_complete.json')
+        ]
+        assert sorted(os.listdir(workspace_dir)) == ['dag_complete.json.gz', 'dag_complete.py']
+
+        # a compiled dag does not have a json file
+        dag_generator.DagGenerator(changed_payload, workspace_dir=workspace_dir, compiled=True).generate_dag()
+        assert os.listdir(workspace_dir) == ['dag_complete.py']
+
+        # every file of the previous versions is removed, whatever its sidecar format
+        generator.generate_dag()
+        assert generator.remove_previous_versions() == [dag_data['dag_file'], dag_data['json_file']]
+        assert os.listdir(workspace_dir) == []
+
+
+def test_generate_dag_atomic():
+    with open(os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_VALID, 'dag_complete.json')) as f:
+        payload = json.load(f)
+
+    with workspace_service.workspace() as workspace_dir:
+        generators = [
+            dag_generator.DagGenerator(payload, workspace_dir=workspace_dir),
+            dag_generator.DagGenerator(payload, workspace_dir=workspace_dir, compiled=True)
+        ]
+        generators[0].generate_dag()
+        files = [generator.render()[os.path.basename(generator.dag_file)] for generator in generators]
+        stop = threading.Event()
+
+        def regenerate():
+            # alternates between the template and the compiled dag, which rewrites the dag file each time
+            for i in range(200):
+                generators[i % 2].write_files({os.path.basename(generators[0].dag_file): files[i % 2]})
+            stop.set()
+
+        writer = threading.Thread(target=regenerate)
+        writer.start()
+        # a reader always finds a complete version of the dag file
+        while not stop.is_set():
+            with open(generators[0].dag_file, 'rb') as f:
+                assert f.read() in files
+        writer.join()
+        assert sorted(os.listdir(workspace_dir)) == ['dag_complete.json', 'dag_complete.py']
+
+
 test_generate_dag_valid()
+test_generate_compiled_dag_valid()
+test_generate_compiled_dag_invalid()
+test_generate_dag_code_cache()
+test_generate_dag_code_cache_foreach()
+test_generate_dag_bundle()
+test_generate_dag_bundle_invalid()
+test_render_dag()
+test_generate_dag_concurrent_workspaces()
+test_generate_many()
+test_render_payload_sidecar_formats()
+test_render_dag_deterministic()
+test_generate_dag_incremental()
+test_generate_dag_atomic()
@@ -0,0 +1,72 @@
+import time
+import pytest
+from composer.dag import dag_graph, dag_static_validator
+
+
+def test_topological_levels():
+    graph = dag_graph.DagGraph(
+        ['task_a', 'task_b', 'task_c', 'task_d', 'task_e'],
+        [('task_a', 'task_b'), ('task_a', 'task_c'), ('task_b', 'task_d'), ('task_c', 'task_d')]
+    )
+    assert graph.get_topological_levels() == [['task_a', 'task_e'], ['task_b', 'task_c'], ['task_d']]
+    assert graph.get_orphan_tasks() == ['task_e']
+    assert graph.get_unreachable_tasks() == []
+    assert graph.find_cycle() is None
+    assert graph.assert_acyclic()
+
+
+def test_find_cycle():
+    graph = dag_graph.DagGraph(
+        ['task_a', 'task_b', 'task_c', 'task_d', 'task_e'],
+        [('task_a', 'task_b'), ('task_b', 'task_c'), ('task_c', 'task_d'), ('task_d', 'task_b'), ('task_d', 'task_e')]
+    )
+    assert graph.get_topological_levels() == [['task_a']]
+    # the tasks downstream of a cycle can not be reached either
+    assert graph.get_unreachable_tasks() == ['task_b', 'task_c', 'task_d', 'task_e']
+    assert graph.find_cycle() == ['task_b', 'task_c', 'task_d']
+    with pytest.raises(ValueError) as e:
+        graph.assert_acyclic()
+    assert str(e.value) == "The dependencies of the tasks form a cycle: task_b >> task_c >> task_d >> task_b"
+
+    assert dag_graph.DagGraph([], [('task_a', 'task_a')]).find_cycle() == ['task_a']
+
+
+def test_deep_chain():
+    # a chain deeper than the recursion limit of the interpreter
+    task_ids = [f"task_{i:06d}" for i in range(100000)]
+    graph = dag_graph.DagGraph(task_ids, zip(task_ids, task_ids[1:]))
+    assert len(graph.get_topological_levels()) == 100000
+    assert graph.find_cycle() is None
+
+    graph = dag_graph.DagGraph(task_ids, list(zip(task_ids, task_ids[1:])) + [(task_ids[-1], task_ids[0])])
+    assert len(graph.find_cycle()) == 100000
+
+
+def test_validate_large_payload():
+    # the execution_sequence of two groups of 250 tasks defines 62,500 edges
+    payload = {
+        'dag_name': 'dag_graph_large_payload',
+        'bash_operators': [
+            {
+                'task_id': f"bash_{group}_{{{{foreach.index}}}}",
+                'foreach': {'name': 'index', 'range': [0, 250]},
+                'command': ['echo {{foreach.index}}']
+            }
+            for group in ['a', 'b']
+        ],
+        'execution_sequence': ['bash_a_{{foreach.index}}', 'bash_b_{{foreach.index}}']
+    }
+    validator = dag_static_validator.DagStaticValidator(payload)
+    start = time.perf_counter()
+    assert validator.validate() == []
+    elapsed = time.perf_counter() - start
+    assert len(validator.get_edges()) >= 50000
+    assert validator.warnings == []
+    # a generous bound, the validation takes tens of milliseconds
+    assert elapsed < 2.0, elapsed
+
+
+test_topological_levels()
+test_find_cycle()
+test_deep_chain()
+test_validate_large_payload()
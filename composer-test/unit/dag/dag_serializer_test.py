@@ -0,0 +1,114 @@
+import json
+import pytest
+from composer.dag import dag_serializer
+
+
+class Task:
+    def __init__(self, task_id, dag):
+        self.task_id = task_id
+        self.dag = dag
+        self.upstream_task_ids = set()
+        self.downstream_task_ids = set()
+
+
+class Dag:
+    def __init__(self, dag_id, task_count):
+        self.dag_id = dag_id
+        self.schedule_interval = None
+        self.task_dict = {}
+        previous = None
+        for i in range(task_count):
+            task = Task(f"task_{i:04d}", self)
+            if previous is not None:
+                previous.downstream_task_ids.add(task.task_id)
+                task.upstream_task_ids.add(previous.task_id)
+            self.task_dict[task.task_id] = task
+            previous = task
+
+    @property
+    def tasks(self):
+        return list(self.task_dict.values())
+
+
+def test_serialize_dag():
+    dag = Dag('test_serialize_dag', 3)
+    dag_vars = dict(vars(dag))
+    task_vars = dict(vars(dag.tasks[0]))
+    dag_definition = json.loads(dag_serializer.DagSerializer.from_dag(dag).serialize())
+    assert dag_definition['dag_id'] == 'test_serialize_dag'
+    assert [task['task_id'] for task in dag_definition['tasks_details']] == ['task_0000', 'task_0001', 'task_0002']
+    # attributes which can not be serialized are described by their type
+    assert dag_definition['tasks_details'][0]['dag'] == '<<non-serializable: Dag>>'
+    assert dag_definition['task_dict']['task_0000'] == '<<non-serializable: Task>>'
+    # the dag is not modified by the serialization
+    assert vars(dag) == dag_vars
+    assert vars(dag.tasks[0]) == task_vars
+    assert 'tasks_details' not in vars(dag)
+
+
+def test_serialize_dag_projection():
+    dag = Dag('test_serialize_dag_projection', 3)
+    view = dag_serializer.get_view('task_id, upstream,downstream,schedule_interval,undefined')
+    dag_definition = json.loads(dag_serializer.DagSerializer.from_dag(dag, view).serialize())
+    assert dag_definition == {
+        'dag_id': 'test_serialize_dag_projection',
+        'schedule_interval': None,
+        'tasks_details': [
+            {'task_id': 'task_0000', 'upstream': [], 'downstream': ['task_0001']},
+            {'task_id': 'task_0001', 'upstream': ['task_0000'], 'downstream': ['task_0002']},
+            {'task_id': 'task_0002', 'upstream': ['task_0001'], 'downstream': []}
+        ]
+    }
+
+
+def test_serialize_dag_pagination():
+    dag = Dag('test_serialize_dag_pagination', 2000)
+    view = dag_serializer.get_view(['task_id'], offset=1990, limit=20)
+    chunks = list(dag_serializer.DagSerializer.from_dag(dag, view).iter_json())
+    dag_definition = json.loads("".join(chunks))
+    assert dag_definition['tasks_total'] == 2000
+    assert [task['task_id'] for task in dag_definition['tasks_details']] == [f"task_{i}" for i in range(1990, 2000)]
+    # the json is encoded one task at a time
+    assert len(chunks) == 2 + 1 + 10 + 1
+
+
+def test_serialize_serialized_dag():
+    serialized_dag = {
+        '__version': 1,
+        'dag': {
+            '_dag_id': 'test_serialize_serialized_dag',
+            'tasks': [
+                {'task_id': 'task_01', '_task_type': 'BashOperator', '_downstream_task_ids': ['task_02', 'task_03']},
+                {'task_id': 'task_02', '_task_type': 'BashOperator', '_downstream_task_ids': ['task_03']},
+                {'task_id': 'task_03', '_task_type': 'BashOperator'}
+            ]
+        }
+    }
+    dag_definition = json.loads(dag_serializer.DagSerializer.from_serialized_dag(serialized_dag).serialize())
+    assert dag_definition['_dag_id'] == 'test_serialize_serialized_dag'
+    assert dag_definition['tasks_details'] == serialized_dag['dag']['tasks']
+    assert 'tasks' not in dag_definition
+
+    view = dag_serializer.get_view('upstream,_task_type')
+    dag_definition = json.loads(dag_serializer.DagSerializer.from_serialized_dag(serialized_dag, view).serialize())
+    assert dag_definition['dag_id'] == 'test_serialize_serialized_dag'
+    assert dag_definition['tasks_details'][2] == {
+        'task_id': 'task_03', 'upstream': ['task_01', 'task_02'], '_task_type': 'BashOperator'
+    }
+
+
+def test_get_view():
+    assert dag_serializer.get_view() == {'fields': None, 'offset': 0, 'limit': None}
+    assert dag_serializer.get_view('') == {'fields': None, 'offset': 0, 'limit': None}
+    assert dag_serializer.get_view_key(dag_serializer.get_view('task_id,upstream', 10, 5)) == \
+        (('task_id', 'upstream'), 10, 5)
+    for fields, offset, limit in [(None, -1, None), (None, 0, -1), (1, 0, None)]:
+        with pytest.raises(ValueError):
+            dag_serializer.get_view(fields, offset, limit)
+
+
+test_serialize_dag()
+test_serialize_dag_projection()
+test_serialize_dag_pagination()
+test_serialize_serialized_dag()
+test_get_view()
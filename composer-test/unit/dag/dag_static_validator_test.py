@@ -0,0 +1,182 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+from pathlib import Path
+from unittest import mock
+from composer.dag import dag_static_validator, dag_compiler
+
+DIR_DAGS_VALID = "payloads/valid"
+DIR_DAGS_INVALID = "payloads/invalid"
+PAYLOAD_EXT = ".json"
+
+
+def get_test_files(dir, ext):
+    return [f for f in os.listdir(os.path.join(os.path.dirname(Path(__file__)), dir)) if f.endswith(ext)]
+
+
+def json_payload_to_dict(dir, json_file):
+    with open(os.path.join(os.path.dirname(Path(__file__)), dir, json_file)) as f:
+        payload = json.load(f)
+    return payload
+
+
+def test_validate_valid():
+    for test_dag in get_test_files(DIR_DAGS_VALID, PAYLOAD_EXT):
+        validator = dag_static_validator.DagStaticValidator(json_payload_to_dict(DIR_DAGS_VALID, test_dag))
+        assert validator.validate() == [], test_dag
+        assert validator.assert_valid()
+
+
+def test_validate_invalid():
+    for test_dag in get_test_files(DIR_DAGS_INVALID, PAYLOAD_EXT):
+        validator = dag_static_validator.DagStaticValidator(json_payload_to_dict(DIR_DAGS_INVALID, test_dag))
+        assert validator.validate(), test_dag
+        with pytest.raises(ValueError):
+            validator.assert_valid()
+
+
+def test_validate_reports_every_error():
+    payload = {
+        'dag_name': 'static_validation_errors',
+        'bash_operators': [
+            {'task_id': 'bash_operator_01', 'command': ['echo 01']},
+            {'task_id': 'bash_operator_02', 'command': ['echo 02']},
+            {'task_id': 'bash_operator_03', 'command': ['echo 03']}
+        ],
+        'python_operators': [
+            {'task_id': 'python_operator_01', 'function_name': 'func', 'function_def': ['def func(:', '    pass']},
+            {'task_id': 'python_operator_02', 'function_name': 'missing', 'function_def': ['def func():', '    pass']}
+        ],
+        'kubernetes_pod_operators': [
+            {'task_id': 'k8s_pod_operator_01', 'name': 'k8s_pod_01', 'image': 'bash', 'pod_secret_refs': ['undefined']}
+        ],
+        'execution_sequence': ['bash_operator_01', 'unknown_operator', 'bash_operator_02'],
+        'dependencies': {
+            'bash_operator_02': ['bash_operator_03'],
+            'bash_operator_03': ['bash_operator_02']
+        }
+    }
+    errors = dag_static_validator.DagStaticValidator(payload).validate()
+    assert len(errors) == 5
+    assert "Task python_operator_01 function_def contains a syntax error at line 1" in errors[0]
+    assert "Task python_operator_02 function_def does not define the function 'missing'" in errors[1]
+    assert "'undefined' in 'pod_secret_refs'" in errors[2]
+    assert "Task unknown_operator is specified as a task in the 'execution_sequence'" in errors[3]
+    assert "form a cycle" in errors[4]
+    assert "bash_operator_02" in errors[4] and "bash_operator_03" in errors[4]
+
+    with pytest.raises(ValueError) as e:
+        dag_static_validator.DagStaticValidator(payload).assert_valid()
+    assert all(error in str(e.value) for error in errors)
+
+
+def test_validate_function_names():
+    def get_errors(function_def, function_name='func'):
+        payload = {
+            'dag_name': 'static_validation_function_names',
+            'python_operators': [
+                {'task_id': 'python_operator_01', 'function_name': function_name, 'function_def': function_def}
+            ]
+        }
+        return dag_static_validator.DagStaticValidator(payload).validate()
+
+    # functions bound by a definition, an assignment, an import or inside a compound statement
+    assert get_errors(['def func():', '    pass']) == []
+    assert get_errors(['func = lambda: None']) == []
+    assert get_errors(['from os.path import join as func']) == []
+    assert get_errors(['try:', '    from os import getcwd as func', 'except ImportError:', '    func = None']) == []
+    # a function defined inside another function is not defined at the module scope
+    assert len(get_errors(['def outer():', '    def func():', '        pass'])) == 1
+    # the names of a star import can not be known statically
+    assert get_errors(['from os.path import *'], function_name='join') == []
+
+
+def test_validate_dynamic_functions():
+    payload = {
+        'dag_name': 'static_validation_dynamic_functions',
+        'bash_operators': [{'task_id': 'bash_operator_01', 'command': ['echo 01']}],
+        'dynamic_functions': {
+            'start_date': {'start_date_def': ['def start_date_func():', '    return None']},
+            'retry_delay': {'retry_delay_def': ['def func():', '  return 1', ' return 2'], 'retry_delay_name': 'func'}
+        }
+    }
+    errors = dag_static_validator.DagStaticValidator(payload).validate()
+    assert len(errors) == 2
+    assert "start_date dynamic function requested but 'start_date_name' was not found." in errors
+    assert any("Dynamic function retry_delay_def contains a syntax error at line 3" in error for error in errors)
+
+
+def test_validate_foreach_cycle():
+    payload = {
+        'dag_name': 'static_validation_foreach_cycle',
+        'bash_operators': [
+            {'task_id': 'bash_operator_01', 'command': ['echo 01']},
+            {
+                'task_id': 'bash_operator_{{foreach.index}}',
+                'foreach': {'name': 'index', 'range': [2, 5]},
+                'command': ['echo {{foreach.index}}']
+            }
+        ],
+        'execution_sequence': ['bash_operator_01', 'bash_operator_{{foreach.index}}'],
+        'dependencies': {'bash_operator_01': ['bash_operator_4']}
+    }
+    errors = dag_static_validator.DagStaticValidator(payload).validate()
+    assert errors == [
+        "The dependencies of the tasks form a cycle: bash_operator_01 >> bash_operator_4 >> bash_operator_01"
+    ]
+
+
+def test_validate_foreach_limit():
+    payload = {
+        'dag_name': 'static_validation_foreach_limit',
+        'bash_operators': [
+            {'task_id': 'bash_operator_01', 'command': ['echo 01']},
+            {
+                'task_id': 'bash_operator_{{foreach.index}}',
+                'foreach': {'name': 'index', 'range': [0, 10 ** 12]},
+                'command': ['echo {{foreach.index}}']
+            },
+            {'task_id': 'bash_operator_02', 'command': ['echo 02']}
+        ],
+        'execution_sequence': ['bash_operator_01', 'bash_operator_{{foreach.index}}', 'bash_operator_02']
+    }
+    with mock.patch.dict(os.environ, {'MAX_EXPANDED_TASKS': '100'}):
+        # the expansion stops at the limit, the rest of the payload is not validated
+        errors = dag_static_validator.DagStaticValidator(payload).validate()
+        assert errors == [
+            "bash_operators[1]: The DAG defines more than 100 tasks once its foreach operators are expanded"
+        ]
+        with pytest.raises(ValueError):
+            dag_compiler.DagCompiler(payload, payload['dag_name']).compile()
+
+        payload['bash_operators'][1]['foreach']['range'] = [0, 99]
+        assert dag_static_validator.DagStaticValidator(payload).validate() == [
+            "bash_operators[2]: The DAG defines more than 100 tasks once its foreach operators are expanded"
+        ]
+        payload['bash_operators'][1]['foreach']['range'] = [0, 98]
+        assert dag_static_validator.DagStaticValidator(payload).validate() == []
+
+
+def test_validate_does_not_import_airflow():
+    # validated in a new interpreter, as the other tests of the session may already have imported Airflow
+    script = (
+        "import sys, json; from composer.dag import dag_static_validator; "
+        "dag_static_validator.DagStaticValidator(json.load(sys.stdin)).assert_valid(); "
+        "print(any(module.split('.')[0] == 'airflow' for module in sys.modules))"
+    )
+    with open(os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_VALID, 'dag_complete.json')) as f:
+        result = subprocess.run([sys.executable, '-c', script], stdin=f, capture_output=True, check=True,
+                                env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+    assert result.stdout.decode('utf-8').strip() == 'False'
+
+
+test_validate_valid()
+test_validate_invalid()
+test_validate_reports_every_error()
+test_validate_function_names()
+test_validate_dynamic_functions()
+test_validate_foreach_cycle()
+test_validate_foreach_limit()
+test_validate_does_not_import_airflow()
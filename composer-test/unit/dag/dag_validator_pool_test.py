@@ -0,0 +1,64 @@
+import json
+import os
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from composer.dag import dag_generator
+from composer.dag import dag_validator_pool
+
+
+DIR_DAGS_VALID = "payloads/valid"
+DIR_DAGS_INVALID = "payloads/invalid"
+PAYLOAD_EXT = ".json"
+
+
+def get_test_files(dir, ext):
+    return [f for f in os.listdir(os.path.join(os.path.dirname(Path(__file__)), dir)) if f.endswith(ext)]
+
+
+def render_embedded_dag(dir, json_file):
+    with open(os.path.join(os.path.dirname(Path(__file__)), dir, json_file)) as f:
+        generator = dag_generator.DagGenerator(json.load(f))
+    return generator.dag_file, generator.render(embedded=True)[os.path.basename(generator.dag_file)]
+
+
+def test_validate_dag_pool():
+    pool = dag_validator_pool.DagValidatorPool(2, cpu_time_limit=2, memory_limit=256, timeout=10)
+    try:
+        valid_dags = [render_embedded_dag(DIR_DAGS_VALID, f) for f in get_test_files(DIR_DAGS_VALID, PAYLOAD_EXT)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda dag: pool.validate(*dag, inspect=True), valid_dags))
+        for result in results:
+            assert result['is_valid'], result
+            assert json.loads(result['dag_definition'])['tasks_details']
+
+        for test_dag in get_test_files(DIR_DAGS_INVALID, PAYLOAD_EXT):
+            result = pool.validate(*render_embedded_dag(DIR_DAGS_INVALID, test_dag))
+            assert not result['is_valid']
+            assert result['error']
+    finally:
+        pool.close()
+
+
+def test_validate_dag_pool_limits():
+    pool = dag_validator_pool.DagValidatorPool(1, cpu_time_limit=1, memory_limit=256, timeout=3)
+    try:
+        result = pool.validate('runaway_cpu.py', b"while True:\n    pass\n")
+        assert not result['is_valid']
+        assert 'CPU time limit' in result['error']
+
+        result = pool.validate('runaway_memory.py', b"data = bytearray(1024 * 1024 * 1024)\n")
+        assert not result['is_valid']
+        assert 'MemoryError' in result['error']
+
+        result = pool.validate('runaway_sleep.py', b"import time\ntime.sleep(60)\n")
+        assert not result['is_valid']
+        assert 'timeout' in result['error']
+
+        # the worker keeps serving jobs after a job exceeded its limits
+        assert pool.validate(*render_embedded_dag(DIR_DAGS_VALID, 'dag_complete.json'))['is_valid']
+    finally:
+        pool.close()
+
+
+test_validate_dag_pool()
+test_validate_dag_pool_limits()
@@ -1,9 +1,17 @@
+import hashlib
+import marshal
 import json
 import os
+import importlib.util
+import sys
+import subprocess
 import pytest
+from unittest import mock
 from pathlib import Path
 from composer.dag import dag_generator
+from composer.dag import dag_graph
 from composer.dag import dag_validator
+from airflow import models
 
 DIR_DAGS_VALID = "payloads/valid"
 DIR_DAGS_INVALID = "payloads/invalid"
@@ -22,6 +30,10 @@ def json_payload_to_dict(dir, json_file):
     return payload
 
 
+def get_dag(dag_module):
+    return next(dag for dag in vars(dag_module).values() if isinstance(dag, models.DAG))
+
+
 def test_validate_dag_from_payload():
     for test_dag in get_test_files(DIR_DAGS_VALID, EXT_PAYLOAD):
         dag_data = dag_generator.DagGenerator(json_payload_to_dict(DIR_DAGS_VALID, test_dag)).generate_dag()
@@ -29,6 +41,212 @@ def test_validate_dag_from_payload():
         assert not validator.assert_has_valid_dag()
 
 
+def test_validate_compiled_dag_from_payload():
+    for test_dag in get_test_files(DIR_DAGS_VALID, EXT_PAYLOAD):
+        payload = json_payload_to_dict(DIR_DAGS_VALID, test_dag)
+        dag_data = dag_generator.DagGenerator(payload, compiled=True).generate_dag()
+        validator = dag_validator.DagValidator(dag_data['dag_file'])
+        assert not validator.assert_has_valid_dag()
+
+
+def test_validate_dag_bundle():
+    payloads = dag_generator.DagGenerator.load_payloads(os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_VALID))
+    dag_data = dag_generator.DagGenerator.bundle('test_bundle', payloads).generate_dag()
+    validator = dag_validator.DagValidator(dag_data['dag_file'])
+    assert not validator.assert_has_valid_dag()
+    dag_module = validator.load_dag_module()
+    for payload in payloads:
+        assert isinstance(getattr(dag_module, payload['dag_name']), models.DAG)
+
+
+def test_validate_dag_named_like_module_global():
+    payload = json_payload_to_dict(DIR_DAGS_VALID, 'dag_complete.json')
+    # the names of globals of the generated dag module
+    payloads = [dict(payload, dag_name=dag_name) for dag_name in ['json', 'payload', 'registered_dags']]
+    for compiled in [False, True]:
+        dag_data = dag_generator.DagGenerator(payloads[0], compiled=compiled).generate_dag()
+        dag_module = dag_validator.DagValidator(dag_data['dag_file']).load_dag_module()
+        assert get_dag(dag_module).dag_id == 'json'
+    dag_data = dag_generator.DagGenerator.bundle('test_bundle_module_globals', payloads).generate_dag()
+    dag_module = dag_validator.DagValidator(dag_data['dag_file']).load_dag_module()
+    for bundled_payload in payloads:
+        assert getattr(dag_module, bundled_payload['dag_name']).dag_id == bundled_payload['dag_name']
+
+
+def test_validate_dag_dependencies():
+    payload = json_payload_to_dict(DIR_DAGS_VALID, 'dag_with_dependencies.json')
+    for compiled in [False, True]:
+        dag_data = dag_generator.DagGenerator(payload, compiled=compiled).generate_dag()
+        dag = get_dag(dag_validator.DagValidator(dag_data['dag_file']).load_dag_module())
+        assert dag.get_task('bash_operator_extract').downstream_task_ids == {
+            'python_operator_transform_01', 'python_operator_transform_02'
+        }
+        assert dag.get_task('bash_operator_load').upstream_task_ids == {
+            'python_operator_transform_01', 'python_operator_transform_02'
+        }
+
+
+def test_validate_dag_cycle():
+    payload = json_payload_to_dict(DIR_DAGS_VALID, 'dag_with_dependencies.json')
+    dag_data = dag_generator.DagGenerator(payload).generate_dag()
+    with dag_validator.DagValidator(dag_data['dag_file']).disposable_dag_module() as dag_module:
+        dag = get_dag(dag_module)
+        # the static validation of the payload and Airflow agree on the imported dag
+        assert dag_graph.DagGraph.from_dag(dag).find_cycle() is None
+        assert not dag.test_cycle()
+        dag.get_task('bash_operator_load').set_downstream(dag.get_task('bash_operator_extract'))
+        assert dag_graph.DagGraph.from_dag(dag).find_cycle() is not None
+        with pytest.raises(Exception):
+            dag.test_cycle()
+
+
+def test_validate_dag_foreach():
+    payload = json_payload_to_dict(DIR_DAGS_VALID, 'dag_with_foreach.json')
+    for compiled in [False, True]:
+        dag_data = dag_generator.DagGenerator(payload, compiled=compiled).generate_dag()
+        dag = get_dag(dag_validator.DagValidator(dag_data['dag_file']).load_dag_module())
+        assert len(dag.tasks) == 9
+        assert dag.get_task('k8s_pod_operator_asia').env_vars == {'REGION': 'asia'}
+        assert dag.get_task('bash_operator_load').upstream_task_ids == {
+            'k8s_pod_operator_eu', 'k8s_pod_operator_us', 'k8s_pod_operator_asia',
+            'python_operator_partition_0', 'python_operator_partition_1',
+            'python_operator_partition_2', 'python_operator_partition_3'
+        }
+        assert len(dag.get_task('bash_operator_extract').downstream_task_ids) == 7
+
+
+def test_validate_dag_function_def_module_level():
+    payload = {
+        'dag_name': 'dag_function_def_module_level',
+        'python_operators': [
+            {
+                'task_id': 'python_operator_01',
+                'function_name': 'python_operator_func',
+                'function_def': [
+                    "from os.path import *",
+                    "MESSAGE = \"\"\"first line",
+                    "    second line\"\"\"",
+                    "def python_operator_func():",
+                    "    return join('dir', 'file'), MESSAGE"
+                ]
+            }
+        ]
+    }
+    for compiled in [False, True]:
+        dag_data = dag_generator.DagGenerator(payload, compiled=compiled).generate_dag()
+        dag = get_dag(dag_validator.DagValidator(dag_data['dag_file']).load_dag_module())
+        # the function definition keeps its multi-line strings and its module level imports
+        assert dag.get_task('python_operator_01').python_callable() == (
+            os.path.join('dir', 'file'), "first line\n    second line"
+        )
+
+    # the compiled dag unmarshals the precompiled code object of the function definition
+    source = dag_generator.DagGenerator(payload, compiled=True).render()['dag_function_def_module_level.py']
+    key = hashlib.sha256("\n".join(payload['python_operators'][0]['function_def']).encode('utf-8')).hexdigest()
+    with mock.patch('marshal.loads', wraps=marshal.loads) as mock_loads:
+        dag = get_dag(dag_validator.DagValidator(dag_data['dag_file'], source=source).load_dag_module())
+        assert mock_loads.call_count == 1
+    # and compiles it from its source code when the dag is parsed by another python version
+    source = source.replace(repr(importlib.util.MAGIC_NUMBER).encode('utf-8'), b"b'magic'")
+    dag = get_dag(dag_validator.DagValidator(dag_data['dag_file'], source=source).load_dag_module())
+    assert dag.get_task('python_operator_01').python_callable()[1] == "first line\n    second line"
+    assert key.encode('utf-8') in source
+
+
+def test_validate_dag_foreach_limit():
+    payload = json_payload_to_dict(DIR_DAGS_VALID, 'dag_with_foreach.json')
+    dag_data = dag_generator.DagGenerator(payload).generate_dag()
+    with mock.patch.dict(os.environ, {'MAX_EXPANDED_TASKS': '2'}):
+        # the dag template stops expanding the foreach operators once the dag exceeds the limit
+        with pytest.raises(ValueError) as e:
+            dag_validator.DagValidator(dag_data['dag_file']).assert_has_valid_dag()
+    assert "The DAG defines more than 2 tasks once its foreach operators are expanded" in str(e.value)
+
+
+def test_validate_dag_kubernetes_secrets():
+    payload = json_payload_to_dict(DIR_DAGS_VALID, 'kubernetes_pod_operators_secrets.json')
+    payload['kubernetes_pod_operators'].append({
+        'task_id': 'k8s_pod_operator_example_task_02',
+        'name': 'k8s_pod_example_02',
+        'image': 'bash',
+        'pod_secret_refs': ['my_secret_env']
+    })
+    for compiled in [False, True]:
+        dag_data = dag_generator.DagGenerator(payload, compiled=compiled).generate_dag()
+        dag = get_dag(dag_validator.DagValidator(dag_data['dag_file']).load_dag_module())
+        # the pods share a single Secret object per secret
+        assert dag.get_task('k8s_pod_operator_example_task_01').secrets[0] is \
+            dag.get_task('k8s_pod_operator_example_task_02').secrets[0]
+
+
+def test_validate_dag_kubernetes_secrets_undefined():
+    payload = json_payload_to_dict(DIR_DAGS_INVALID, 'error_kubernetes_secrets.json')
+    dag_data = dag_generator.DagGenerator(payload).generate_dag()
+    with pytest.raises(ValueError) as e:
+        dag_validator.DagValidator(dag_data['dag_file']).load_dag_module()
+    # every undefined secret is reported at once
+    assert 'my_secret_undefined_01' in str(e.value) and 'my_secret_undefined_02' in str(e.value)
+    with pytest.raises(ValueError) as e:
+        dag_generator.DagGenerator(payload, compiled=True).generate_dag()
+    assert 'my_secret_undefined_01' in str(e.value) and 'my_secret_undefined_02' in str(e.value)
+
+
+def test_validate_dag_dependencies_large():
+    task_count = 10000
+    payload = {
+        'dag_name': 'test_dependencies_large',
+        'mode': 'INLINE',
+        'bash_operators': [
+            {'task_id': f"bash_operator_{i:05d}", 'command': [f"echo {i}"]} for i in range(task_count)
+        ],
+        'execution_sequence': [f"bash_operator_{i:05d}" for i in range(task_count // 2)],
+        'dependencies': {
+            f"bash_operator_{i:05d}": [f"bash_operator_{i - 1:05d}", 'bash_operator_00000']
+            for i in range(task_count // 2, task_count)
+        }
+    }
+    dag_data = dag_generator.DagGenerator(payload).generate_dag()
+    dag = get_dag(dag_validator.DagValidator(dag_data['dag_file']).load_dag_module())
+    assert len(dag.tasks) == task_count
+    assert len(dag.get_task('bash_operator_00000').downstream_task_ids) == task_count // 2 + 1
+
+
+def test_validate_dag_from_memory():
+    for test_dag in get_test_files(DIR_DAGS_VALID, EXT_PAYLOAD):
+        generator = dag_generator.DagGenerator(json_payload_to_dict(DIR_DAGS_VALID, test_dag))
+        generator.remove_previous_versions()
+        source = generator.render(embedded=True)[os.path.basename(generator.dag_file)]
+        validator = dag_validator.DagValidator(generator.dag_file, source=source)
+        assert not validator.assert_has_valid_dag()
+        assert json.loads(validator.inspect_dag()) is not None
+        assert not os.path.exists(generator.dag_file)
+
+    for test_dag in get_test_files(DIR_DAGS_INVALID, EXT_PAYLOAD):
+        generator = dag_generator.DagGenerator(json_payload_to_dict(DIR_DAGS_INVALID, test_dag))
+        source = generator.render(embedded=True)[os.path.basename(generator.dag_file)]
+        with pytest.raises(Exception):
+            dag_validator.DagValidator(generator.dag_file, source=source).assert_has_valid_dag()
+
+
+def test_validate_dag_sidecar_formats():
+    payload = json_payload_to_dict(DIR_DAGS_VALID, 'dag_complete.json')
+    payloads = dag_generator.DagGenerator.load_payloads(os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_VALID))
+    sidecar_formats = ['json', 'compact', 'gzip']
+    if importlib.util.find_spec('msgpack') is not None:
+        sidecar_formats.append('msgpack')
+    expected_tasks = None
+    for sidecar_format in sidecar_formats:
+        dag_data = dag_generator.DagGenerator(payload, sidecar_format=sidecar_format).generate_dag()
+        dag = get_dag(dag_validator.DagValidator(dag_data['dag_file']).load_dag_module())
+        expected_tasks = expected_tasks or sorted(task.task_id for task in dag.tasks)
+        assert sorted(task.task_id for task in dag.tasks) == expected_tasks
+
+        dag_data = dag_generator.DagGenerator.bundle('test_bundle', payloads, sidecar_format=sidecar_format).generate_dag()
+        dag_module = dag_validator.DagValidator(dag_data['dag_file']).load_dag_module()
+        for bundled_payload in payloads:
+            assert isinstance(getattr(dag_module, bundled_payload['dag_name']), models.DAG)
+
+
 def test_validate_dag_from_static():
     for test_dag in get_test_files(DIR_DAGS_STATIC, EXT_STATIC):
         static_dag_file = os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_STATIC, test_dag)
@@ -50,6 +268,41 @@ def test_inspect_dag_from_static():
         assert json.loads(validator.inspect_dag()) is not None
 
 
+def test_inspect_serialized_dag_from_payload():
+    for test_dag in get_test_files(DIR_DAGS_VALID, EXT_PAYLOAD):
+        payload = json_payload_to_dict(DIR_DAGS_VALID, test_dag)
+        for compiled in [False, True]:
+            dag_data = dag_generator.DagGenerator(payload, compiled=compiled, serialized=True).generate_dag()
+            assert os.path.exists(dag_data['serialized_file'])
+            dag = get_dag(dag_validator.DagValidator(dag_data['dag_file']).load_dag_module())
+            validator = dag_validator.DagValidator(dag_data['dag_file'], dag_data['serialized_file'])
+            dag_definition = json.loads(validator.inspect_dag())
+            assert len(dag_definition['tasks_details']) == len(dag.tasks)
+
+
+def test_iter_inspect_dag():
+    dag_data = dag_generator.DagGenerator(json_payload_to_dict(DIR_DAGS_VALID, 'dag_complete.json')).generate_dag()
+    validator = dag_validator.DagValidator(dag_data['dag_file'])
+    with mock.patch.object(validator, 'unload_dag_module', wraps=validator.unload_dag_module) as mock_unload:
+        chunks = validator.iter_inspect_dag()
+        first_chunk = next(chunks)
+        # the module is unloaded once the dag definition is consumed
+        mock_unload.assert_not_called()
+        dag_definition = json.loads(first_chunk + "".join(chunks))
+        assert mock_unload.call_count == 1
+        # or when the generator is closed early
+        chunks = validator.iter_inspect_dag()
+        next(chunks)
+        chunks.close()
+        assert mock_unload.call_count == 2
+    assert dag_definition == json.loads(validator.inspect_dag())
+    for test_dag in get_test_files(DIR_DAGS_INVALID, EXT_PAYLOAD):
+        dag_data = dag_generator.DagGenerator(json_payload_to_dict(DIR_DAGS_INVALID, test_dag)).generate_dag()
+        # an invalid dag raises before any of its dag definition is consumed
+        with pytest.raises(Exception):
+            dag_validator.DagValidator(dag_data['dag_file']).iter_inspect_dag()
+
+
 def test_validate_dag_from_payload_invalid():
     for test_dag in get_test_files(DIR_DAGS_INVALID, EXT_PAYLOAD):
         dag_data = dag_generator.DagGenerator(json_payload_to_dict(DIR_DAGS_INVALID, test_dag)).generate_dag()
@@ -58,9 +311,75 @@ def test_validate_dag_from_payload_invalid():
             validator.assert_has_valid_dag()
 
 
+def test_validate_dag_unload():
+    dag_data = dag_generator.DagGenerator(json_payload_to_dict(DIR_DAGS_VALID, 'dag_complete.json')).generate_dag()
+    validator = dag_validator.DagValidator(dag_data['dag_file'])
+    with validator.disposable_dag_module() as dag_module:
+        dag = get_dag(dag_module)
+        assert dag.tasks
+        assert dag_module.__name__ not in sys.modules
+    assert vars(dag_module) == {}
+    assert dag.tasks == []
+
+
+def test_validate_dag_memory():
+    # measured in a new interpreter, so the growth does not depend on the tests which ran before in the session
+    script = """
+import gc, json, os, sys, tracemalloc
+from composer.dag import dag_generator, dag_validator
+payload = json.load(sys.stdin)
+
+def validate_dags(count):
+    for i in range(count):
+        # a different dag every time, as a long-running worker validates the dags of many payloads
+        generator = dag_generator.DagGenerator(dict(payload, dag_name=f"test_validate_dag_memory_{i:04d}"))
+        source = generator.render(embedded=True)[os.path.basename(generator.dag_file)]
+        # tracemalloc keeps the file name of every frame that it traces, so the file name is not varied
+        dag_validator.DagValidator('test_validate_dag_memory.py', source=source).validate_dag()
+
+tracemalloc.start()
+# the first validations import the operator modules and fill the caches of the interpreter
+validate_dags(50)
+gc.collect()
+snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+validate_dags(1000)
+gc.collect()
+stats = tracemalloc.take_snapshot().filter_traces(
+    [tracemalloc.Filter(False, tracemalloc.__file__)]
+).compare_to(snapshot, 'lineno')
+tracemalloc.stop()
+print(json.dumps({'growth': sum(stat.count_diff for stat in stats), 'stats': [str(stat) for stat in stats[:10]]}))
+"""
+    with open(os.path.join(os.path.dirname(Path(__file__)), DIR_DAGS_VALID, 'dag_complete.json')) as f:
+        result = subprocess.run([sys.executable, '-c', script], stdin=f, capture_output=True, check=True,
+                                env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+    memory = json.loads(result.stdout.decode('utf-8').strip().splitlines()[-1])
+
+    # the memory of the interpreter tables, which are resized as they grow, is not bounded by the number of dags,
+    # so the growth is counted in allocated blocks; a single leaked dag or operator retains many blocks
+    assert memory['growth'] < 1000, "\n".join(memory['stats'])
+
+
 test_validate_dag_from_payload()
+test_validate_compiled_dag_from_payload()
+test_validate_dag_bundle()
+test_validate_dag_named_like_module_global()
+test_validate_dag_dependencies()
+test_validate_dag_cycle()
+test_validate_dag_foreach()
+test_validate_dag_foreach_limit()
+test_validate_dag_function_def_module_level()
+test_validate_dag_kubernetes_secrets()
+test_validate_dag_kubernetes_secrets_undefined()
+test_validate_dag_dependencies_large()
+test_validate_dag_from_memory()
+test_validate_dag_sidecar_formats()
 test_validate_dag_from_static()
 test_inspect_dag_from_payload()
 test_inspect_dag_from_static()
+test_inspect_serialized_dag_from_payload()
+test_iter_inspect_dag()
+test_validate_dag_unload()
+test_validate_dag_memory()
 
 test_validate_dag_from_payload_invalid()
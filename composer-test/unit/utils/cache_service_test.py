@@ -0,0 +1,127 @@
+import os
+import pytest
+import tempfile
+import threading
+from unittest import TestCase, main
+from composer.utils import cache_service
+
+
+class CacheServiceTests(TestCase):
+
+    @staticmethod
+    def test_lru_cache_get_put():
+        cache = cache_service.LruCache(2)
+        cache.put('a', 1)
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.get('b', 2) == 2
+        assert 'a' in cache
+        assert len(cache) == 1
+
+    @staticmethod
+    def test_lru_cache_eviction():
+        cache = cache_service.LruCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        # reading a marks it as the most recently used, so b is evicted
+        cache.get('a')
+        cache.put('c', 3)
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert 'c' in cache
+        cache.remove('a')
+        assert 'a' not in cache
+
+    @staticmethod
+    def test_lru_cache_invalid_size():
+        with pytest.raises(ValueError):
+            cache_service.LruCache(0)
+
+    @staticmethod
+    def test_lru_cache_concurrent():
+        cache = cache_service.LruCache(10)
+
+        def put_entries(offset):
+            for i in range(1000):
+                cache.put(offset + i, i)
+                cache.get(offset + i // 2)
+
+        threads = [threading.Thread(target=put_entries, args=(offset * 1000,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(cache) == 10
+
+    @staticmethod
+    def test_get_payload_hash_canonical():
+        payload = {'dag_name': 'test_dag', 'mode': 'INLINE', 'bash_operators': [{'task_id': 'a', 'command': ['ls']}]}
+        reordered_payload = {
+            'bash_operators': [{'command': ['ls'], 'task_id': 'a'}],
+            'mode': 'INLINE',
+            'dag_name': 'test_dag'
+        }
+        assert cache_service.get_payload_hash(payload) == cache_service.get_payload_hash(reordered_payload)
+        # the order of list elements is significant
+        changed_payload = dict(payload, bash_operators=[{'task_id': 'a', 'command': ['ls', 'pwd']}])
+        assert cache_service.get_payload_hash(payload) != cache_service.get_payload_hash(changed_payload)
+
+    @staticmethod
+    def test_get_payload_hash_excluded_keys():
+        payload = {'dag_name': 'test_dag', 'mode': 'INLINE'}
+        deployed_payload = dict(payload, project_id='mock_project_id', location='mock_gcp_location')
+        assert cache_service.get_payload_hash(payload) != cache_service.get_payload_hash(deployed_payload)
+        assert cache_service.get_payload_hash(payload) == \
+            cache_service.get_payload_hash(deployed_payload, ['project_id', 'location'])
+
+
+    @staticmethod
+    def test_disk_cache_get_put():
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = cache_service.DiskCache(os.path.join(cache_dir, 'validation'))
+            key = ('artifact_hash', '1.10.13', 'template_version')
+            assert cache.get(key) is None
+            cache.put(key, {'is_valid': True, 'dag_definition': {'dag_id': 'test_dag'}})
+            assert cache.get(key) == {'is_valid': True, 'dag_definition': {'dag_id': 'test_dag'}}
+            # the entries are kept by a new cache of the same directory, such as the cache of a restarted worker
+            assert key in cache_service.DiskCache(os.path.join(cache_dir, 'validation'))
+            # the temporary file of the entry has replaced the entry file
+            assert len(os.listdir(os.path.join(cache_dir, 'validation'))) == 1
+            cache.remove(key)
+            cache.remove(key)
+            assert key not in cache
+
+    @staticmethod
+    def test_tiered_cache():
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = cache_service.TieredCache(1, cache_dir)
+            cache.put(('a',), 1)
+            cache.put(('b',), 2)
+            # a is evicted from the in-memory tier, it is then read from the on-disk tier and added back to memory
+            assert ('a',) not in cache.memory_cache
+            assert cache.get(('a',)) == 1
+            assert ('a',) in cache.memory_cache
+            assert cache_service.TieredCache(1, cache_dir).get(('b',)) == 2
+            cache.remove(('b',))
+            assert cache.get(('b',), 3) == 3
+
+        memory_cache = cache_service.TieredCache(1)
+        memory_cache.put(('a',), 1)
+        memory_cache.put(('b',), 2)
+        assert memory_cache.get(('a',)) is None
+        assert memory_cache.get(('b',)) == 2
+
+    @staticmethod
+    def test_get_artifact_hash():
+        files = {'test_dag.py': b'dag', 'test_dag.json': b'{}'}
+        assert cache_service.get_artifact_hash(files) == \
+            cache_service.get_artifact_hash({'test_dag.json': b'{}', 'test_dag.py': b'dag'})
+        assert cache_service.get_artifact_hash(files) != cache_service.get_artifact_hash({'test_dag.py': b'dag'})
+        # the file name is part of the hash, as it names the dag module
+        assert cache_service.get_artifact_hash({'test_dag.py': b'dag'}) != \
+            cache_service.get_artifact_hash({'other_dag.py': b'dag'})
+        assert cache_service.get_artifact_hash({'ab': b'c'}) != cache_service.get_artifact_hash({'a': b'bc'})
+
+
+if __name__ == '__main__':
+    main()
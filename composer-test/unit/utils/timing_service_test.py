@@ -0,0 +1,77 @@
+import os
+import threading
+from unittest import TestCase, main, mock
+from composer.utils import timing_service
+
+
+class TimingServiceTests(TestCase):
+
+    @staticmethod
+    def test_timings_not_recorded():
+        timing_service.stop_timings()
+        with timing_service.phase('generation') as phase:
+            pass
+        assert phase is timing_service.NULL_PHASE
+        assert timing_service.get_timings() is None
+        assert timing_service.stop_timings() is None
+
+    @staticmethod
+    def test_timings_recorded():
+        timing_service.start_timings()
+        try:
+            with timing_service.phase('generation'):
+                with timing_service.phase('module_import', 'dag.py'):
+                    pass
+            try:
+                with timing_service.phase('gcs_upload', 'dags/dag.py'):
+                    raise OSError("upload failed")
+            except OSError:
+                pass
+            timings = timing_service.get_timings()
+        finally:
+            assert timing_service.stop_timings() is not None
+        # the phases are listed in the order in which they complete, a phase which fails is also timed
+        assert [elem['phase'] for elem in timings['phases']] == ['module_import', 'generation', 'gcs_upload']
+        assert timings['phases'][0]['description'] == 'dag.py'
+        assert 'description' not in timings['phases'][1]
+        assert all(elem['duration_ms'] >= 0 for elem in timings['phases'])
+        assert timings['total_ms'] >= timings['phases'][1]['duration_ms']
+        assert timing_service.get_timings() is None
+
+    @staticmethod
+    def test_timings_per_thread():
+        timing_service.start_timings()
+        try:
+            thread_timings = []
+            thread = threading.Thread(target=lambda: thread_timings.append(timing_service.get_timings()))
+            thread.start()
+            thread.join()
+            assert thread_timings == [None]
+        finally:
+            timing_service.stop_timings()
+
+    @staticmethod
+    def test_is_enabled():
+        with mock.patch.dict(os.environ, {'DEBUG_TIMINGS': ''}):
+            assert not timing_service.is_enabled()
+            assert not timing_service.is_enabled('false')
+            assert timing_service.is_enabled('true')
+            assert timing_service.is_enabled('1')
+        with mock.patch.dict(os.environ, {'DEBUG_TIMINGS': 'True'}):
+            assert timing_service.is_enabled()
+
+    @staticmethod
+    def test_get_server_timing():
+        timings = {
+            'total_ms': 120.5,
+            'phases': [
+                {'phase': 'generation', 'duration_ms': 1.25},
+                {'phase': 'gcs_upload', 'description': 'dags/"dag".py', 'duration_ms': 80.0}
+            ]
+        }
+        assert timing_service.get_server_timing(timings) == \
+            'generation;dur=1.25, gcs_upload;desc="dags/\\"dag\\".py";dur=80.0, total;dur=120.5'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import os
+import stat
+from unittest import TestCase, main
+from composer.utils import workspace_service
+
+
+class WorkspaceServiceTests(TestCase):
+
+    @staticmethod
+    def test_create_workspace_unique():
+        workspace_dirs = [workspace_service.create_workspace() for _ in range(10)]
+        try:
+            assert len(set(workspace_dirs)) == 10
+            assert all(os.path.isdir(workspace_dir) for workspace_dir in workspace_dirs)
+        finally:
+            for workspace_dir in workspace_dirs:
+                workspace_service.remove_workspace(workspace_dir)
+        assert not any(os.path.exists(workspace_dir) for workspace_dir in workspace_dirs)
+
+    @staticmethod
+    def test_remove_workspace_read_only():
+        workspace_dir = workspace_service.create_workspace()
+        read_only_file = os.path.join(workspace_dir, 'read_only.txt')
+        with open(read_only_file, 'w') as f:
+            f.write('read only')
+        os.chmod(read_only_file, stat.S_IREAD)
+        workspace_service.remove_workspace(workspace_dir)
+        assert not os.path.exists(workspace_dir)
+        # removing a workspace which no longer exists is a no-op
+        workspace_service.remove_workspace(workspace_dir)
+
+    @staticmethod
+    def test_workspace_removed_on_error():
+        try:
+            with workspace_service.workspace() as workspace_dir:
+                assert os.path.isdir(workspace_dir)
+                raise RuntimeError('request failed')
+        except RuntimeError:
+            pass
+        assert not os.path.exists(workspace_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,11 +13,12 @@ __status__ = "Development"
 import os
 import logging
 import traceback
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, g, stream_with_context
 from flask_swagger_ui import get_swaggerui_blueprint
-from composer.utils import log_service, auth_service
+from composer.utils import log_service, auth_service, workspace_service, timing_service
 from composer.airflow import airflow_service
 from composer.api import api_validator, api_service
+from composer.dag import dag_serializer
 
 # define the Flask web application
 app = Flask(__name__, static_url_path='/static', static_folder='../static')
@@ -43,6 +44,63 @@ app.register_blueprint(swaggerui_blueprint)
 API_BASE_PATH_V1 = '/api/v1'
 
 
+# [START request workspace]
+def get_request_workspace():
+    """
+    Gets the workspace directory of the current request, which is created on first use.
+    Every file written while handling the request is written to this directory.
+    Returns:
+        the absolute path to the workspace directory
+    """
+    if 'workspace_dir' not in g:
+        g.workspace_dir = workspace_service.create_workspace()
+    return g.workspace_dir
+
+
+@app.teardown_request
+def remove_request_workspace(exception=None):
+    """Removes the workspace directory of the current request, if one was created, when the request finishes"""
+    workspace_dir = g.pop('workspace_dir', None)
+    if workspace_dir is not None:
+        workspace_service.remove_workspace(workspace_dir)
+# [END request workspace]
+
+
+# [START request timings]
+@app.before_request
+def start_request_timings():
+    """Starts recording the timings of the phases of the current request, when enabled by the X-Debug-Timings header
+    or the DEBUG_TIMINGS env var"""
+    if timing_service.is_enabled(request.headers.get(timing_service.TIMINGS_HEADER)):
+        timing_service.start_timings()
+
+
+def get_request_timings():
+    """
+    Gets the timings block of the current request, which is added to the response of the request.
+    Returns:
+        a dict containing the timings of the request, empty when the timings are not recorded
+    """
+    timings = timing_service.get_timings()
+    return {'timings': timings} if timings is not None else {}
+
+
+@app.after_request
+def add_server_timing(response):
+    """Adds the timings of the current request to its response as a Server-Timing header, when they are recorded"""
+    timings = timing_service.get_timings()
+    if timings is not None:
+        response.headers['Server-Timing'] = timing_service.get_server_timing(timings)
+    return response
+
+
+@app.teardown_request
+def stop_request_timings(exception=None):
+    """Stops recording the timings of the current request, so they are not carried over to the next request"""
+    timing_service.stop_timings()
+# [END request timings]
+
+
 # [START get_test]
 @app.route(f'{API_BASE_PATH_V1}/test', methods=['GET'])
 def get_test():
@@ -158,42 +216,111 @@ def validate_dag():
     if not req_data:
         return {'error': "Empty JSON payload"}, 500
     try:
-        api_validator.validate_payload(req_data)
+        next_actions = {
+            'deploy': f'{API_BASE_PATH_V1}/dag/deploy'
+        }
+
+        # the static validation reports every error of an INLINE payload, without generating or importing the dag
+        if request.args.get('mode') == 'static':
+            if req_data.get('mode') != 'INLINE':
+                return {'error': "Static validation is only supported for INLINE payloads"}, 400
+            validation_json = api_service.validate_dag_static(req_data)
+            validation_json.update(get_request_timings())
+            if not validation_json['is_valid']:
+                return jsonify(validation_json), 400
+            validation_json['next_actions'] = next_actions
+            return jsonify(validation_json)
+
+        with timing_service.phase('payload_validation', req_data.get('dag_name')):
+            api_validator.validate_payload(req_data)
+        # the fields and the page of tasks of the dag definition, e.g. ?fields=task_id,upstream,downstream&limit=100
+        view = dag_serializer.get_view(
+            request.args.get('fields'),
+            request.args.get('offset', 0, type=int),
+            request.args.get('limit', type=int)
+        )
         if 'project_id' in req_data:
             project_id, location, composer_environment = api_service.get_gcp_composer_details(req_data)
         else:
             project_id, location, composer_environment = api_service.get_gcp_composer_details(None)
 
-        next_actions = {
-            'deploy': f'{API_BASE_PATH_V1}/dag/deploy'
-        }
-
         if req_data['mode'] == 'GCS':
-            deploy_file = api_service.gcs_download_file(project_id, req_data['bucket_name'], req_data['file_path'])
-            validation_json = api_service.validate_dag('GCS', deploy_file)
+            deploy_file = api_service.gcs_download_file(
+                project_id,
+                req_data['bucket_name'],
+                req_data['file_path'],
+                workspace_dir=get_request_workspace()
+            )
+            validation_json = api_service.validate_dag('GCS', deploy_file, view=view, stream=True)
             validation_json['next_actions'] = next_actions
-            return jsonify(validation_json)
+            # the dag definition is encoded as it is written, within the request context and so the request workspace,
+            # and the timings of the request, which include the encoding, are written after it
+            return Response(
+                stream_with_context(api_service.stream_dag_details(validation_json, with_timings=True)),
+                mimetype='application/json'
+            )
 
         if req_data['mode'] == 'GIT':
             deploy_file = api_service.git_download_file(
                 req_data['git_url'],
                 req_data['repo_name'],
-                req_data['file_path']
+                req_data['file_path'],
+                workspace_dir=get_request_workspace()
             )
-            validation_json = api_service.validate_dag('GIT', deploy_file)
+            validation_json = api_service.validate_dag('GIT', deploy_file, view=view, stream=True)
             validation_json['next_actions'] = next_actions
-            return jsonify(validation_json)
+            return Response(
+                stream_with_context(api_service.stream_dag_details(validation_json, with_timings=True)),
+                mimetype='application/json'
+            )
 
         if req_data['mode'] == 'INLINE':
-            validation_json = api_service.validate_dag('INLINE', req_data)
+            validation_json = api_service.validate_dag(
+                'INLINE',
+                req_data,
+                workspace_dir=get_request_workspace(),
+                view=view,
+                stream=True
+            )
             validation_json['next_actions'] = next_actions
-            return jsonify(validation_json)
+            return Response(
+                stream_with_context(api_service.stream_dag_details(validation_json, with_timings=True)),
+                mimetype='application/json'
+            )
 
     except:
         return {'error': traceback.print_exc()}, 500
 # [END validate_dag]
 
 
+# [START validate_dag_batch]
+@app.route(f'{API_BASE_PATH_V1}/dag/validate/batch', methods=['POST'])
+def validate_dag_batch():
+    """Validates the dags of an array of payloads concurrently, streaming the result of each dag as it completes"""
+    logger.log(logging.INFO, f"Entered validate_dag_batch -- {API_BASE_PATH_V1}/dag/validate/batch api POST method")
+    req_data = request.get_json()
+    if not req_data:
+        return {'error': "Empty JSON payload"}, 500
+    if not isinstance(req_data, list):
+        return {'error': "The JSON payload of a batch must be an array of dag payloads"}, 400
+    try:
+        # the fields and the page of tasks of every dag definition, as for /dag/validate
+        view = dag_serializer.get_view(
+            request.args.get('fields'),
+            request.args.get('offset', 0, type=int),
+            request.args.get('limit', type=int)
+        )
+        batch_details = api_service.validate_dag_batch(req_data, get_request_workspace(), view=view)
+        # the request context, and so the request workspace, is kept until the last dag of the batch is streamed
+        return Response(
+            stream_with_context(api_service.stream_dag_batch(batch_details)),
+            mimetype='application/x-ndjson'
+        )
+    except:
+        return {'error': traceback.print_exc()}, 500
+# [END validate_dag_batch]
+
+
 # [START deploy_dag]
 @app.route(f'{API_BASE_PATH_V1}/dag/deploy', methods=['POST'])
 def deploy_dag():
@@ -203,7 +330,8 @@ def deploy_dag():
     if not req_data:
         return {'error': "Empty JSON payload"}, 500
     try:
-        api_validator.validate_payload(req_data)
+        with timing_service.phase('payload_validation', req_data.get('dag_name')):
+            api_validator.validate_payload(req_data)
         if 'project_id' in req_data:
             project_id, location, composer_environment = api_service.get_gcp_composer_details(req_data)
         else:
@@ -217,33 +345,48 @@ def deploy_dag():
         }
 
         if req_data['mode'] == 'GCS':
-            deploy_file = api_service.gcs_download_file(project_id, req_data['bucket_name'], req_data['file_path'])
+            deploy_file = api_service.gcs_download_file(
+                project_id,
+                req_data['bucket_name'],
+                req_data['file_path'],
+                workspace_dir=get_request_workspace()
+            )
             gcs_dag_path = api_service.deploy_dag(project_id, 'GCS', airflow_dag_bucket_name, dag_file=deploy_file)
             return jsonify(
                 dag_name=dag_name,
                 dag_gcs_path=gcs_dag_path,
-                next_actions=next_actions
+                next_actions=next_actions,
+                **get_request_timings()
             )
 
         if req_data['mode'] == 'GIT':
             deploy_file = api_service.git_download_file(
                 req_data['git_url'],
                 req_data['repo_name'],
-                req_data['file_path']
+                req_data['file_path'],
+                workspace_dir=get_request_workspace()
             )
             git_dag_path = api_service.deploy_dag(project_id, 'GIT', airflow_dag_bucket_name, dag_file=deploy_file)
             return jsonify(
                 dag_name=dag_name,
                 dag_gcs_path=git_dag_path,
-                next_actions=next_actions
+                next_actions=next_actions,
+                **get_request_timings()
             )
 
         if req_data['mode'] == 'INLINE':
-            gcs_dag_path = api_service.deploy_dag(project_id, 'INLINE', airflow_dag_bucket_name, dag_data=req_data)
+            gcs_dag_path = api_service.deploy_dag(
+                project_id,
+                'INLINE',
+                airflow_dag_bucket_name,
+                dag_data=req_data,
+                workspace_dir=get_request_workspace()
+            )
             return jsonify(
                 dag_name=dag_name,
                 dag_gcs_path=gcs_dag_path,
-                next_actions=next_actions
+                next_actions=next_actions,
+                **get_request_timings()
             )
     except:
         return {'error': traceback.print_exc()}, 500
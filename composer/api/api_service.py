@@ -17,15 +17,50 @@ import tempfile
 import shutil
 import stat
 import json
+import base64
+import hashlib
+import threading
+import traceback
+import contextlib
+import concurrent.futures
 from git import Repo
 from google.cloud import storage
-from composer.utils import log_service, auth_service
+from composer.utils import log_service, auth_service, cache_service, timing_service
 from composer.airflow import airflow_service
-from composer.dag import dag_validator, dag_generator
+from composer.api import api_validator
+from composer.dag import dag_validator, dag_generator, dag_validator_pool, dag_static_validator, dag_serializer
 
 # gets the logger for this module
 logger = log_service.get_module_logger(__name__)
 
+# the payload elements which define where a dag is deployed, they are not part of the hash of the dag payload
+DEPLOYMENT_KEYS = ['project_id', 'location', 'composer_environment']
+
+# caches of the INLINE dags, keyed by the canonical hash of their JSON DSL payload
+# rendered dag files, keyed by (payload hash, embedded)
+rendered_dag_cache = cache_service.LruCache(cache_service.get_cache_size())
+# GCS md5 hashes of the deployed dag files, by blob name, keyed by (bucket name, payload hash)
+deployed_dag_cache = cache_service.LruCache(cache_service.get_cache_size())
+# validation results of the dags of every mode, keyed by (artifact hash, Airflow version, template version), with
+# an on-disk tier when VALIDATION_CACHE_DIR is defined
+validation_cache = cache_service.TieredCache(
+    cache_service.get_cache_size(),
+    cache_service.get_validation_cache_dir()
+)
+
+# the pool of validator processes, started on first use when VALIDATOR_POOL_SIZE is greater than 0
+validator_pool = None
+validator_pool_lock = threading.Lock()
+
+# the number of the payloads of a batch which are validated concurrently, see get_batch_workers
+DEFAULT_BATCH_WORKERS = 4
+
+# the sidecar formats which the Cloud Composer environment can load, msgpack requires the msgpack package to be
+# installed in the environment, see get_composer_sidecar_formats
+DEFAULT_COMPOSER_SIDECAR_FORMATS = "json,compact,gzip"
+# the sidecar format of a dag whose sidecar format cannot be loaded by the Cloud Composer environment
+FALLBACK_SIDECAR_FORMAT = 'gzip'
+
 
 # [START __get_composer_environment]
 def __get_composer_environment(project_id, location, composer_environment):
@@ -61,11 +96,12 @@ def get_dag_bucket(project_id, location, composer_environment):
         the name of the GCS bucket containing the Cloud Composer dag files
     """
     logger.log(logging.DEBUG, "Getting the DAG GCS Bucket")
-    gcs_dag_bucket = __get_composer_environment(
-        project_id,
-        location,
-        composer_environment
-    ).get_airflow_dag_gcs()
+    with timing_service.phase('composer_metadata', composer_environment):
+        gcs_dag_bucket = __get_composer_environment(
+            project_id,
+            location,
+            composer_environment
+        ).get_airflow_dag_gcs()
     logger.log(logging.DEBUG, f"DAG GCS Bucket: {gcs_dag_bucket}")
     bucket_name = re.findall(r"(?<=\/\/)(.*?)(?=\/)", gcs_dag_bucket)
     if not bucket_name or len(bucket_name) > 1:
@@ -100,33 +136,201 @@ def list_dags(project_id, bucket_name):
 
 
 # [START validate_dag]
-def validate_dag(mode, dag_data):
+def validate_dag(mode, dag_data, workspace_dir=None, view=None, stream=False, pool=None):
     """
     Validates a dag file to confirm that it is valid and compatible with Cloud Composer.
     Args:
         mode (string): INLINE, GCS or GIT
         dag_data (string): Either a JSON payload containing the DSL dag definition (mode==INLINE)
                            or the path to a dag file (mode!=INLINE)
+        workspace_dir (string): The workspace directory of the request, where any generated file is written
+        view (dict): The fields and the page of tasks of the dag_definition, see dag_serializer.get_view
+        stream (bool): when True, a dag_definition which is not cached is encoded as it is consumed, see
+                       stream_dag_details, the dag is still validated before this function returns
+        pool (DagValidatorPool): the pool of validator processes which validates the dag, by default an INLINE dag
+                                 is validated by the pool of VALIDATOR_POOL_SIZE and a dag file in this process
     Returns:
-        a dict containing the dag_definition and an is_valid indication
+        a dict containing the dag_definition, as a json string or, when streamed, a generator of JSON strings,
+        and an is_valid indication
     """
     logger.log(logging.DEBUG, f"Validating dag in mode: {mode} with data {dag_data}")
+    view = view or dag_serializer.get_view()
     if mode == "INLINE":
-        dag = __construct_dag_from_dsl(dag_data)
-        dag_val = dag_validator.DagValidator(dag['dag_file'])
+        payload_hash = cache_service.get_payload_hash(dag_data, DEPLOYMENT_KEYS)
+        generator = __get_dag_generator(dag_data, workspace_dir)
+        if generator.serialized:
+            files = __render_dag(generator, payload_hash)
+            dag_definition = __get_validated_dag_definition(
+                cache_service.get_artifact_hash(files),
+                view,
+                lambda: __inspect_serialized_dag(generator, view, stream)
+            )
+        else:
+            # the dag is rendered and inspected in memory, without being written to disk
+            files = __render_dag(generator, payload_hash, embedded=True)
+            dag_definition = __get_validated_dag_definition(
+                cache_service.get_artifact_hash(files),
+                view,
+                lambda: __validate_in_memory(generator, payload_hash, inspect=True, view=view, stream=stream,
+                                             pool=pool)
+            )
     else:
-        dag_val = dag_validator.DagValidator(dag_data)
+        dag_definition = __get_validated_dag_definition(
+            __get_file_artifact_hash(dag_data),
+            view,
+            lambda: __validate_dag_file(dag_data, view, stream, pool)
+        )
 
     dag_details = {
         'is_valid': True,
-        'dag_definition': json.loads(dag_val.inspect_dag()),
+        'dag_definition': dag_definition,
     }
     return dag_details
 # [END validate_dag]
 
 
+# [START stream_dag_details]
+def stream_dag_details(dag_details, with_timings=False):
+    """
+    Encodes the details of a validated dag as JSON, one element at a time. The dag_definition is written as is, so the
+    dag definition is not decoded and encoded again, and a streamed dag_definition is written as it is encoded.
+    Args:
+        dag_details (dict): the details of the dag, as returned by validate_dag
+        with_timings (bool): when True, the timings of the request are written after the dag_definition, so that
+                             they include the encoding of a streamed dag_definition, see timing_service.get_timings
+    Returns:
+        a generator of JSON strings, which concatenated form the JSON document
+    """
+    separator = "{"
+    for name, value in dag_details.items():
+        if name != 'dag_definition':
+            yield f"{separator}{json.dumps(name)}: {json.dumps(value)}"
+            separator = ", "
+    yield f"{separator}\"dag_definition\": "
+    if isinstance(dag_details['dag_definition'], str):
+        yield dag_details['dag_definition']
+    else:
+        yield from dag_details['dag_definition']
+    timings = timing_service.get_timings() if with_timings else None
+    if timings is not None:
+        yield f", \"timings\": {json.dumps(timings)}"
+    yield "}"
+# [END stream_dag_details]
+
+
+# [START validate_dag_static]
+def validate_dag_static(dag_data):
+    """
+    Validates a JSON DSL payload statically, without generating the dag or importing Airflow.
+    Args:
+        dag_data (string): JSON payload containing the DSL dag definition
+    Returns:
+        a dict containing an is_valid indication, and the errors and the warnings of the payload
+    """
+    logger.log(logging.DEBUG, f"Statically validating dag: {dag_data.get('dag_name')}")
+    validator = dag_static_validator.DagStaticValidator(dag_data)
+    errors = validator.validate()
+    return {
+        'is_valid': not errors,
+        'errors': errors,
+        'warnings': validator.warnings
+    }
+# [END validate_dag_static]
+
+
+# [START get_batch_workers]
+def get_batch_workers():
+    """
+    Gets the number of the payloads of a batch which are validated concurrently, from the BATCH_VALIDATION_WORKERS
+    env var.
+    Returns:
+        the number of concurrent validations of a batch
+    """
+    return max(int(os.environ.get('BATCH_VALIDATION_WORKERS', DEFAULT_BATCH_WORKERS)), 1)
+# [END get_batch_workers]
+
+
+# [START get_composer_sidecar_formats]
+def get_composer_sidecar_formats():
+    """
+    Gets the sidecar formats which the Cloud Composer environment can load, from the comma separated
+    COMPOSER_SIDECAR_FORMATS env var.
+    Returns:
+        the set of the sidecar formats of the Cloud Composer environment
+    """
+    sidecar_formats = os.environ.get('COMPOSER_SIDECAR_FORMATS', DEFAULT_COMPOSER_SIDECAR_FORMATS)
+    return {sidecar_format.strip() for sidecar_format in sidecar_formats.split(",") if sidecar_format.strip()}
+# [END get_composer_sidecar_formats]
+
+
+# [START validate_dag_batch]
+def validate_dag_batch(payloads, workspace_dir, view=None):
+    """
+    Validates the dags of a batch of INLINE, GCS or GIT payloads concurrently. The setup which the payloads have in
+    common is only done once per batch; the default Cloud Composer details, and the clone of each GIT repository.
+    The validations start when the first result is requested, and the payloads which have not started are not
+    validated when the generator is closed early.
+    The dags are validated by the pool of validator processes, a pool of BATCH_VALIDATION_WORKERS processes is
+    started for the batch when VALIDATOR_POOL_SIZE is 0, as the imports of the dags would not run in parallel in
+    the threads of this process, e.g. the threads of a gevent worker are cooperative.
+    Args:
+        payloads (list): the JSON payloads of the dags, each one as accepted by /dag/validate
+        workspace_dir (string): The workspace directory of the request, each payload gets its own directory in it
+        view (dict): The fields and the page of tasks of the dag_definitions, see dag_serializer.get_view
+    Returns:
+        a generator of the details of the dag of each payload, in the order in which they complete,
+        see __validate_batch_payload
+    """
+    logger.log(logging.DEBUG, f"Validating a batch of {len(payloads)} dags")
+    batch = {
+        'workspace_dir': workspace_dir,
+        'view': view or dag_serializer.get_view(),
+        'lock': threading.Lock(),
+        'composer_details': None,
+        'repositories': {},
+        'pool': __get_validator_pool()
+    }
+    batch_pool = None
+    if batch['pool'] is None and payloads:
+        batch_pool = dag_validator_pool.DagValidatorPool.from_env(min(get_batch_workers(), len(payloads)))
+        batch['pool'] = batch_pool
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=get_batch_workers())
+    futures = [
+        executor.submit(__validate_batch_payload, batch, index, payload) for index, payload in enumerate(payloads)
+    ]
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+        if batch_pool is not None:
+            batch_pool.close()
+# [END validate_dag_batch]
+
+
+# [START stream_dag_batch]
+def stream_dag_batch(batch_details):
+    """
+    Encodes the details of the dags of a batch as newline delimited JSON, one line per dag, as each dag completes.
+    The dag_definition json strings do not contain new lines, see dag_serializer.DagSerializer.
+    Args:
+        batch_details (iterable): the details of the dags, as returned by validate_dag_batch
+    Returns:
+        a generator of JSON strings, which concatenated form the newline delimited JSON document
+    """
+    for dag_details in batch_details:
+        if 'dag_definition' in dag_details:
+            yield from stream_dag_details(dag_details)
+        else:
+            yield json.dumps(dag_details)
+        yield "\n"
+# [END stream_dag_batch]
+
+
 # [START deploy_dag]
-def deploy_dag(project_id, mode, bucket_name, dag_data=None, dag_file=None):
+def deploy_dag(project_id, mode, bucket_name, dag_data=None, dag_file=None, workspace_dir=None):
     """
     Deploys a dag file into a Cloud Composer environment.
     Args:
@@ -136,6 +340,7 @@ def deploy_dag(project_id, mode, bucket_name, dag_data=None, dag_file=None):
                               (without the /dags prefix)
         dag_data (string): JSON payload containing the DSL dag definition (mode==INLINE)
         dag_file (string): Path to a dag file (mode!=INLINE)
+        workspace_dir (string): The workspace directory of the request, where any generated file is written
     Returns:
         the url to the GCS bucket (gs:// path) where the dag file was deployed
     """
@@ -144,20 +349,62 @@ def deploy_dag(project_id, mode, bucket_name, dag_data=None, dag_file=None):
         if dag_data is None:
             raise ValueError(f"INLINE mode has been specified but no dag_data was provided")
         else:
-            dag = __construct_dag_from_dsl(dag_data)
-            # validate the dag so we don't deploy a dag with errors
-            dag_validator.DagValidator(dag['dag_file']).validate_dag()
-            # upload the DAG and its associated JSON payload
-            gcs_upload_file(project_id, bucket_name, "dags/", dag['dag_file'])
-            gcs_upload_file(project_id, bucket_name, "dags/", dag['json_file'])
+            generator = __get_dag_generator(dag_data, workspace_dir)
+            gcs_dag_path = f"gs://{bucket_name}/dags/{os.path.basename(os.path.normpath(generator.dag_file))}"
+
+            # an unchanged payload, whose files are still the ones in the bucket, does not need to be deployed again
+            # the md5 of every deployed file is checked, as any of the files may have been replaced by another
+            # deployment, e.g. the sidecar of another payload with the same dag_name and so the same dag file
+            payload_hash = cache_service.get_payload_hash(dag_data, DEPLOYMENT_KEYS)
+            deployed_md5s = deployed_dag_cache.get((bucket_name, payload_hash))
+            if deployed_md5s is not None and all(
+                md5 == gcs_get_md5(project_id, bucket_name, blob_name) for blob_name, md5 in deployed_md5s.items()
+            ):
+                logger.log(logging.INFO, f"Dag payload {payload_hash} is already deployed: {gcs_dag_path}")
+                return gcs_dag_path
+
+            if generator.serialized:
+                # a serialized dag has already been validated when it was serialized
+                with timing_service.phase('generation', generator.dag_name):
+                    dag = generator.generate_dag()
+                # upload the DAG, its associated JSON payload and the serialized dag for tooling which inspects
+                # the dag structure, compiled dags do not have an associated JSON payload
+                files = {}
+                for upload_file in [dag['dag_file'], dag['json_file'], dag['serialized_file']]:
+                    if upload_file is not None:
+                        with open(upload_file, 'rb') as f:
+                            files[os.path.basename(upload_file)] = f.read()
+            else:
+                # the rendered DAG and its associated JSON payload are uploaded directly from memory
+                files = __render_dag(generator, payload_hash)
+                # validate the dag so we don't deploy a dag with errors, the uploaded files are validated, so that
+                # the sidecar is loaded as it is loaded by the scheduler, and a dag whose files have already been
+                # validated is not validated again
+                __get_validated_dag_definition(
+                    cache_service.get_artifact_hash(files),
+                    dag_serializer.get_view(),
+                    lambda: __validate_written_files(generator, files)
+                )
+            # only the files which changed are uploaded, so the scheduler does not parse an unchanged dag again
+            for upload_file_name, contents in files.items():
+                gcs_sync_bytes(project_id, bucket_name, "dags/", upload_file_name, contents)
+            deployed_dag_cache.put(
+                (bucket_name, payload_hash),
+                {f"dags/{upload_file_name}": __get_md5(contents) for upload_file_name, contents in files.items()}
+            )
             # return the GCS path
-            return f"gs://{bucket_name}/dags/{os.path.basename(os.path.normpath(dag['dag_file']))}"
+            return gcs_dag_path
     else:
         if dag_file is None:
             raise ValueError(f"GCS mode has been specified but no dag_file was provided")
         else:
-            # validate the dag so we don't deploy a dag with errors
-            dag_validator.DagValidator(dag_file).validate_dag()
+            # validate the dag so we don't deploy a dag with errors, a dag file whose contents have already been
+            # validated is not validated again
+            __get_validated_dag_definition(
+                __get_file_artifact_hash(dag_file),
+                dag_serializer.get_view(),
+                lambda: dag_validator.DagValidator(dag_file).inspect_dag()
+            )
             # upload the DAG
             gcs_upload_file(project_id, bucket_name, "dags/", dag_file)
             # return the GCS path
@@ -190,13 +437,14 @@ def trigger_dag(project_id, location, composer_environment, dag_name, data=None)
 
 
 # [START gcs_download_file]
-def gcs_download_file(project_id, bucket_name, download_file):
+def gcs_download_file(project_id, bucket_name, download_file, workspace_dir=None):
     """
     Downloads a dag file from a GCS bucket.
     Args:
         project_id (string): GCP Project Id of the Cloud Composer instance
         bucket_name (string): The name of the bucket (including any prefixes) where the dag is located
         download_file (string): Name of the dag file to be downloaded
+        workspace_dir (string): The workspace directory of the request, defaults to the temp directory
     Returns:
         the absolute file path to the downloaded file
     """
@@ -208,10 +456,11 @@ def gcs_download_file(project_id, bucket_name, download_file):
     client = storage.Client(project_id, credentials=credentials)
     bucket = client.bucket(bucket_name)
     blob = bucket.blob(download_file)
-    temp_dir = tempfile.gettempdir()
+    temp_dir = workspace_dir if workspace_dir is not None else tempfile.gettempdir()
     download_file_path = os.path.join(temp_dir, f"{os.path.basename(os.path.normpath(download_file))}")
     logger.log(logging.DEBUG, f"Local download path: {download_file_path}")
-    blob.download_to_filename(download_file_path)
+    with timing_service.phase('gcs_download', download_file):
+        blob.download_to_filename(download_file_path)
     return download_file_path
 # [END gcs_download_file]
 
@@ -235,18 +484,87 @@ def gcs_upload_file(project_id, bucket_name, prefix, upload_file):
     bucket = client.bucket(bucket_name)
     upload_file_name = os.path.basename(os.path.normpath(upload_file))
     blob = bucket.blob(prefix + upload_file_name)
-    blob.upload_from_filename(upload_file)
+    with timing_service.phase('gcs_upload', prefix + upload_file_name):
+        blob.upload_from_filename(upload_file)
 # [END gcs_upload_file]
 
 
+# [START gcs_get_md5]
+def gcs_get_md5(project_id, bucket_name, blob_name):
+    """
+    Gets the md5 hash of a file in a GCS bucket.
+    Args:
+        project_id (string): GCP Project Id of the Cloud Composer instance
+        bucket_name (string): The name of the bucket (excluding any prefixes) where the file is located
+        blob_name (string): The name of the file, including the prefix of the GCS bucket
+    Returns:
+        the base64 encoded md5 hash of the file, None if the file does not exist
+    """
+    logger.log(logging.DEBUG, f"Getting md5 of GCS file: bucket_name {bucket_name}, blob_name {blob_name}")
+    credentials = auth_service.get_credentials()
+    client = storage.Client(project_id, credentials=credentials)
+    with timing_service.phase('gcs_metadata', blob_name):
+        blob = client.bucket(bucket_name).get_blob(blob_name)
+    return blob.md5_hash if blob is not None else None
+# [END gcs_get_md5]
+
+
+# [START gcs_upload_bytes]
+def gcs_upload_bytes(project_id, bucket_name, prefix, upload_file_name, contents):
+    """
+    Uploads the in-memory contents of a dag file to a GCS bucket.
+    Args:
+        project_id (string): GCP Project Id of the Cloud Composer instance
+        bucket_name (string): The name of the bucket (excluding any prefixes) where the dag is to be uploaded
+        prefix (string): The prefix of the GCS bucket where the dag is to be uploaded
+        upload_file_name (string): The name of the dag file to be uploaded
+        contents (bytes): The contents of the dag file to be uploaded
+    """
+    logger.log(
+        logging.DEBUG,
+        f"Upload dag to GCS: project_id {project_id}, bucket_name {bucket_name}, prefix {prefix}, "
+        f"upload_file_name {upload_file_name}"
+    )
+    credentials = auth_service.get_credentials()
+    client = storage.Client(project_id, credentials=credentials)
+    bucket = client.bucket(bucket_name)
+    blob = bucket.blob(prefix + upload_file_name)
+    with timing_service.phase('gcs_upload', prefix + upload_file_name):
+        blob.upload_from_string(contents)
+# [END gcs_upload_bytes]
+
+
+# [START gcs_sync_bytes]
+def gcs_sync_bytes(project_id, bucket_name, prefix, upload_file_name, contents):
+    """
+    Uploads the in-memory contents of a dag file to a GCS bucket, unless the file in the bucket already has
+    the same contents.
+    Args:
+        project_id (string): GCP Project Id of the Cloud Composer instance
+        bucket_name (string): The name of the bucket (excluding any prefixes) where the dag is to be uploaded
+        prefix (string): The prefix of the GCS bucket where the dag is to be uploaded
+        upload_file_name (string): The name of the dag file to be uploaded
+        contents (bytes): The contents of the dag file to be uploaded
+    Returns:
+        True if the file was uploaded, False if the file in the bucket is unchanged
+    """
+    if gcs_get_md5(project_id, bucket_name, prefix + upload_file_name) == __get_md5(contents):
+        logger.log(logging.INFO, f"GCS file is unchanged, skipping upload: {prefix + upload_file_name}")
+        return False
+    gcs_upload_bytes(project_id, bucket_name, prefix, upload_file_name, contents)
+    return True
+# [END gcs_sync_bytes]
+
+
 # [START git_download_file]
-def git_download_file(git_url, repo_dir, file_path):
+def git_download_file(git_url, repo_dir, file_path, workspace_dir=None):
     """
     Uploads a dag file to a GCS bucket.
     Args:
         git_url (string): URL of the GIT repo (not including the protocol - excluding https://)
         repo_dir (string): The name of the repository (project slug)
         file_path (string): The relative path within the GIT repo where the dag is located
+        workspace_dir (string): The workspace directory of the request, defaults to the temp directory
     Returns:
         the absolute path to the downloaded file
     """
@@ -256,7 +574,7 @@ def git_download_file(git_url, repo_dir, file_path):
         remote = f"https://{git_username}:{git_username}@{git_url}"
     else:
         remote = f"https://{git_url}"
-    temp_dir = tempfile.gettempdir()
+    temp_dir = workspace_dir if workspace_dir is not None else tempfile.gettempdir()
     repo_path = os.path.join(temp_dir, repo_dir)
     # delete existing local repo if exists
     # we need to set write permissions on temp files in order to delete them
@@ -267,7 +585,8 @@ def git_download_file(git_url, repo_dir, file_path):
                     full_path = os.path.join(root, fname)
                     os.chmod(full_path, stat.S_IWRITE)
             shutil.rmtree(repo_path)
-    Repo.clone_from(remote, repo_path)
+    with timing_service.phase('git_download', repo_dir):
+        Repo.clone_from(remote, repo_path)
     return os.path.join(repo_path, file_path)
 # [END git_download_file]
 
@@ -341,17 +660,368 @@ def get_gcp_composer_details(project_json=None):
 # [END get_gcp_composer_details]
 
 
-# [START __construct_dag_from_dsl]
-def __construct_dag_from_dsl(json_dsl):
+# [START __validate_batch_payload]
+def __validate_batch_payload(batch, index, payload):
+    """
+    Validates the dag of a payload of a batch, see validate_dag_batch. An invalid payload is reported in its result,
+    it does not stop the validation of the batch.
+    Args:
+        batch (dict): the shared state of the batch
+        index (int): the index of the payload in the batch
+        payload (dict): the JSON payload of the dag
+    Returns:
+        a dict containing the index and the dag_name of the payload, the is_valid indication, and either the
+        dag_definition, as a json string, or the error
+    """
+    dag_details = {'index': index, 'dag_name': payload.get('dag_name') if isinstance(payload, dict) else None}
+    try:
+        if not isinstance(payload, dict):
+            raise ValueError(f"The payload of a batch must be a JSON object: {payload}")
+        api_validator.validate_payload(payload)
+        payload_dir = os.path.join(batch['workspace_dir'], f"payload-{index}")
+        os.makedirs(payload_dir)
+        if payload['mode'] == 'GCS':
+            project_id = __get_batch_composer_details(batch, payload)[0]
+            dag_file = gcs_download_file(project_id, payload['bucket_name'], payload['file_path'], payload_dir)
+            dag_details.update(validate_dag('GCS', dag_file, view=batch['view'], pool=batch['pool']))
+        elif payload['mode'] == 'GIT':
+            dag_file = os.path.join(__get_batch_repository(batch, payload), payload['file_path'])
+            dag_details.update(validate_dag('GIT', dag_file, view=batch['view'], pool=batch['pool']))
+        else:
+            dag_details.update(
+                validate_dag('INLINE', payload, workspace_dir=payload_dir, view=batch['view'], pool=batch['pool'])
+            )
+    except Exception as e:
+        logger.log(logging.INFO, f"Dag {dag_details['dag_name']} of the batch is not valid: {e}")
+        dag_details['is_valid'] = False
+        dag_details['error'] = "".join(traceback.format_exception_only(type(e), e)).strip()
+    return dag_details
+# [END __validate_batch_payload]
+
+
+# [START __get_batch_composer_details]
+def __get_batch_composer_details(batch, payload):
+    """
+    Gets the Cloud Composer details of a payload of a batch, the details of the env vars are only read once per batch
+    Args:
+        batch (dict): the shared state of the batch
+        payload (dict): the JSON payload of the dag
+    Returns:
+        a tuple containing project_id, location, composer_environment
+    """
+    if 'project_id' in payload:
+        return get_gcp_composer_details(payload)
+    with batch['lock']:
+        if batch['composer_details'] is None:
+            batch['composer_details'] = get_gcp_composer_details(None)
+        return batch['composer_details']
+# [END __get_batch_composer_details]
+
+
+# [START __get_batch_repository]
+def __get_batch_repository(batch, payload):
+    """
+    Gets the local path of the GIT repository of a payload of a batch, each repository is only cloned once per batch
+    Args:
+        batch (dict): the shared state of the batch
+        payload (dict): the JSON payload of the dag
+    Returns:
+        the absolute path to the clone of the repository
+    """
+    with batch['lock']:
+        key = (payload['git_url'], payload['repo_name'])
+        if key not in batch['repositories']:
+            batch['repositories'][key] = {
+                'lock': threading.Lock(),
+                'clone_dir': os.path.join(batch['workspace_dir'], f"repository-{len(batch['repositories'])}"),
+                'path': None
+            }
+        repository = batch['repositories'][key]
+    # the payloads of other repositories are not blocked while a repository is cloned
+    with repository['lock']:
+        if repository['path'] is None:
+            os.makedirs(repository['clone_dir'], exist_ok=True)
+            git_download_file(payload['git_url'], payload['repo_name'], "", repository['clone_dir'])
+            repository['path'] = os.path.join(repository['clone_dir'], payload['repo_name'])
+    return repository['path']
+# [END __get_batch_repository]
+
+
+# [START __get_dag_generator]
+def __get_dag_generator(json_dsl, workspace_dir=None):
     """
-    Generates a dag file from a JSON DSL payload
+    Gets the dag generator of a JSON DSL payload, once the payload has been validated statically so that the
+    cheap to detect errors of the payload are all reported before the dag is generated
     Args:
         json_dsl (string): Definition of a dag file using the JSON DSL
+        workspace_dir (string): The workspace directory of the request, where any generated file is written
+    Returns:
+        an instance of composer.dag.dag_generator.DagGenerator
+    """
+    with timing_service.phase('static_validation', json_dsl.get('dag_name')):
+        dag_static_validator.DagStaticValidator(json_dsl).assert_valid()
+    # the deployment keys are not rendered, so that the files of a dag are the same in every environment,
+    # as the payload hash under which the rendered files are cached excludes them
+    dag_payload = {key: value for key, value in json_dsl.items() if key not in DEPLOYMENT_KEYS}
+    # a sidecar which the Cloud Composer environment cannot load would only fail once the dag is parsed there
+    sidecar_format = json_dsl.get('sidecar_format', 'json')
+    if sidecar_format not in get_composer_sidecar_formats():
+        logger.log(logging.WARNING, f"Sidecar format {sidecar_format} is not one of the sidecar formats of the "
+                                    f"Cloud Composer environment, using {FALLBACK_SIDECAR_FORMAT}")
+        sidecar_format = FALLBACK_SIDECAR_FORMAT
+    return dag_generator.DagGenerator(
+        dag_payload,
+        compiled=json_dsl.get('compiled', False),
+        serialized=json_dsl.get('serialized', False),
+        workspace_dir=workspace_dir,
+        sidecar_format=sidecar_format
+    )
+# [END __get_dag_generator]
+
+
+# [START __get_md5]
+def __get_md5(contents):
+    """
+    Gets the md5 hash of the contents of a file, in the format used by GCS
+    Args:
+        contents (bytes): the contents of the file
+    Returns:
+        the base64 encoded md5 hash of the contents
+    """
+    return base64.b64encode(hashlib.md5(contents).digest()).decode('utf-8')
+# [END __get_md5]
+
+
+# [START __render_dag]
+def __render_dag(generator, payload_hash, embedded=False):
+    """
+    Renders the files of a dag in memory, the files of an unchanged payload are only rendered once
+    Args:
+        generator (DagGenerator): the dag generator of the JSON DSL payload
+        payload_hash (string): the canonical hash of the JSON DSL payload
+        embedded (bool): when True, the payload is embedded in the dag module, see DagGenerator.render
+    Returns:
+        a dict of file name to file contents as bytes
+    """
+    files = rendered_dag_cache.get((payload_hash, embedded))
+    if files is None:
+        with timing_service.phase('generation', generator.dag_name):
+            files = generator.render(embedded=embedded)
+        rendered_dag_cache.put((payload_hash, embedded), files)
+    return files
+# [END __render_dag]
+
+
+# [START __get_file_artifact_hash]
+def __get_file_artifact_hash(dag_file):
+    """
+    Gets the artifact hash of a dag file, such as a dag file downloaded from GCS or GIT
+    Args:
+        dag_file (string): the path to the dag file
+    Returns:
+        the artifact hash of the name and the contents of the dag file, see cache_service.get_artifact_hash
+    """
+    with open(dag_file, 'rb') as f:
+        return cache_service.get_artifact_hash({os.path.basename(dag_file): f.read()})
+# [END __get_file_artifact_hash]
+
+
+# [START __inspect_dag]
+def __inspect_dag(dag_val, view=None, stream=False):
+    """
+    Validates and inspects a dag, either as a json string or as a stream of JSON strings
+    Args:
+        dag_val (DagValidator): the validator of the dag
+        view (dict): the fields and the page of tasks of the dag definition, see dag_serializer.get_view
+        stream (bool): when True, the dag definition is encoded as it is consumed
+    Returns:
+        the dag definition of the dag, as a json string or, when streamed, a generator of JSON strings
+    """
+    if stream:
+        return dag_val.iter_inspect_dag(view)
+    return dag_val.inspect_dag(view)
+# [END __inspect_dag]
+
+
+# [START __inspect_serialized_dag]
+def __inspect_serialized_dag(generator, view=None, stream=False):
+    """
+    Generates a serialized dag and inspects it from its serialized representation, without importing the dag again
+    Args:
+        generator (DagGenerator): the dag generator of the JSON DSL payload
+        view (dict): the fields and the page of tasks of the dag definition, see dag_serializer.get_view
+        stream (bool): when True, the dag definition is encoded as it is consumed
+    Returns:
+        the dag definition of the dag, as a json string or, when streamed, a generator of JSON strings
+    """
+    with timing_service.phase('generation', generator.dag_name):
+        dag = generator.generate_dag()
+    return __inspect_dag(dag_validator.DagValidator(dag['dag_file'], dag['serialized_file']), view, stream)
+# [END __inspect_serialized_dag]
+
+
+# [START __get_validated_dag_definition]
+def __get_validated_dag_definition(artifact_hash, view, inspect_dag):
+    """
+    Gets the dag definition of a validated dag, which is only validated when the same artifact has not already been
+    validated by the same Airflow version and dag template version. Only valid dags are cached, as a dag may fail
+    for a reason which is not part of the artifact, such as a timeout of the validation. A streamed dag definition
+    is cached once it has been consumed entirely.
+    Args:
+        artifact_hash (string): the hash of the files of the dag, see cache_service.get_artifact_hash
+        view (dict): the fields and the page of tasks of the dag definition, see dag_serializer.get_view
+        inspect_dag (function): validates and inspects the dag, returning its dag definition as a json string or
+                                as a generator of JSON strings
+    Returns:
+        the dag definition of the dag, as a json string or, when it is streamed, a generator of JSON strings
+    """
+    cache_key = (
+        artifact_hash,
+        dag_validator.get_airflow_version(),
+        dag_generator.DagGenerator.TEMPLATE_VERSION,
+        dag_serializer.get_view_key(view)
+    )
+    validation = validation_cache.get(cache_key)
+    if validation is not None:
+        logger.log(logging.INFO, f"Dag artifact {artifact_hash} has already been validated")
+        return validation['dag_definition']
+
+    dag_definition = inspect_dag()
+    if not isinstance(dag_definition, str):
+        return __cache_dag_definition(cache_key, dag_definition)
+    validation_cache.put(cache_key, {'is_valid': True, 'dag_definition': dag_definition})
+    return dag_definition
+# [END __get_validated_dag_definition]
+
+
+# [START __cache_dag_definition]
+def __cache_dag_definition(cache_key, chunks):
+    """
+    Streams a dag definition, and caches it once every chunk has been streamed. A dag definition which is not
+    streamed entirely, e.g. when the client disconnects, is not cached.
+    Args:
+        cache_key (tuple): the key of the dag definition in the validation cache
+        chunks (generator): the JSON strings of the dag definition
+    Returns:
+        a generator of the JSON strings of the dag definition
+    """
+    with contextlib.closing(chunks):
+        dag_definition = []
+        for chunk in chunks:
+            dag_definition.append(chunk)
+            yield chunk
+    validation_cache.put(cache_key, {'is_valid': True, 'dag_definition': "".join(dag_definition)})
+# [END __cache_dag_definition]
+
+
+# [START __get_validator_pool]
+def __get_validator_pool():
+    """
+    Gets the pool of validator processes, which is started on first use
+    Returns:
+        an instance of composer.dag.dag_validator_pool.DagValidatorPool, None when VALIDATOR_POOL_SIZE is 0
+    """
+    global validator_pool
+    if dag_validator_pool.get_validator_pool_size() < 1:
+        return None
+    with validator_pool_lock:
+        if validator_pool is None:
+            validator_pool = dag_validator_pool.DagValidatorPool.from_env()
+    return validator_pool
+# [END __get_validator_pool]
+
+
+# [START __validate_in_memory]
+def __validate_in_memory(generator, payload_hash, inspect=False, view=None, stream=False, pool=None):
+    """
+    Validates, and optionally inspects, a dag which is rendered, with its payload embedded, in memory.
+    The dag is validated by the pool of validator processes when it is enabled, otherwise in this process.
+    Args:
+        generator (DagGenerator): the dag generator of the JSON DSL payload
+        payload_hash (string): the canonical hash of the JSON DSL payload
+        inspect (bool): when True, the dag definition is returned
+        view (dict): the fields and the page of tasks of the dag definition, see dag_serializer.get_view
+        stream (bool): when True, the dag definition of a dag validated in this process is encoded as it is consumed
+        pool (DagValidatorPool): the pool of validator processes, the pool of VALIDATOR_POOL_SIZE when None
+    Returns:
+        the dag definition, as a json string or, when streamed, a generator of JSON strings, when inspect is True,
+        otherwise None
+    """
+    if pool is None:
+        pool = __get_validator_pool()
+    if pool is None:
+        dag_val = __get_in_memory_dag_validator(generator, payload_hash)
+        if inspect:
+            return __inspect_dag(dag_val, view, stream)
+        dag_val.validate_dag()
+        return None
+
+    dag_file_name = os.path.basename(generator.dag_file)
+    source = __render_dag(generator, payload_hash, embedded=True)[dag_file_name]
+    # the module import, the cycle test and the inspect serialization run in the validator process
+    with timing_service.phase('pool_validation', generator.dag_name):
+        result = pool.validate(generator.dag_file, source, inspect=inspect, view=view)
+    if not result['is_valid']:
+        raise ValueError(f"Dag {generator.dag_name} is not valid: {result['error']}")
+    return result.get('dag_definition')
+# [END __validate_in_memory]
+
+
+# [START __validate_written_files]
+def __validate_written_files(generator, files):
+    """
+    Validates and inspects the rendered files of a dag once they are written to the workspace, the dag module is
+    loaded from its dag file and loads its sidecar from the workspace.
+    The dag is validated by the pool of validator processes when it is enabled, otherwise in this process.
+    Args:
+        generator (DagGenerator): the dag generator of the JSON DSL payload
+        files (dict): the rendered files of the dag, see DagGenerator.render
+    Returns:
+        the dag definition of the dag as a json string
+    """
+    with timing_service.phase('generation', generator.dag_name):
+        dag = generator.generate_dag(files)
+    return __validate_dag_file(dag['dag_file'], pool=__get_validator_pool())
+# [END __validate_written_files]
+
+
+# [START __validate_dag_file]
+def __validate_dag_file(dag_file, view=None, stream=False, pool=None):
+    """
+    Validates and inspects a dag file, in the pool of validator processes when one is given, otherwise in this process
+    Args:
+        dag_file (string): the path to the dag file
+        view (dict): the fields and the page of tasks of the dag definition, see dag_serializer.get_view
+        stream (bool): when True, the dag definition of a dag validated in this process is encoded as it is consumed
+        pool (DagValidatorPool): the pool of validator processes, None to validate the dag in this process
+    Returns:
+        the dag definition of the dag, as a json string or, when streamed, a generator of JSON strings
+    """
+    if pool is None:
+        return __inspect_dag(dag_validator.DagValidator(dag_file), view, stream)
+
+    with timing_service.phase('pool_validation', os.path.basename(dag_file)):
+        result = pool.validate(dag_file, None, inspect=True, view=view)
+    if not result['is_valid']:
+        raise ValueError(f"Dag file {dag_file} is not valid: {result['error']}")
+    return result['dag_definition']
+# [END __validate_dag_file]
+
+
+# [START __get_in_memory_dag_validator]
+def __get_in_memory_dag_validator(generator, payload_hash):
+    """
+    Gets a validator of a dag which is rendered, with its payload embedded, and loaded in memory
+    Args:
+        generator (DagGenerator): the dag generator of the JSON DSL payload
+        payload_hash (string): the canonical hash of the JSON DSL payload
     Returns:
-        a tuple containing the absolute path to the dag_file and json_file
+        an instance of composer.dag.dag_validator.DagValidator
     """
-    return dag_generator.DagGenerator(json_dsl).generate_dag()
-# [END __construct_dag_from_dsl]
+    dag_file_name = os.path.basename(generator.dag_file)
+    source = __render_dag(generator, payload_hash, embedded=True)[dag_file_name]
+    return dag_validator.DagValidator(generator.dag_file, source=source)
+# [END __get_in_memory_dag_validator]
 
 
 # [START get_next_actions_experimental_api]
@@ -12,6 +12,7 @@ __status__ = "Development"
 
 import logging
 from composer.utils import log_service
+from composer.dag import dag_dsl, dag_generator
 
 # gets the logger for this module
 logger = log_service.get_module_logger(__name__)
@@ -115,5 +116,22 @@ def __validate_dsl_json(dsl_json):
                 raise ValueError(f"'python_operators' defined but it does not contains a 'function_def': {operator}")
             if len(operator['function_def']) == 0:
                 raise ValueError(f"'python_operator.function_def' defined but it does not contains any code: {operator}")
+    for operators in ['kubernetes_pod_operators', 'bash_operators', 'python_operators']:
+        for operator in dsl_json.get(operators, []):
+            if 'foreach' in operator:
+                placeholder = dag_dsl.get_foreach_placeholder(operator['foreach'])
+                dag_dsl.get_foreach_values(operator['foreach'])
+                if placeholder not in operator['task_id']:
+                    raise ValueError(f"'foreach' defined but the 'task_id' does not contain {placeholder}: {operator}")
+    if "sidecar_format" in dsl_json:
+        if dsl_json['sidecar_format'] not in dag_generator.DagGenerator.SIDECAR_FORMATS:
+            raise ValueError(f"'sidecar_format' defined but it is not one of "
+                             f"{', '.join(dag_generator.DagGenerator.SIDECAR_FORMATS)}: {dsl_json['sidecar_format']}")
+    if "dependencies" in dsl_json:
+        if not isinstance(dsl_json['dependencies'], dict):
+            raise ValueError(f"'dependencies' defined but it is not a task_id to upstream task_ids object: {dsl_json}")
+        for task_id, upstream_task_ids in dsl_json['dependencies'].items():
+            if not isinstance(upstream_task_ids, list):
+                raise ValueError(f"'dependencies' defined but the upstream tasks of {task_id} are not a list")
     return True
 # [END __validate_dsl_json]
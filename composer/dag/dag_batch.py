@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""dag_batch.py: Command line entry point that generates, and optionally validates, a directory of JSON DSL payloads"""
+
+__author__ = "Damian McDonald"
+__credits__ = ["Damian McDonald"]
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Damian McDonald"
+__status__ = "Development"
+
+import os
+import sys
+import json
+import argparse
+from composer.dag import dag_generator
+
+
+# [START parse_args]
+def parse_args(argv=None):
+    """
+    Parses the command line arguments of the batch generation.
+    Args:
+        argv (list): the command line arguments, defaults to sys.argv
+    Returns:
+        an argparse.Namespace of the arguments
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m composer.dag.dag_batch',
+        description='Generates, and optionally validates, a dag for each JSON DSL payload of a directory.'
+    )
+    parser.add_argument('payload_dir', help='directory which contains the payloads as .json files')
+    parser.add_argument('--output-dir', required=True, help='directory in which the dags are generated')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes, defaults to the number of CPUs')
+    parser.add_argument('--compiled', action='store_true', help='generates the dags as compiled dags')
+    parser.add_argument('--serialized', action='store_true', help='also generates the serialized dags')
+    parser.add_argument('--validate', action='store_true',
+                        help='imports each generated dag to verify that it is valid, Airflow must be installed')
+    parser.add_argument('--sidecar-format', default='json', choices=dag_generator.DagGenerator.SIDECAR_FORMATS,
+                        help='format of the json data files of the dags')
+    parser.add_argument('--report', default=None, help='path of the json report, defaults to stdout')
+    return parser.parse_args(argv)
+# [END parse_args]
+
+
+# [START main]
+def main(argv=None):
+    """
+    Generates the dags of a directory of payloads and writes the per payload report.
+    Args:
+        argv (list): the command line arguments, defaults to sys.argv
+    Returns:
+        the exit status, 0 when every dag was generated and 1 when any dag failed
+    """
+    args = parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+    payloads = dag_generator.DagGenerator.load_payloads(args.payload_dir)
+    reports = dag_generator.DagGenerator.generate_many(
+        payloads,
+        workspace_dir=args.output_dir,
+        workers=args.workers,
+        compiled=args.compiled,
+        serialized=args.serialized,
+        validate=args.validate,
+        sidecar_format=args.sidecar_format
+    )
+
+    if args.report is None:
+        json.dump(reports, sys.stdout, indent=4)
+        sys.stdout.write("\n")
+    else:
+        with open(args.report, 'w') as f:
+            json.dump(reports, f, indent=4)
+
+    errors = [report for report in reports if report['status'] != 'SUCCESS']
+    for report in errors:
+        sys.stderr.write(f"{report['dag_name']}: {report['error']}\n")
+    sys.stderr.write(f"Generated {len(reports) - len(errors)} of {len(reports)} dags.\n")
+    return 1 if errors else 0
+# [END main]
+
+
+if __name__ == '__main__':
+    sys.exit(main())
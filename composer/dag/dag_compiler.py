@@ -0,0 +1,554 @@
+#!/usr/bin/env python
+
+"""dag_compiler.py: Module that compiles a JSON DSL into a static, fully materialized Cloud Composer dag module"""
+
+__author__ = "Damian McDonald"
+__credits__ = ["Damian McDonald"]
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Damian McDonald"
+__status__ = "Development"
+
+import hashlib
+import logging
+import importlib.util
+from composer.utils import log_service
+from composer.dag import dag_dsl
+
+
+class DagCompiler:
+    """
+    Class used to compile a JSON DSL definition into the source code of a static Airflow DAG module.
+
+    Unlike dag_template.py, the compiled module does not read the JSON DSL when it is parsed by the Airflow
+    scheduler. Operators, dependencies and dynamic functions are written out as plain python statements.
+    """
+
+    # [START global variable definitions]
+    INDENT = "    "
+    DYNAMIC_FUNCTIONS = ['start_date', 'schedule_interval', 'retry_delay', 'dagrun_timeout']
+    KUBERNETES_POD_OPERATOR_ATTRIBUTES = [
+        'cmds', 'arguments', 'env_vars', 'labels', 'startup_timeout_seconds', 'ports', 'params',
+        'node_selectors', 'resources', 'config_file', 'annotations', 'volumes', 'volume_mounts',
+        'affinity', 'configmaps', 'image_pull_policy'
+    ]
+    # [END global variable definitions]
+
+    # gets the logger for this module
+    logger = log_service.get_module_logger(__name__)
+
+    # [START DagCompiler constructor]
+    def __init__(self, payload, dag_name, code_cache=None):
+        """
+        DagCompiler constructor.
+        Args:
+            payload (dict): the JSON DSL definition of the dag
+            dag_name (string): the sanitized name of the dag, used for the module docstring
+            code_cache (dict): the marshalled code objects of the python code blocks of the payload, keyed by the
+                               sha256 of their source code, see DagGenerator.build_code_cache
+        """
+        self.payload = payload
+        self.dag_name = dag_name
+        self.code_cache = code_cache or {}
+        # the source code of the python code blocks executed by the dag module, keyed by the sha256 of their source
+        self.code_blocks = {}
+        # the task_id of each foreach operator mapped to the task_ids of its expanded operators
+        self.task_groups = {}
+        # the number of operators of the dag once its foreach operators are expanded, see dag_dsl.get_max_expanded_tasks
+        self.task_count = 0
+    # [END DagCompiler constructor]
+
+    # [START __literal]
+    @staticmethod
+    def __literal(value):
+        """
+        Renders a JSON value as a python literal.
+        Args:
+            value (object): a JSON compatible value (str, int, float, bool, None, list or dict)
+        Returns:
+            the python source code representation of the value
+        """
+        return repr(value)
+    # [END __literal]
+
+    # [START __function_factory]
+    def __function_factory(self, factory_name, func_def, func_name):
+        """
+        Wraps a DSL function definition in a factory function so that each definition keeps its own namespace.
+        The definition is executed unchanged, as module level code, in the namespace of the factory, so that its
+        multi-line strings and its module level statements, such as from x import *, keep their meaning. Its code
+        object is loaded from the code cache of the module, see compile_code_cache.
+        Args:
+            factory_name (string): the name of the factory function to be generated
+            func_def (list): the lines of python code of the DSL function definition
+            func_name (string): the name of the function, defined in func_def, returned by the factory
+        Returns:
+            a list of lines of python code
+        """
+        source = "\n".join(func_def)
+        key = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        self.code_blocks[key] = source
+        return [
+            f"def {factory_name}():",
+            f"{self.INDENT}namespace = {{}}",
+            f"{self.INDENT}exec(load_code({self.__literal(key)}), namespace)",
+            f"{self.INDENT}return namespace[{self.__literal(func_name)}]",
+            "",
+            ""
+        ]
+    # [END __function_factory]
+
+    # [START expand_operators]
+    def expand_operators(self, operators_ref):
+        """
+        Expands the foreach operators of an operator family, recording the task_ids of each foreach operator.
+        Args:
+            operators_ref (list): the definitions of the operators of the family
+        Returns:
+            a list of operator definitions
+        """
+        operators = []
+        max_tasks = dag_dsl.get_max_expanded_tasks()
+        for operator_template in operators_ref:
+            task_group = []
+            for operator in dag_dsl.expand_operator(operator_template):
+                self.task_count += 1
+                dag_dsl.assert_expanded_tasks(self.task_count, max_tasks)
+                task_group.append(operator['task_id'])
+                operators.append(operator)
+            if 'foreach' in operator_template:
+                self.task_groups[operator_template['task_id']] = task_group
+        return operators
+    # [END expand_operators]
+
+    # [START resolve_task]
+    def resolve_task(self, task, task_ids, section):
+        """
+        Resolves a task_id referenced by the dag dependencies to the task_ids of the operators it refers to.
+        Args:
+            task (string): the referenced task_id, a foreach operator refers to all of its expanded operators
+            task_ids (set): the task ids of all of the operators defined in the dag
+            section (string): the payload section which references the task, used for the error message
+        Returns:
+            a list of task_ids
+        """
+        if task in self.task_groups:
+            return self.task_groups[task]
+        if task not in task_ids:
+            raise ValueError(
+                f"Task {task} is specified as a task in the '{section}' "
+                "but it has not been defined as a DAG task"
+            )
+        return [task]
+    # [END resolve_task]
+
+    # [START get_operator_families]
+    def get_operator_families(self):
+        """
+        Validates and returns the operator families defined in the payload, with the foreach operators expanded.
+        Returns:
+            a tuple containing the bash, python and kubernetes pod operator definitions
+        """
+        bash_operators = self.payload.get('bash_operators')
+        python_operators = self.payload.get('python_operators')
+        kubernetes_pod_operators = self.payload.get('kubernetes_pod_operators')
+
+        if bash_operators is None and python_operators is None and kubernetes_pod_operators is None:
+            raise ValueError(
+                "A DAG definition must contain at least one of; "
+                "bash_operators, python_operators or kubernetes_pod_operators."
+            )
+
+        if (
+                (bash_operators is not None and not len(bash_operators) > 0)
+                or (python_operators is not None and not len(python_operators) > 0)
+                or (kubernetes_pod_operators is not None and not len(kubernetes_pod_operators) > 0)
+        ):
+            raise ValueError(
+                "A DAG definition must contain at least one element in; "
+                "bash_operators, python_operators or kubernetes_pod_operators."
+            )
+
+        return (
+            self.expand_operators(bash_operators or []),
+            self.expand_operators(python_operators or []),
+            self.expand_operators(kubernetes_pod_operators or [])
+        )
+    # [END get_operator_families]
+
+    # [START compile_imports]
+    def compile_imports(self, bash_operators, python_operators, kubernetes_pod_operators):
+        """
+        Compiles the import statements, only importing the operator modules which are used by the dag.
+        Returns:
+            a list of lines of python code
+        """
+        lines = [
+            "#!/usr/bin/env python",
+            "",
+            f'"""{self.dag_name}.py: Cloud Composer dag compiled from a JSON DSL definition"""',
+            "",
+            "import datetime",
+            "import airflow",
+        ]
+        if self.code_blocks:
+            lines.append("import marshal")
+            lines.append("import importlib.util")
+        if bash_operators:
+            lines.append("from airflow.operators import bash_operator")
+        if python_operators:
+            lines.append("from airflow.operators import python_operator")
+        if kubernetes_pod_operators:
+            lines.append("from airflow.contrib.kubernetes import secret")
+            lines.append("from airflow.contrib.operators import kubernetes_pod_operator")
+        lines.append("")
+        lines.append("")
+        return lines
+    # [END compile_imports]
+
+    # [START compile_code_cache]
+    def compile_code_cache(self):
+        """
+        Compiles the code cache of the python code blocks of the dag, used by the function factories. A code object
+        is unmarshalled when it was compiled by the same python version as the one which parses the dag, otherwise
+        it is compiled from its source code, and each block is only loaded once.
+        Returns:
+            a list of lines of python code
+        """
+        lines = [
+            "# [START load_code]",
+            f"code_cache_magic = {importlib.util.MAGIC_NUMBER!r}",
+            "code_cache = {",
+        ]
+        for key in sorted(self.code_blocks):
+            if key in self.code_cache:
+                lines.append(f"{self.INDENT}{self.__literal(key)}: {self.code_cache[key]!r},")
+        lines.append("}")
+        lines.append("code_sources = {")
+        for key in sorted(self.code_blocks):
+            lines.append(f"{self.INDENT}{self.__literal(key)}: {self.__literal(self.code_blocks[key])},")
+        lines.append("}")
+        lines.append("compiled_code = {}")
+        lines.append("")
+        lines.append("")
+        lines.append("def load_code(key):")
+        lines.append(f"{self.INDENT}if key not in compiled_code:")
+        lines.append(f"{self.INDENT * 2}if key in code_cache and code_cache_magic == importlib.util.MAGIC_NUMBER:")
+        lines.append(f"{self.INDENT * 3}compiled_code[key] = marshal.loads(code_cache[key])")
+        lines.append(f"{self.INDENT * 2}else:")
+        lines.append(f"{self.INDENT * 3}compiled_code[key] = compile(code_sources[key], '<string>', 'exec')")
+        lines.append(f"{self.INDENT}return compiled_code[key]")
+        lines.append("# [END load_code]")
+        lines.append("")
+        lines.append("")
+        return lines
+    # [END compile_code_cache]
+
+    # [START compile_dynamic_functions]
+    def compile_dynamic_functions(self):
+        """
+        Compiles the factories of the dynamic functions (start_date, schedule_interval, retry_delay and
+        dagrun_timeout) declared in the payload.
+        Returns:
+            a tuple containing a list of lines of python code and a dict of dynamic function key to factory name
+        """
+        lines = ["# [START dynamic function declarations]"]
+        factories = {}
+        dynamic_functions = self.payload.get('dynamic_functions', {})
+        for key_name in self.DYNAMIC_FUNCTIONS:
+            if key_name not in dynamic_functions:
+                continue
+            func_dict = dynamic_functions[key_name]
+            func_def = f"{key_name}_def"
+            func_name = f"{key_name}_name"
+            if func_def not in func_dict:
+                raise ValueError(f"{key_name} dynamic function requested but '{func_def}' was not found.")
+            if func_name not in func_dict:
+                raise ValueError(f"{key_name} dynamic function requested but '{func_name}' was not found.")
+            factories[key_name] = f"_dynamic_function_{key_name}"
+            lines.extend(self.__function_factory(factories[key_name], func_dict[func_def], func_dict[func_name]))
+        lines.append("# [END dynamic function declarations]")
+        lines.append("")
+        lines.append("")
+        return lines, factories
+    # [END compile_dynamic_functions]
+
+    # [START compile_dag_definition]
+    def compile_dag_definition(self, factories):
+        """
+        Compiles the default_args and the DAG definition.
+        Args:
+            factories (dict): dynamic function key to factory name, as returned by compile_dynamic_functions
+        Returns:
+            a list of lines of python code
+        """
+        lines = [
+            "# [START default_args definitions]",
+            f"default_args = {self.__literal(dict(self.payload.get('default_args', {})))}",
+        ]
+        if 'retry_delay' in factories:
+            lines.append(f"default_args['retry_delay'] = {factories['retry_delay']}()()")
+        lines.append("# [END default_args definitions]")
+        lines.append("")
+        lines.append("")
+
+        lines.append("# [START DAG definition]")
+        lines.append(f"dag = airflow.DAG({self.__literal(self.payload['dag_name'])}, default_args=default_args)")
+        if 'start_date' in factories:
+            lines.append(f"dag.start_date = {factories['start_date']}()()")
+        else:
+            lines.append(
+                "dag.start_date = datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(days=1)"
+            )
+        if 'schedule_interval' in factories:
+            lines.append(f"dag.schedule_interval = {factories['schedule_interval']}()()")
+        if 'dagrun_timeout' in factories:
+            lines.append(f"dag.dagrun_timeout = {factories['dagrun_timeout']}()()")
+        if 'dag_tags' in self.payload:
+            lines.append(f"dag.tags = {self.__literal(self.payload['dag_tags'])}")
+        if 'dag_params' in self.payload:
+            lines.append(f"dag.params = {self.__literal(self.payload['dag_params'])}")
+        if 'dag_doc_md' in self.payload:
+            lines.append(f"dag.doc_md = {self.__literal(chr(10).join(self.payload['dag_doc_md']))}")
+        lines.append("# [END DAG definition]")
+        lines.append("")
+        lines.append("")
+        return lines
+    # [END compile_dag_definition]
+
+    # [START compile_bash_operators]
+    def compile_bash_operators(self, bash_operators):
+        """
+        Compiles the constructors of operators of type: BashOperator.
+        Args:
+            bash_operators (list): the definitions of the bash operators
+        Returns:
+            a list of lines of python code
+        """
+        lines = []
+        for operator_ref in bash_operators:
+            task_id = self.__literal(operator_ref['task_id'])
+            lines.append(f"tasks[{task_id}] = bash_operator.BashOperator(")
+            lines.append(f"{self.INDENT}task_id={task_id},")
+            lines.append(f"{self.INDENT}bash_command={self.__literal(';'.join(operator_ref['command']))},")
+            lines.append(f"{self.INDENT}dag=dag")
+            lines.append(")")
+        return lines
+    # [END compile_bash_operators]
+
+    # [START compile_python_operators]
+    def compile_python_operators(self, python_operators):
+        """
+        Compiles the callables and the constructors of operators of type: PythonOperator.
+        Args:
+            python_operators (list): the definitions of the python operators
+        Returns:
+            a tuple containing the lines of the callable factories and the lines of the operator constructors
+        """
+        factory_lines = []
+        lines = []
+        for i, operator_ref in enumerate(python_operators):
+            factory_name = f"_python_callable_{i}"
+            factory_lines.extend(
+                self.__function_factory(factory_name, operator_ref['function_def'], operator_ref['function_name'])
+            )
+            task_id = self.__literal(operator_ref['task_id'])
+            lines.append(f"tasks[{task_id}] = python_operator.PythonOperator(")
+            lines.append(f"{self.INDENT}task_id={task_id},")
+            lines.append(f"{self.INDENT}python_callable={factory_name}(),")
+            lines.append(f"{self.INDENT}dag=dag")
+            lines.append(")")
+        return factory_lines, lines
+    # [END compile_python_operators]
+
+    # [START compile_kubernetes_secrets]
+    def compile_kubernetes_secrets(self, kubernetes_pod_operators):
+        """
+        Compiles a single table of the kubernetes secrets referenced by the kubernetes pod operators.
+        Every undefined secret reference is reported in a single error.
+        Args:
+            kubernetes_pod_operators (list): the definitions of the kubernetes pod operators
+        Returns:
+            a list of lines of python code
+        """
+        kubernetes_secrets_ref = self.payload.get('kubernetes_secrets', {})
+        referenced = []
+        undefined_secrets = []
+        for operator_ref in kubernetes_pod_operators:
+            for ref_key in ['pod_secret_refs', 'image_pull_secret_refs']:
+                for secret_ref in operator_ref.get(ref_key, []):
+                    if secret_ref not in kubernetes_secrets_ref:
+                        undefined_secrets.append(
+                            f"Pod {operator_ref['name']} declares secret '{secret_ref}' in '{ref_key}'"
+                        )
+                    elif secret_ref not in referenced:
+                        referenced.append(secret_ref)
+
+        if undefined_secrets:
+            raise ValueError(
+                "Kubernetes secrets are referenced but they have not been defined in 'kubernetes_secrets': "
+                + "; ".join(undefined_secrets)
+            )
+
+        if not referenced:
+            return []
+
+        lines = ["kubernetes_secrets = {"]
+        for secret_ref in referenced:
+            secret_entry_ref = self.payload['kubernetes_secrets'][secret_ref]
+            lines.append(f"{self.INDENT}{self.__literal(secret_ref)}: secret.Secret(")
+            lines.append(f"{self.INDENT * 2}deploy_type={self.__literal(secret_entry_ref['deploy_type'])},")
+            lines.append(f"{self.INDENT * 2}deploy_target={self.__literal(secret_entry_ref['deploy_target'])},")
+            lines.append(f"{self.INDENT * 2}secret={self.__literal(secret_entry_ref['secret'])},")
+            lines.append(f"{self.INDENT * 2}key={self.__literal(secret_entry_ref['key'])}")
+            lines.append(f"{self.INDENT}),")
+        lines.append("}")
+        lines.append("")
+        return lines
+    # [END compile_kubernetes_secrets]
+
+    # [START compile_kubernetes_pod_operators]
+    def compile_kubernetes_pod_operators(self, kubernetes_pod_operators):
+        """
+        Compiles the constructors of operators of type: KubernetesPodOperator.
+        Args:
+            kubernetes_pod_operators (list): the definitions of the kubernetes pod operators
+        Returns:
+            a list of lines of python code
+        """
+        lines = []
+        for operator_ref in kubernetes_pod_operators:
+            task_id = self.__literal(operator_ref['task_id'])
+            lines.append("op = kubernetes_pod_operator.KubernetesPodOperator(")
+            lines.append(f"{self.INDENT}task_id={task_id},")
+            lines.append(f"{self.INDENT}name={self.__literal(operator_ref['name'])},")
+            lines.append(f"{self.INDENT}image={self.__literal(operator_ref['image'])},")
+            lines.append(f"{self.INDENT}namespace={self.__literal(operator_ref.get('namespace', 'default'))},")
+            lines.append(f"{self.INDENT}dag=dag")
+            lines.append(")")
+            for attribute in self.KUBERNETES_POD_OPERATOR_ATTRIBUTES:
+                if attribute in operator_ref:
+                    lines.append(f"op.{attribute} = {self.__literal(operator_ref[attribute])}")
+            if 'pod_secret_refs' in operator_ref:
+                secret_refs = ", ".join(
+                    f"kubernetes_secrets[{self.__literal(ref)}]" for ref in operator_ref['pod_secret_refs']
+                )
+                lines.append(f"op.secrets = [{secret_refs}]")
+            if 'image_pull_secret_refs' in operator_ref:
+                secret_refs = ", ".join(
+                    f"kubernetes_secrets[{self.__literal(ref)}]" for ref in operator_ref['image_pull_secret_refs']
+                )
+                lines.append(f"op.image_pull_secrets = [{secret_refs}]")
+            lines.append(f"tasks[{task_id}] = op")
+        return lines
+    # [END compile_kubernetes_pod_operators]
+
+    # [START compile_execution_sequence]
+    def compile_execution_sequence(self, task_ids):
+        """
+        Compiles the execution sequence of the dag as one dependency statement per edge.
+        Args:
+            task_ids (set): the task ids of all of the operators defined in the dag
+        Returns:
+            a list of lines of python code
+        """
+        if 'execution_sequence' not in self.payload:
+            return []
+
+        execution_sequence_ref = [
+            self.resolve_task(task, task_ids, 'execution_sequence') for task in self.payload['execution_sequence']
+        ]
+
+        lines = ["# [START define the sequence of task execution]"]
+        for upstream_tasks, downstream_tasks in zip(execution_sequence_ref, execution_sequence_ref[1:]):
+            if len(downstream_tasks) == 1:
+                downstream_ref = f"tasks[{self.__literal(downstream_tasks[0])}]"
+            else:
+                downstream_ref = "[" + ", ".join(f"tasks[{self.__literal(elem)}]" for elem in downstream_tasks) + "]"
+            for upstream in upstream_tasks:
+                lines.append(f"tasks[{self.__literal(upstream)}] >> {downstream_ref}")
+        lines.append("# [END define the sequence of task execution]")
+        lines.append("")
+        return lines
+    # [END compile_execution_sequence]
+
+    # [START compile_dependencies]
+    def compile_dependencies(self, task_ids):
+        """
+        Compiles the dependencies of the dag as one statement per task, which adds all of its upstream tasks.
+        Args:
+            task_ids (set): the task ids of all of the operators defined in the dag
+        Returns:
+            a list of lines of python code
+        """
+        if 'dependencies' not in self.payload:
+            return []
+
+        dependencies_ref = self.payload['dependencies']
+        unknown_tasks = {}
+        for task, upstream_tasks in dependencies_ref.items():
+            for elem in [task] + upstream_tasks:
+                if elem not in task_ids and elem not in self.task_groups:
+                    unknown_tasks[elem] = None
+        if unknown_tasks:
+            raise ValueError(
+                f"Tasks {', '.join(unknown_tasks)} are specified as tasks in the 'dependencies' "
+                "but they have not been defined as DAG tasks"
+            )
+
+        lines = ["# [START define the dependencies of the tasks]"]
+        for task, upstream_tasks in dependencies_ref.items():
+            upstream_refs = ", ".join(
+                f"tasks[{self.__literal(elem)}]"
+                for upstream in upstream_tasks
+                for elem in self.resolve_task(upstream, task_ids, 'dependencies')
+            )
+            if upstream_refs:
+                for elem in self.resolve_task(task, task_ids, 'dependencies'):
+                    lines.append(f"tasks[{self.__literal(elem)}].set_upstream([{upstream_refs}])")
+        lines.append("# [END define the dependencies of the tasks]")
+        lines.append("")
+        return lines
+    # [END compile_dependencies]
+
+    # [START compile]
+    def compile(self):
+        """
+        Compiles the JSON DSL definition into the source code of a static Airflow DAG module.
+        Returns:
+            the source code of the dag module as a string
+        """
+        self.logger.log(logging.DEBUG, f"Compiling the dag: {self.dag_name}")
+        bash_operators, python_operators, kubernetes_pod_operators = self.get_operator_families()
+        dynamic_function_lines, factories = self.compile_dynamic_functions()
+        python_factory_lines, python_operator_lines = self.compile_python_operators(python_operators)
+
+        task_ids = set(
+            operator_ref['task_id']
+            for operator_ref in bash_operators + python_operators + kubernetes_pod_operators
+        )
+
+        lines = self.compile_imports(bash_operators, python_operators, kubernetes_pod_operators)
+        if self.code_blocks:
+            lines.extend(self.compile_code_cache())
+        lines.extend(dynamic_function_lines)
+        if python_factory_lines:
+            lines.append("# [START python operator callables]")
+            lines.extend(python_factory_lines)
+            lines.append("# [END python operator callables]")
+            lines.append("")
+            lines.append("")
+        lines.extend(self.compile_dag_definition(factories))
+        lines.append("# [START add operators to DAG]")
+        lines.extend(self.compile_kubernetes_secrets(kubernetes_pod_operators))
+        lines.append("tasks = {}")
+        lines.extend(self.compile_bash_operators(bash_operators))
+        lines.extend(python_operator_lines)
+        lines.extend(self.compile_kubernetes_pod_operators(kubernetes_pod_operators))
+        lines.append("# [END add operators to DAG]")
+        lines.append("")
+        lines.append("")
+        lines.extend(self.compile_execution_sequence(task_ids))
+        lines.extend(self.compile_dependencies(task_ids))
+        return "\n".join(lines) + "\n"
+    # [END compile]
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+"""dag_dsl.py: Module that provides the expansion of the parametric ("foreach") operators of the JSON DSL"""
+
+__author__ = "Damian McDonald"
+__credits__ = ["Damian McDonald"]
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Damian McDonald"
+__status__ = "Development"
+
+import os
+
+"""
+NOTE: dag_template.py is deployed without the composer package, so it contains its own copy of the functions of
+this module. Any change to the expansion of the foreach operators must be made in both modules.
+"""
+
+# the default maximum number of tasks of a dag once its foreach operators are expanded, see get_max_expanded_tasks
+DEFAULT_MAX_EXPANDED_TASKS = 10000
+
+
+# [START get_max_expanded_tasks]
+def get_max_expanded_tasks():
+    """
+    Gets the maximum number of tasks of a dag once its foreach operators are expanded, from the MAX_EXPANDED_TASKS
+    env var, so that a foreach range can not make the expansion of a payload unbounded.
+    Returns:
+        the maximum number of tasks of a dag
+    """
+    return int(os.environ.get('MAX_EXPANDED_TASKS', DEFAULT_MAX_EXPANDED_TASKS))
+# [END get_max_expanded_tasks]
+
+
+# [START assert_expanded_tasks]
+def assert_expanded_tasks(task_count, max_tasks):
+    """
+    Asserts that a dag does not define more tasks than the maximum, as its operators are expanded one at a time.
+    Args:
+        task_count (int): the number of tasks of the dag expanded so far
+        max_tasks (int): the maximum number of tasks of a dag, see get_max_expanded_tasks
+    """
+    if task_count > max_tasks:
+        raise ValueError(f"The DAG defines more than {max_tasks} tasks once its foreach operators are expanded")
+# [END assert_expanded_tasks]
+
+
+# [START get_foreach_placeholder]
+def get_foreach_placeholder(foreach_ref):
+    """
+    Gets the placeholder which is replaced by each value of a foreach operator.
+    Args:
+        foreach_ref (dict): the foreach definition of the operator
+    Returns:
+        the placeholder string, {{foreach.<name>}}
+    """
+    if 'name' not in foreach_ref:
+        raise ValueError(f"'foreach' defined but it does not contain a 'name': {foreach_ref}")
+    return "{{foreach." + foreach_ref['name'] + "}}"
+# [END get_foreach_placeholder]
+
+
+# [START get_foreach_values]
+def get_foreach_values(foreach_ref):
+    """
+    Gets the values of a foreach operator, either the list of values or a lazy range of integers.
+    Args:
+        foreach_ref (dict): the foreach definition of the operator
+    Returns:
+        an iterable of the values of the foreach operator
+    """
+    if 'values' in foreach_ref and 'range' not in foreach_ref:
+        if not isinstance(foreach_ref['values'], list):
+            raise ValueError(f"'foreach.values' defined but it is not a list: {foreach_ref}")
+        return foreach_ref['values']
+    if 'range' in foreach_ref and 'values' not in foreach_ref:
+        range_ref = foreach_ref['range']
+        if (
+                not isinstance(range_ref, list)
+                or len(range_ref) not in [2, 3]
+                or not all(isinstance(elem, int) for elem in range_ref)
+        ):
+            raise ValueError(f"'foreach.range' defined but it is not a list of [start, stop] or [start, stop, step] "
+                             f"integers: {foreach_ref}")
+        return range(*range_ref)
+    raise ValueError(f"'foreach' defined but it does not contain exactly one of 'values' or 'range': {foreach_ref}")
+# [END get_foreach_values]
+
+
+# [START substitute_foreach]
+def substitute_foreach(value, placeholder, replacement):
+    """
+    Replaces the placeholder of a foreach operator in every string of a JSON value.
+    A string which is exactly the placeholder is replaced by the value itself, which keeps its JSON type.
+    Args:
+        value (object): a JSON compatible value (str, int, float, bool, None, list or dict)
+        placeholder (string): the placeholder of the foreach operator
+        replacement (object): the foreach value which replaces the placeholder
+    Returns:
+        a copy of the value with the placeholder replaced
+    """
+    if isinstance(value, str):
+        if value == placeholder:
+            return replacement
+        return value.replace(placeholder, str(replacement))
+    if isinstance(value, list):
+        return [substitute_foreach(elem, placeholder, replacement) for elem in value]
+    if isinstance(value, dict):
+        return {k: substitute_foreach(v, placeholder, replacement) for k, v in value.items()}
+    return value
+# [END substitute_foreach]
+
+
+# [START expand_operator]
+def expand_operator(operator_ref):
+    """
+    Expands an operator definition. An operator without a foreach definition is yielded as is, a foreach operator
+    is yielded once per value, one operator at a time, so the expanded operators are never held in memory together.
+    Args:
+        operator_ref (dict): the definition of the operator
+    Returns:
+        a generator of operator definitions
+    """
+    if 'foreach' not in operator_ref:
+        yield operator_ref
+        return
+
+    foreach_ref = operator_ref['foreach']
+    placeholder = get_foreach_placeholder(foreach_ref)
+    values = get_foreach_values(foreach_ref)
+    if placeholder not in operator_ref.get('task_id', ''):
+        raise ValueError(f"'foreach' defined but the 'task_id' does not contain the placeholder {placeholder}: "
+                         f"{operator_ref.get('task_id')}")
+
+    operator_template = {k: v for k, v in operator_ref.items() if k != 'foreach'}
+    for value in values:
+        yield substitute_foreach(operator_template, placeholder, value)
+# [END expand_operator]
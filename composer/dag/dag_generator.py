@@ -11,13 +11,140 @@ __status__ = "Development"
 
 import os
 import ntpath
-import shutil
 import re
+import gzip
 import json
 import tempfile
 import logging
+import hashlib
+import marshal
+import time
+import traceback
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from composer.utils import log_service
+from composer.dag import dag_compiler
+from composer.dag import dag_dsl
+
+
+# [START split_dag_template]
+def split_dag_template(template_file, insertion_marker):
+    """
+    Reads the dag template and splits it after the line which contains the insertion marker.
+    Args:
+        template_file (string): the path to the dag template
+        insertion_marker (string): the marker of the line after which the dynamic data is inserted
+    Returns:
+        a tuple containing the bytes of the template before and after the insertion position
+    """
+    with open(template_file, 'rb') as f:
+        contents = f.read()
+    marker_pos = contents.index(insertion_marker.encode('utf-8'))
+    insertion_pos = contents.index(b"\n", marker_pos) + 1
+    return contents[:insertion_pos], contents[insertion_pos:]
+# [END split_dag_template]
+
+
+# [START canonicalize_payload]
+def canonicalize_payload(payload):
+    """
+    Gets the canonical form of a JSON DSL payload, so that semantically identical payloads are rendered to
+    identical bytes; the keys of every object are sorted and the operators of each family are sorted by task_id.
+    Args:
+        payload (dict): the JSON DSL payload of the dag
+    Returns:
+        a canonical copy of the payload
+    """
+    canonical_payload = json.loads(json.dumps(payload, sort_keys=True))
+    for operator_family in DagGenerator.OPERATOR_FAMILIES:
+        operators = canonical_payload.get(operator_family)
+        if isinstance(operators, list):
+            # invalid operators are kept, so that the dag template reports the error when the dag is parsed
+            canonical_payload[operator_family] = sorted(
+                operators,
+                key=lambda operator: str(operator.get('task_id', '')) if isinstance(operator, dict) else ''
+            )
+    return canonical_payload
+# [END canonicalize_payload]
+
+
+# [START create_dag_report]
+def create_dag_report(payload, error=None):
+    """
+    Creates the report of a dag, see generate_dag_report.
+    Args:
+        payload (dict): the JSON DSL payload of the dag
+        error (string): the error of the dag, the dag is reported as a SUCCESS when None
+    Returns:
+        a dict containing the dag_name, the status (SUCCESS or ERROR) and the error, and the empty files,
+        changed_files and timings of the dag
+    """
+    return {
+        'dag_name': payload.get('dag_name') if isinstance(payload, dict) else None,
+        'status': 'SUCCESS' if error is None else 'ERROR',
+        'files': {},
+        'changed_files': [],
+        'timings': {},
+        'error': error
+    }
+# [END create_dag_report]
+
+
+# [START generate_dag_report]
+def generate_dag_report(payload, workspace_dir, compiled=False, serialized=False, validate=False,
+                        sidecar_format='json'):
+    """
+    Generates, and optionally validates, a single dag and reports the outcome instead of raising.
+    Defined at module level so that it can be executed by the worker processes of DagGenerator.generate_many.
+    Args:
+        payload (dict): the JSON DSL payload of the dag
+        workspace_dir (string): the directory in which the dag files are generated
+        compiled (bool): generates the dag as a compiled dag
+        serialized (bool): also generates the serialized dag
+        validate (bool): imports the generated dag to verify that it is valid, Airflow must be installed
+        sidecar_format (string): the format of the json data file of the dag, see DagGenerator.SIDECAR_FORMATS
+    Returns:
+        a dict containing the dag_name, the status (SUCCESS or ERROR), the sha256 of each generated file,
+        the files which were written because their contents changed, the elapsed seconds of each phase
+        and the error, if any
+    """
+    report = create_dag_report(payload)
+    try:
+        start = time.perf_counter()
+        generator = DagGenerator(
+            payload,
+            compiled=compiled,
+            serialized=serialized,
+            workspace_dir=workspace_dir,
+            sidecar_format=sidecar_format
+        )
+        files = generator.render()
+        report['timings']['render'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        dag_data = generator.generate_dag(files)
+        if serialized:
+            with open(generator.serialized_file, 'rb') as f:
+                files[ntpath.basename(generator.serialized_file)] = f.read()
+        report['timings']['write'] = time.perf_counter() - start
+        report['changed_files'] = dag_data['changed_files']
+        report['files'] = {
+            os.path.join(generator.temp_dir, file_name): hashlib.sha256(contents).hexdigest()
+            for file_name, contents in files.items()
+        }
+
+        if validate:
+            start = time.perf_counter()
+            # imported here as the dag validator imports airflow, which is only needed to validate the dag
+            from composer.dag import dag_validator
+            dag_validator.DagValidator(generator.dag_file).validate_dag()
+            report['timings']['validate'] = time.perf_counter() - start
+    except Exception as e:
+        report['status'] = 'ERROR'
+        report['error'] = "".join(traceback.format_exception_only(type(e), e)).strip()
+    return report
+# [END generate_dag_report]
 
 
 class DagGenerator:
@@ -28,98 +155,505 @@ class DagGenerator:
     DAG_TEMPLATE = "dag_template.py"
     EXTENSION_PYTHON = ".py"
     EXTENSION_JSON = ".json"
+    EXTENSION_SERIALIZED = ".serialized.json"
+    OPERATOR_FAMILIES = ['bash_operators', 'python_operators', 'kubernetes_pod_operators']
+    # the formats of the json data file of the dag (the sidecar), format name to file extension
+    # json is indented, compact is json without whitespace, gzip is gzip compressed compact json and
+    # msgpack is the binary MessagePack format, which requires the optional msgpack package
+    SIDECAR_FORMATS = {
+        'json': ".json",
+        'compact': ".json",
+        'gzip': ".json.gz",
+        'msgpack': ".msgpack"
+    }
+    # the dag template is read and split at the insertion marker once, when the module is imported
+    DAG_TEMPLATE_HEAD, DAG_TEMPLATE_TAIL = split_dag_template(
+        os.path.join(os.path.dirname(Path(__file__)), DAG_TEMPLATE),
+        INSERTION_MARKER
+    )
+    # the version of the dag template, a validation result is only reused for dags of the same template version
+    TEMPLATE_VERSION = hashlib.sha256(DAG_TEMPLATE_HEAD + DAG_TEMPLATE_TAIL).hexdigest()
     # [END global variable definitions]
 
     # gets the logger for this module
     logger = log_service.get_module_logger(__name__)
 
     # [START DagGenerator constructor]
-    def __init__(self, payload):
+    def __init__(self, payload, compiled=False, serialized=False, workspace_dir=None, sidecar_format='json'):
         # set class logger
+        # the payload is canonicalized so that the generated files only change when the dag changes
+        self.payload = canonicalize_payload(payload)
+        # the payloads of the dags built by the generated module, more than one when the module is a bundle
+        self.payloads = [self.payload]
+        self.bundled = False
+        # when compiled is True, the dag is generated as a static module that does not read the json payload
+        self.compiled = compiled
+        # when serialized is True, the Airflow serialized representation of the dag is also generated
+        self.serialized = serialized
+        if sidecar_format not in self.SIDECAR_FORMATS:
+            raise ValueError(f"Sidecar format {sidecar_format} is not one of: {', '.join(self.SIDECAR_FORMATS)}")
+        if sidecar_format == 'msgpack' and importlib.util.find_spec('msgpack') is None:
+            raise ValueError("Sidecar format msgpack requires the msgpack package to be installed.")
+        self.sidecar_format = sidecar_format
         # sanitize the dag_name - replace whitespace with underscores and convert to lowercase
-        self.payload = payload
         self.dag_name = re.sub(r'\s+', '_', payload['dag_name']).lower()
-        self.temp_dir = tempfile.gettempdir()
+        # the dag files are generated in the workspace directory of the request, when one is provided, so that
+        # concurrent requests for the same dag_name do not overwrite each other's files
+        self.temp_dir = workspace_dir if workspace_dir is not None else tempfile.gettempdir()
         # define the path for the dag file and its associated json data
         # these are the paths where the concrete dag will be created
         self.dag_file = os.path.join(self.temp_dir, f"{self.dag_name}{self.EXTENSION_PYTHON}")
-        self.json_file = os.path.join(self.temp_dir, f"{self.dag_name}{self.EXTENSION_JSON}")
+        self.json_file = os.path.join(self.temp_dir, f"{self.dag_name}{self.SIDECAR_FORMATS[sidecar_format]}")
+        self.serialized_file = os.path.join(self.temp_dir, f"{self.dag_name}{self.EXTENSION_SERIALIZED}")
+        # the code cache is built once, even when the dag is rendered more than once
+        self.code_cache = None
     # [END DagGenerator constructor]
 
+    # [START bundle]
+    @classmethod
+    def bundle(cls, bundle_name, payloads, workspace_dir=None, sidecar_format='json'):
+        """
+        Creates a generator of a bundle; a single dag module, with a single json file, which builds a dag for
+        each of the provided payloads. The imports and helper functions of the dag template are then shared by
+        all of the dags of the bundle when the module is parsed by the Airflow scheduler.
+        Args:
+            bundle_name (string): the name of the bundle, used as the name of the dag and json files
+            payloads (list): the JSON DSL payloads of the dags to be built by the bundle
+            workspace_dir (string): the directory in which the bundle is generated, defaults to the temp directory
+            sidecar_format (string): the format of the json data file of the bundle, see SIDECAR_FORMATS
+        Returns:
+            an instance of DagGenerator
+        """
+        payloads = list(payloads)
+        if not payloads:
+            raise ValueError(f"Bundle {bundle_name} does not contain any dag payloads.")
+
+        dag_names = set()
+        for payload in payloads:
+            if payload['dag_name'] in dag_names:
+                raise ValueError(f"Bundle {bundle_name} contains the dag {payload['dag_name']} more than once.")
+            dag_names.add(payload['dag_name'])
+
+        generator = cls({'dag_name': bundle_name}, workspace_dir=workspace_dir, sidecar_format=sidecar_format)
+        # the dags of a bundle are ordered by dag_name, so that the bundle does not depend on the order of the payloads
+        generator.payloads = sorted(
+            (canonicalize_payload(payload) for payload in payloads),
+            key=lambda payload: payload['dag_name']
+        )
+        generator.bundled = True
+        return generator
+    # [END bundle]
+
+    # [START generate_many]
+    @staticmethod
+    def generate_many(payloads, workspace_dir=None, workers=None, compiled=False, serialized=False, validate=False,
+                      sidecar_format='json'):
+        """
+        Generates, and optionally validates, a dag for each of the provided payloads in parallel, using a pool
+        of worker processes so that the rendering and validation of the dags is spread across the CPU cores.
+        A payload which fails does not stop the batch, its error is recorded in its report. The dags are written
+        to the same directory, so only the first payload of a dag_name is generated, the next ones are reported
+        as errors.
+        Args:
+            payloads (list): the JSON DSL payloads of the dags
+            workspace_dir (string): the directory in which the dags are generated, defaults to the temp directory
+            workers (int): the number of worker processes, defaults to the number of CPUs,
+                           with 1 the dags are generated in the current process
+            compiled (bool): generates the dags as compiled dags
+            serialized (bool): also generates the serialized dags
+            validate (bool): imports each generated dag to verify that it is valid, Airflow must be installed
+            sidecar_format (string): the format of the json data files of the dags, see SIDECAR_FORMATS
+        Returns:
+            a list of reports, see generate_dag_report, in the order of the payloads
+        """
+        payloads = list(payloads)
+        workspace_dir = workspace_dir if workspace_dir is not None else tempfile.gettempdir()
+
+        # the dags are written to the same directory, so two payloads with the same dag_name would overwrite
+        # each other's files
+        reports = [None] * len(payloads)
+        dag_names = set()
+        for index, payload in enumerate(payloads):
+            if not isinstance(payload, dict) or not isinstance(payload.get('dag_name'), str):
+                # reported as an error by the report of the payload
+                continue
+            dag_name = re.sub(r'\s+', '_', payload['dag_name']).lower()
+            if dag_name in dag_names:
+                reports[index] = create_dag_report(
+                    payload, f"ValueError: The batch contains the dag {payload['dag_name']} more than once."
+                )
+            dag_names.add(dag_name)
+
+        indexes = [index for index, report in enumerate(reports) if report is None]
+        args = [(payloads[index], workspace_dir, compiled, serialized, validate, sidecar_format) for index in indexes]
+        if workers == 1 or len(args) <= 1:
+            generated_reports = [generate_dag_report(*arg) for arg in args]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # payloads are sent to the workers in chunks to reduce the inter process communication overhead
+                chunksize = max(1, len(args) // ((workers or os.cpu_count() or 1) * 4))
+                generated_reports = list(executor.map(generate_dag_report, *zip(*args), chunksize=chunksize))
+        for index, report in zip(indexes, generated_reports):
+            reports[index] = report
+        return reports
+    # [END generate_many]
+
+    # [START load_payloads]
+    @staticmethod
+    def load_payloads(payload_dir):
+        """
+        Loads the JSON DSL payloads contained in a directory, in file name order.
+        Args:
+            payload_dir (string): the directory which contains the payloads as .json files
+        Returns:
+            a list of payloads
+        """
+        payloads = []
+        for payload_file in sorted(os.listdir(payload_dir)):
+            if payload_file.endswith(DagGenerator.EXTENSION_JSON):
+                with open(os.path.join(payload_dir, payload_file)) as f:
+                    payloads.append(json.load(f))
+        return payloads
+    # [END load_payloads]
+
     # [START remove_previous_versions]
     def remove_previous_versions(self):
-        """Removes any existing dag or json file that uses the provided dag name"""
+        """
+        Removes any existing dag, json or serialized file that uses the provided dag name, whatever its sidecar format.
+        Returns:
+            a list of the paths of the files which were removed, see remove_stale_files
+        """
         self.logger.log(logging.DEBUG, "Removes any previous version of the dag.")
-        if os.path.exists(self.dag_file):
-            os.remove(self.dag_file)
-            self.logger.log(logging.INFO, f"Removed previous dag version: {self.dag_file}")
+        return self.remove_stale_files([])
+    # [END remove_previous_versions]
+
+    # [START get_code_blocks]
+    def get_code_blocks(self):
+        """
+        Gets the blocks of python source code that the dag template executes when the dag is parsed.
+        The function_def of a foreach python operator is the same block for each of its expanded operators, so it is
+        yielded once, without expanding the operator. A function_def which contains the foreach placeholder is a
+        different block for each expanded operator, it is left to the dag template to compile when the dag is parsed
+        rather than adding a block per expanded operator to the dag module.
+        Returns:
+            a generator of python source code strings
+        """
+        for payload in self.payloads:
+            for func_dict in payload.get('dynamic_functions', {}).values():
+                for key, func_def in func_dict.items():
+                    if key.endswith('_def') and isinstance(func_def, list):
+                        yield "\n".join(func_def)
+
+            for operator_template in payload.get('python_operators', []):
+                function_def = operator_template.get('function_def')
+                if not isinstance(function_def, list) or not all(isinstance(line, str) for line in function_def):
+                    continue
+                if 'foreach' in operator_template:
+                    try:
+                        placeholder = dag_dsl.get_foreach_placeholder(operator_template['foreach'])
+                    except (ValueError, TypeError) as e:
+                        # the dag template reports the invalid foreach definition when the dag is parsed
+                        self.logger.log(logging.WARNING, f"Python operator is not precompiled: {e}")
+                        continue
+                    if any(placeholder in line for line in function_def):
+                        continue
+                yield "\n".join(function_def)
+    # [END get_code_blocks]    # [END get_code_blocks]
+
+    # [START build_code_cache]
+    def build_code_cache(self):
+        """
+        Compiles the python code blocks of the payload, deduplicated by the sha256 of their source code.
+        Blocks which do not compile are left out so that the dag template reports the error when the dag is parsed.
+        Returns:
+            a dict of sha256 hex digest to marshalled code object
+        """
+        self.logger.log(logging.DEBUG, "Building the code cache of the dag.")
+        code_cache = {}
+        for source in self.get_code_blocks():
+            key = hashlib.sha256(source.encode('utf-8')).hexdigest()
+            if key in code_cache:
+                continue
+            try:
+                code_cache[key] = marshal.dumps(compile(source, '<string>', 'exec'))
+            except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+                self.logger.log(logging.WARNING, f"Code block {key} is not precompiled: {e}")
+        return code_cache
+    # [END build_code_cache]
+
+    # [START render_payload]
+    def render_payload(self, sidecar_format=None):
+        """
+        Renders the json payload data of the dag, a single payload or, for a bundle, a list of payloads.
+        Args:
+            sidecar_format (string): the format of the payload data, see SIDECAR_FORMATS,
+                                     defaults to the sidecar format of the generator
+        Returns:
+            the json payload data as bytes
+        """
+        sidecar_format = sidecar_format or self.sidecar_format
+        payload = self.payloads if self.bundled else self.payload
+        if sidecar_format == 'json':
+            return json.dumps(payload, indent=4, sort_keys=True).encode('utf-8')
+        if sidecar_format == 'msgpack':
+            import msgpack
+            # the keys of the canonical payload are already sorted and msgpack keeps the order of the keys
+            return msgpack.packb(payload, use_bin_type=True)
+        compact_payload = json.dumps(payload, separators=(',', ':'), sort_keys=True).encode('utf-8')
+        if sidecar_format == 'gzip':
+            # mtime is fixed so that an unchanged payload is always rendered to the same bytes
+            return gzip.compress(compact_payload, mtime=0)
+        return compact_payload
+    # [END render_payload]
+
+    # [START render_payload_loader]
+    def render_payload_loader(self):
+        """
+        Renders the python code which reads the json data file of the dag with the reader of its sidecar format.
+        Returns:
+            a list of python source code lines
+        """
+        payload_path = f"os.path.join(os.path.dirname(Path(__file__)), '{ntpath.basename(self.json_file)}')"
+        if self.sidecar_format == 'gzip':
+            """
+                import gzip
+                with gzip.open(os.path.join(os.path.dirname(Path(__file__)), 'json_file.json.gz')) as f:
+                    payloads = [json.load(f)]
+            """
+            loader = ["import gzip\n", f"with gzip.open({payload_path}) as f:\n"]
+            load_expression = "json.load(f)"
+        elif self.sidecar_format == 'msgpack':
+            """
+                import msgpack
+                with open(os.path.join(os.path.dirname(Path(__file__)), 'json_file.msgpack'), 'rb') as f:
+                    payloads = [msgpack.unpackb(f.read(), raw=False)]
+            """
+            loader = ["import msgpack\n", f"with open({payload_path}, 'rb') as f:\n"]
+            load_expression = "msgpack.unpackb(f.read(), raw=False)"
+        else:
+            """
+                with open(os.path.join(os.path.dirname(Path(__file__)), 'json_file.json')) as f:
+                    payloads = [json.load(f)]
+            """
+            loader = [f"with open({payload_path}) as f:\n"]
+            load_expression = "json.load(f)"
+        if self.bundled:
+            loader.append(f"    payloads = {load_expression}\n")
         else:
-            self.logger.log(logging.INFO, f"No previous dag version: {self.dag_file}")
+            loader.append(f"    payloads = [{load_expression}]\n")
+        return loader
+    # [END render_payload_loader]
 
-        if os.path.exists(self.json_file):
-            os.remove(self.json_file)
-            self.logger.log(logging.INFO, f"Removed previous json version: {self.json_file}")
+    # [START render_dynamic_data]
+    def render_dynamic_data(self, embedded_payload=None):
+        """
+        Renders the dynamic data which is inserted into the dag template at the position defined by INSERTION_MARKER.
+        Args:
+            embedded_payload (bytes): the rendered payload to embed in the dag module, when None the dag module
+                                      reads the payload from its json file
+        Returns:
+            the dynamic data as a string
+        """
+        if embedded_payload is None:
+            """
+            Inserts the reader of the concrete json data file, which contains a single payload or,
+            for a bundle, a list of payloads, see render_payload_loader
+            """
+            dynamic_data = self.render_payload_loader()
         else:
-            self.logger.log(logging.INFO, f"No previous json version: {self.json_file}")
-    # [END remove_previous_versions]
+            """
+            Inserts the payload data itself, so that the dag module can be executed without its json file
+                payloads = [json.loads('...')]
+            """
+            payload_str = embedded_payload.decode('utf-8')
+            dynamic_data = [
+                f"payloads = json.loads({payload_str!r})\n" if self.bundled
+                else f"payloads = [json.loads({payload_str!r})]\n"
+            ]
 
-    # [START copy_dag_template_to_file]
-    def copy_dag_template_to_file(self):
-        """Copies the dag template to a concrete dag file"""
-        self.logger.log(logging.DEBUG, "Copying the dag template to a file.")
-        template_src = os.path.join(os.path.dirname(Path(__file__)), self.DAG_TEMPLATE)
-        self.logger.log(logging.INFO, f"Copying template: {template_src} to {self.dag_file}")
-        shutil.copy(template_src, self.dag_file)
-    # [END copy_dag_template_to_file]
-
-    # [START write_payload_to_file]
-    def write_payload_to_file(self):
-        """Writes the provided, in-memory json payload to a concrete json file"""
-        self.logger.log(logging.INFO, f"Writing payload to: {self.json_file}")
-        with open(self.json_file, 'w') as f:
-            json.dump(self.payload, f, indent=4)
-    # [END write_payload_to_file]
-
-    # [START insert_dynamic_data_to_dag]
-    def insert_dynamic_data_to_dag(self):
-        """Inserts dynamic data into the concrete dag file at the position defined by INSERTION_MARKER"""
-        self.logger.log(logging.DEBUG, "Inserting the dynamic data into the dag file.")
-        # read the concrete dag file and find the insertion marker
-        with open(self.dag_file, "r") as f:
-            contents = f.readlines()
-            for i, line in enumerate(contents):
-                if self.INSERTION_MARKER in line:
-                    insertion_pos = i + 1
-                    break
-
-        """ 
-        Inserts the path to the concrete json data file
-            with open(os.path.join(os.path.dirname(Path(__file__)), 'json_file.json')) as f:
-                payload = json.load(f)
-        """
-        contents.insert(
-            insertion_pos,
-            f"with open(os.path.join(os.path.dirname(Path(__file__)), "
-            f"'{ntpath.basename(self.json_file)}')) as f:\n"
-        )
-        contents.insert(insertion_pos+1, f"    payload = json.load(f)")
+        """
+        Inserts the precompiled python code blocks of the payload, used by the template only when the magic
+        number matches the python version that parses the dag
+            code_cache_magic = b'...'
+            code_cache = {'sha256': b'marshalled code', ...}
+        """
+        dynamic_data.append(f"code_cache_magic = {importlib.util.MAGIC_NUMBER!r}\n")
+        if self.code_cache is None:
+            self.code_cache = self.build_code_cache()
+        dynamic_data.append("code_cache = {\n")
+        for key, code in sorted(self.code_cache.items()):
+            dynamic_data.append(f"    '{key}': {code!r},\n")
+        dynamic_data.append("}\n")
+        return "".join(dynamic_data)
+    # [END render_dynamic_data]
+
+    # [START render]
+    def render(self, embedded=False):
+        """
+        Renders the concrete dag module and its json data file in memory, without writing to disk.
+        Args:
+            embedded (bool): when True, the payload is embedded in the dag module instead of being rendered
+                             as a json file, which allows the dag module to be validated from memory
+        Returns:
+            a dict of file name to file contents as bytes, the dag file first
+        """
+        self.logger.log(logging.DEBUG, "Rendering the dag file.")
+        dag_file_name = ntpath.basename(self.dag_file)
+        if self.compiled:
+            if self.bundled:
+                raise ValueError(f"Bundle {self.dag_name} can not be generated as a compiled dag.")
+            if self.code_cache is None:
+                self.code_cache = self.build_code_cache()
+            source = dag_compiler.DagCompiler(self.payload, self.dag_name, self.code_cache).compile()
+            return {dag_file_name: source.encode('utf-8')}
+
+        if embedded:
+            # the embedded payload is always json, as it is read by the dag module with json.loads
+            dynamic_data = self.render_dynamic_data(self.render_payload('compact')).encode('utf-8')
+            return {dag_file_name: self.DAG_TEMPLATE_HEAD + dynamic_data + self.DAG_TEMPLATE_TAIL}
 
-        # write back the modified contents to the concrete dag file
-        with open(self.dag_file, "w") as f:
-            f.writelines(contents)
-    # [END insert_dynamic_data_to_dag]
+        dynamic_data = self.render_dynamic_data().encode('utf-8')
+        files = {dag_file_name: self.DAG_TEMPLATE_HEAD + dynamic_data + self.DAG_TEMPLATE_TAIL}
+        files[ntpath.basename(self.json_file)] = self.render_payload()
+        return files
+    # [END render]
+
+    # [START has_contents]
+    @staticmethod
+    def has_contents(file_path, contents):
+        """
+        Checks if an existing file already has the provided contents.
+        Args:
+            file_path (string): the path to the file
+            contents (bytes): the expected contents of the file
+        Returns:
+            True if the file exists and has the contents, otherwise False
+        """
+        try:
+            if os.path.getsize(file_path) != len(contents):
+                return False
+            with open(file_path, 'rb') as f:
+                return f.read() == contents
+        except FileNotFoundError:
+            return False
+    # [END has_contents]
+
+    # [START write_files]
+    def write_files(self, files):
+        """
+        Writes rendered files to the temporary directory of the generator. A file is only written when its contents
+        changed, and it is written to a temporary file which then atomically replaces the previous version, so the
+        previous version of the file is readable until the new version is complete.
+        Args:
+            files (dict): file name to file contents as bytes, see render
+        Returns:
+            a list of the paths of the files which were written
+        """
+        changed_files = []
+        for file_name, contents in files.items():
+            file_path = os.path.join(self.temp_dir, file_name)
+            if self.has_contents(file_path, contents):
+                self.logger.log(logging.INFO, f"Rendered file is unchanged: {file_path}")
+                continue
+
+            self.logger.log(logging.INFO, f"Writing rendered file to: {file_path}")
+            # the temporary file does not end with the extension of the file, so it is never parsed as a dag
+            fd, temp_file = tempfile.mkstemp(dir=self.temp_dir, prefix=f".{file_name}.")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(contents)
+                os.chmod(temp_file, 0o644)
+                os.replace(temp_file, file_path)
+            except BaseException:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                raise
+            changed_files.append(file_path)
+        return changed_files
+    # [END write_files]
+
+    # [START remove_stale_files]
+    def remove_stale_files(self, files):
+        """
+        Removes the files of a previous version of the dag which are not generated by the current version,
+        such as the json file of another sidecar format or the json file of a dag which is now compiled.
+        Args:
+            files (iterable): the names of the files of the current version of the dag
+        Returns:
+            a list of the paths of the files which were removed
+        """
+        candidate_files = [self.dag_file, self.serialized_file] + [
+            os.path.join(self.temp_dir, f"{self.dag_name}{extension}")
+            for extension in set(self.SIDECAR_FORMATS.values())
+        ]
+        removed_files = []
+        for file_path in candidate_files:
+            if ntpath.basename(file_path) not in files and os.path.exists(file_path):
+                os.remove(file_path)
+                self.logger.log(logging.INFO, f"Removed stale file: {file_path}")
+                removed_files.append(file_path)
+        return removed_files
+    # [END remove_stale_files]
+
+    # [START render_serialized_dag]
+    def render_serialized_dag(self):
+        """
+        Renders the Airflow serialized representation of the dags of the concrete dag file.
+        The dag file is imported to build the dags, so Airflow must be installed.
+        Returns:
+            the serialized dags as json bytes
+        """
+        # imported here as the dag validator imports airflow, which is only needed to serialize the dag
+        from composer.dag import dag_validator
+        self.logger.log(logging.DEBUG, f"Serializing the dag file: {self.dag_file}")
+        serialized_dags = dag_validator.DagValidator(self.dag_file).serialize_dags()
+        for serialized_dag in serialized_dags:
+            # the location of the dag file is the workspace where it was generated, not where it is deployed
+            if isinstance(serialized_dag.get('dag'), dict) and 'fileloc' in serialized_dag['dag']:
+                serialized_dag['dag']['fileloc'] = ntpath.basename(self.dag_file)
+        return json.dumps(serialized_dags, sort_keys=True).encode('utf-8')
+    # [END render_serialized_dag]
+
+    # [START write_serialized_dag_to_file]
+    def write_serialized_dag_to_file(self):
+        """
+        Writes the Airflow serialized representation of the dags of the concrete dag file to a concrete json file.
+        Returns:
+            a list containing the path of the serialized file when it was written, empty when it is unchanged
+        """
+        return self.write_files({ntpath.basename(self.serialized_file): self.render_serialized_dag()})
+    # [END write_serialized_dag_to_file]
 
     # [START generate_dag]
-    def generate_dag(self):
+    def generate_dag(self, files=None):
         """
         Generates a concrete dag file with its associated payload data in a concrete json file.
+        When the generator is in compiled mode, only the dag file is generated and json_file is None.
+        When the generator is in serialized mode, the serialized dag is also generated, otherwise serialized_file
+        is None.
+        Only the files whose contents changed are written, see write_files, and the files of a previous version
+        of the dag which are no longer generated are removed.
+        Args:
+            files (dict): the rendered files of the dag, rendered when None, see render
         Returns:
-            a tuple containing the path to the dag_file and the path to the json_file
+            a dict containing the path to the dag_file, the path to the json_file, the path to the serialized_file
+            and the paths of the changed_files, which were written or removed
         """
         self.logger.log(logging.DEBUG, "Generating the dag file.")
-        self.remove_previous_versions()
-        self.copy_dag_template_to_file()
-        self.write_payload_to_file()
-        self.insert_dynamic_data_to_dag()
-        return {'dag_file': self.dag_file, 'json_file': self.json_file}
+        files = files if files is not None else self.render()
+        changed_files = self.write_files(files)
+        dag_data = {
+            'dag_file': self.dag_file,
+            'json_file': None if self.compiled else self.json_file,
+            'serialized_file': None
+        }
+        if self.serialized:
+            changed_files.extend(self.write_serialized_dag_to_file())
+            dag_data['serialized_file'] = self.serialized_file
+        generated_files = set(files)
+        if self.serialized:
+            generated_files.add(ntpath.basename(self.serialized_file))
+        changed_files.extend(self.remove_stale_files(generated_files))
+        dag_data['changed_files'] = changed_files
+        return dag_data
     # [END generate_dag]
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+"""dag_graph.py: Module that analyses the dependency graph of the tasks of a dag, without importing Airflow"""
+
+__author__ = "Damian McDonald"
+__credits__ = ["Damian McDonald"]
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Damian McDonald"
+__status__ = "Development"
+
+import logging
+from composer.utils import log_service
+
+
+class DagGraph:
+    """
+    Class used to analyse the dependency graph of the tasks of a dag; cycles, topological levels, and unreachable
+    and orphan tasks. Every analysis is iterative and runs in O(V+E), so deep or wide dags do not exhaust the stack.
+    """
+
+    # gets the logger for this module
+    logger = log_service.get_module_logger(__name__)
+
+    # [START DagGraph constructor]
+    def __init__(self, task_ids, edges):
+        """
+        DagGraph constructor, which builds the adjacency lists of the graph.
+        Args:
+            task_ids (iterable): the task_ids of the dag
+            edges (iterable): the (upstream task_id, downstream task_id) edges of the dag, a task of an edge which
+                              is not in task_ids is added to the graph
+        """
+        edges = set(edges)
+        # the tasks are indexed in task_id order, so that every analysis returns its tasks in a stable order
+        self.task_ids = set(task_ids)
+        for upstream_task, downstream_task in edges:
+            self.task_ids.add(upstream_task)
+            self.task_ids.add(downstream_task)
+        self.task_ids = sorted(self.task_ids)
+        index = {task_id: i for i, task_id in enumerate(self.task_ids)}
+        self.downstream = [[] for _ in self.task_ids]
+        self.upstream_count = [0] * len(self.task_ids)
+        for upstream_task, downstream_task in edges:
+            self.downstream[index[upstream_task]].append(index[downstream_task])
+            self.upstream_count[index[downstream_task]] += 1
+        self.edge_count = len(edges)
+        self.levels = None
+    # [END DagGraph constructor]
+
+    # [START from_dag]
+    @classmethod
+    def from_dag(cls, dag):
+        """
+        Creates the graph of a DAG object.
+        Args:
+            dag (airflow.models.DAG): the dag
+        Returns:
+            an instance of DagGraph
+        """
+        return cls(
+            dag.task_dict.keys(),
+            ((task.task_id, elem) for task in dag.tasks for elem in task.downstream_task_ids)
+        )
+    # [END from_dag]
+
+    # [START get_level_indices]
+    def get_level_indices(self):
+        """
+        Gets the topological levels of the graph with Kahn's algorithm, a task is in the level after the last level
+        of its upstream tasks. The levels are computed once.
+        Returns:
+            a list of lists of task indices, the tasks on or downstream of a cycle are in no level
+        """
+        if self.levels is not None:
+            return self.levels
+
+        upstream_count = list(self.upstream_count)
+        level = [i for i, count in enumerate(upstream_count) if count == 0]
+        self.levels = []
+        while level:
+            self.levels.append(level)
+            next_level = []
+            for i in level:
+                for elem in self.downstream[i]:
+                    upstream_count[elem] -= 1
+                    if upstream_count[elem] == 0:
+                        next_level.append(elem)
+            next_level.sort()
+            level = next_level
+        return self.levels
+    # [END get_level_indices]
+
+    # [START get_topological_levels]
+    def get_topological_levels(self):
+        """
+        Gets the topological levels of the graph; the first level contains the tasks without upstream tasks, and
+        each task is in the level after the last level of its upstream tasks.
+        Returns:
+            a list of lists of task_ids, the tasks on or downstream of a cycle are in no level
+        """
+        return [[self.task_ids[i] for i in level] for level in self.get_level_indices()]
+    # [END get_topological_levels]
+
+    # [START get_unreachable_indices]
+    def get_unreachable_indices(self):
+        """
+        Gets the tasks which are in no topological level, see get_unreachable_tasks.
+        Returns:
+            a list of task indices
+        """
+        reached = [False] * len(self.task_ids)
+        for level in self.get_level_indices():
+            for i in level:
+                reached[i] = True
+        return [i for i, elem in enumerate(reached) if not elem]
+    # [END get_unreachable_indices]
+
+    # [START get_unreachable_tasks]
+    def get_unreachable_tasks(self):
+        """
+        Gets the tasks which can not be reached from a task without upstream tasks, the tasks on or downstream of a
+        cycle, which would never be scheduled.
+        Returns:
+            a sorted list of task_ids
+        """
+        return [self.task_ids[i] for i in self.get_unreachable_indices()]
+    # [END get_unreachable_tasks]
+
+    # [START get_orphan_tasks]
+    def get_orphan_tasks(self):
+        """
+        Gets the tasks which have neither upstream nor downstream tasks.
+        Returns:
+            a sorted list of task_ids
+        """
+        return [
+            task_id for i, task_id in enumerate(self.task_ids)
+            if self.upstream_count[i] == 0 and not self.downstream[i]
+        ]
+    # [END get_orphan_tasks]
+
+    # [START find_cycle]
+    def find_cycle(self):
+        """
+        Finds a cycle of the graph.
+        Returns:
+            the list of task_ids of the cycle, from its smallest task_id, or None when the graph is acyclic
+        """
+        unreachable = set(self.get_unreachable_indices())
+        if not unreachable:
+            return None
+
+        # every unreachable task has an unreachable upstream task, walking upstream from any of them reaches a cycle
+        upstream = {}
+        for i in unreachable:
+            for elem in self.downstream[i]:
+                if elem in unreachable:
+                    upstream.setdefault(elem, i)
+        path = [min(unreachable)]
+        visited = {path[0]: 0}
+        while upstream[path[-1]] not in visited:
+            visited[upstream[path[-1]]] = len(path)
+            path.append(upstream[path[-1]])
+        cycle = list(reversed(path[visited[upstream[path[-1]]]:]))
+        # the cycle is reported from its smallest task_id, so that the same cycle is always reported the same way
+        start = cycle.index(min(cycle))
+        return [self.task_ids[i] for i in cycle[start:] + cycle[:start]]
+    # [END find_cycle]
+
+    # [START assert_acyclic]
+    def assert_acyclic(self):
+        """
+        Asserts that the dependencies of the tasks do not form a cycle.
+        Returns:
+            True when the graph is acyclic, otherwise an exception
+        """
+        self.logger.log(logging.DEBUG, f"Checking the {self.edge_count} dependencies of {len(self.task_ids)} tasks.")
+        cycle = self.find_cycle()
+        if cycle is not None:
+            raise ValueError(f"The dependencies of the tasks form a cycle: {' >> '.join(cycle + [cycle[0]])}")
+        return True
+    # [END assert_acyclic]
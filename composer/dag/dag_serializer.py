@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+"""dag_serializer.py: Module that serializes the structure of an Airflow DAG to JSON, incrementally and with an
+                      optional projection and pagination of its tasks"""
+
+__author__ = "Damian McDonald"
+__credits__ = ["Damian McDonald"]
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Damian McDonald"
+__status__ = "Development"
+
+import json
+import logging
+from composer.utils import log_service
+
+
+# [START get_view]
+def get_view(fields=None, offset=0, limit=None):
+    """
+    Gets the view of a dag definition; the fields of the dag and of its tasks, and the page of its tasks.
+    Args:
+        fields (string or list): the comma separated names, or the list of names, of the fields of the dag and of its
+                                 tasks, None for every field
+        offset (int): the index of the first task of the page
+        limit (int): the maximum number of tasks of the page, None for every task
+    Returns:
+        a dict containing the fields, offset and limit of the view
+    """
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+        raise ValueError(f"The fields of a dag definition must be a list of field names: {fields}")
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError(f"The offset of the tasks of a dag definition must be a positive integer: {offset}")
+    if limit is not None and (not isinstance(limit, int) or limit < 0):
+        raise ValueError(f"The limit of the tasks of a dag definition must be a positive integer: {limit}")
+    return {'fields': fields or None, 'offset': offset, 'limit': limit}
+# [END get_view]
+
+
+# [START get_view_key]
+def get_view_key(view):
+    """
+    Gets a hashable, JSON compatible key of a view, used to cache the dag definition of the view.
+    Args:
+        view (dict): the view, see get_view
+    Returns:
+        a tuple of the fields, offset and limit of the view
+    """
+    view = view or get_view()
+    return (tuple(view['fields']) if view['fields'] else None, view['offset'], view['limit'])
+# [END get_view_key]
+
+
+class DagSerializer:
+    """
+    Class used to serialize the structure of a DAG, either a live DAG object or the dict of a serialized DAG, to JSON.
+
+    The DAG is only read, it is never modified. The JSON is encoded one dag attribute and one task at a time, so the
+    DAG is never copied into an intermediate object graph, and the JSON can be written to a response as it is encoded.
+    """
+
+    # [START global variable definitions]
+    # the fields of a projection which are computed from the task, rather than read from its attributes
+    COMPUTED_TASK_FIELDS = ['upstream', 'downstream']
+    # [END global variable definitions]
+
+    # gets the logger for this module
+    logger = log_service.get_module_logger(__name__)
+
+    # [START DagSerializer constructor]
+    def __init__(self, dag_details, tasks, view=None):
+        """
+        DagSerializer constructor.
+        Args:
+            dag_details (dict): the attributes of the dag, which are not modified
+            tasks (list): the tasks of the dag, either operators or the dicts of serialized operators
+            view (dict): the fields and the page of tasks to serialize, see get_view, None for the whole dag
+        """
+        self.dag_details = dag_details
+        self.tasks = tasks
+        self.view = view or get_view()
+        # the upstream task_ids of the serialized operators, which only define their downstream task_ids
+        self.upstream_task_ids = None
+        self.encoder = json.JSONEncoder(default=lambda o: f"<<non-serializable: {type(o).__qualname__}>>")
+    # [END DagSerializer constructor]
+
+    # [START from_dag]
+    @classmethod
+    def from_dag(cls, dag, view=None):
+        """
+        Creates a serializer of a live DAG object.
+        Args:
+            dag (airflow.models.DAG): the dag
+            view (dict): the fields and the page of tasks to serialize, see get_view
+        Returns:
+            an instance of DagSerializer
+        """
+        return cls(vars(dag), dag.tasks, view)
+    # [END from_dag]
+
+    # [START from_serialized_dag]
+    @classmethod
+    def from_serialized_dag(cls, serialized_dag, view=None):
+        """
+        Creates a serializer of a serialized DAG, as returned by SerializedDAG.to_dict.
+        Args:
+            serialized_dag (dict): the serialized dag
+            view (dict): the fields and the page of tasks to serialize, see get_view
+        Returns:
+            an instance of DagSerializer
+        """
+        dag_details = {k: v for k, v in serialized_dag['dag'].items() if k != 'tasks'}
+        return cls(dag_details, serialized_dag['dag'].get('tasks', []), view)
+    # [END from_serialized_dag]
+
+    # [START get_task_ids]
+    def get_task_ids(self, task, direction):
+        """
+        Gets the upstream or downstream task_ids of a task.
+        Args:
+            task (object): an operator or the dict of a serialized operator
+            direction (string): upstream or downstream
+        Returns:
+            a sorted list of task_ids
+        """
+        if not isinstance(task, dict):
+            return sorted(getattr(task, f"{direction}_task_ids"))
+        if direction == 'downstream':
+            return sorted(task.get('_downstream_task_ids', []))
+        if self.upstream_task_ids is None:
+            self.upstream_task_ids = {}
+            for elem in self.tasks:
+                for downstream in elem.get('_downstream_task_ids', []):
+                    self.upstream_task_ids.setdefault(downstream, []).append(elem['task_id'])
+        return sorted(self.upstream_task_ids.get(task['task_id'], []))
+    # [END get_task_ids]
+
+    # [START get_task_view]
+    def get_task_view(self, task):
+        """
+        Gets the projected fields of a task. A field which the task does not define is left out.
+        Args:
+            task (object): an operator or the dict of a serialized operator
+        Returns:
+            a dict of field name to value, or the attributes of the task when the view does not project fields
+        """
+        task_details = task if isinstance(task, dict) else vars(task)
+        if self.view['fields'] is None:
+            return task_details
+
+        task_view = {'task_id': task_details.get('task_id')}
+        for field in self.view['fields']:
+            if field in self.COMPUTED_TASK_FIELDS:
+                task_view[field] = self.get_task_ids(task, field)
+            elif field in task_details:
+                task_view[field] = task_details[field]
+            elif not isinstance(task, dict) and hasattr(task, field):
+                task_view[field] = getattr(task, field)
+        return task_view
+    # [END get_task_view]
+
+    # [START get_dag_items]
+    def get_dag_items(self):
+        """
+        Gets the projected attributes of the dag. The dag_id is always part of a projection.
+        Returns:
+            a generator of (name, value) tuples
+        """
+        if self.view['fields'] is None:
+            yield from self.dag_details.items()
+            return
+
+        yield 'dag_id', self.dag_details.get('dag_id', self.dag_details.get('_dag_id'))
+        for field in self.view['fields']:
+            if field in self.dag_details and field != 'dag_id':
+                yield field, self.dag_details[field]
+    # [END get_dag_items]
+
+    # [START iter_json]
+    def iter_json(self):
+        """
+        Encodes the dag, with its tasks under tasks_details, as JSON, one attribute and one task at a time.
+        When the view defines a page of tasks, the total number of tasks is added as tasks_total.
+        Returns:
+            a generator of JSON strings, which concatenated form the JSON document
+        """
+        self.logger.log(logging.DEBUG, "Serializing the dag definition.")
+        separator = "{"
+        for name, value in self.get_dag_items():
+            if name == 'tasks_details':
+                continue
+            yield f"{separator}{self.encoder.encode(name)}: {self.encoder.encode(value)}"
+            separator = ", "
+
+        offset, limit = self.view['offset'], self.view['limit']
+        tasks = self.tasks
+        if offset or limit is not None:
+            yield f"{separator}\"tasks_total\": {len(tasks)}"
+            separator = ", "
+            tasks = tasks[offset:] if limit is None else tasks[offset:offset + limit]
+
+        yield f"{separator}\"tasks_details\": ["
+        task_separator = ""
+        for task in tasks:
+            yield task_separator + self.encoder.encode(self.get_task_view(task))
+            task_separator = ", "
+        yield "]}"
+    # [END iter_json]
+
+    # [START serialize]
+    def serialize(self):
+        """
+        Encodes the dag as JSON.
+        Returns:
+            the JSON string of the dag, see iter_json
+        """
+        return "".join(self.iter_json())
+    # [END serialize]
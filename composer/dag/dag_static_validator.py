@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+
+"""dag_static_validator.py: Module that validates a JSON DSL payload statically, without importing Airflow"""
+
+__author__ = "Damian McDonald"
+__credits__ = ["Damian McDonald"]
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Damian McDonald"
+__status__ = "Development"
+
+import ast
+import logging
+from composer.utils import log_service
+from composer.dag import dag_dsl, dag_graph
+
+
+# [START get_module_names]
+def get_module_names(tree):
+    """
+    Gets the names which are bound at the module scope of a parsed python module, including the names bound inside
+    the compound (if, for, while, with and try) statements of the module scope.
+    Args:
+        tree (ast.Module): the parsed python module
+    Returns:
+        a set of names, or None when the module contains a star import and its names can not be known statically
+    """
+    names = set()
+    statements = list(tree.body)
+    while statements:
+        statement = statements.pop()
+        if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(statement.name)
+            continue
+        if isinstance(statement, (ast.Import, ast.ImportFrom)):
+            for alias in statement.names:
+                if alias.name == '*':
+                    return None
+                names.add(alias.asname or alias.name.split('.')[0])
+            continue
+
+        if isinstance(statement, ast.Assign):
+            targets = statement.targets
+        elif isinstance(statement, (ast.AnnAssign, ast.AugAssign, ast.For, ast.AsyncFor)):
+            targets = [statement.target]
+        elif isinstance(statement, (ast.With, ast.AsyncWith)):
+            targets = [item.optional_vars for item in statement.items if item.optional_vars is not None]
+        elif isinstance(statement, ast.ExceptHandler):
+            targets = []
+            if statement.name:
+                names.add(statement.name)
+        else:
+            targets = []
+        for target in targets:
+            names.update(node.id for node in ast.walk(target) if isinstance(node, ast.Name))
+
+        # the statements nested in a compound statement are also executed at the module scope
+        for field in ['body', 'handlers', 'orelse', 'finalbody']:
+            statements.extend(getattr(statement, field, []))
+    return names
+# [END get_module_names]
+
+
+class DagStaticValidator:
+    """
+    Class used to validate a JSON DSL payload without importing Airflow or generating the dag.
+
+    The static validation detects the errors which are cheap to detect; missing or unknown tasks, python code which
+    does not compile, functions which are not defined, undefined kubernetes secrets and dependency cycles (see
+    dag_graph.DagGraph).
+    Every error of the payload is reported, not only the first one. A payload which is statically valid must still
+    be validated by DagValidator, as the python code of the payload is not executed.
+    """
+
+    # [START global variable definitions]
+    DYNAMIC_FUNCTIONS = ['start_date', 'schedule_interval', 'retry_delay', 'dagrun_timeout']
+    REQUIRED_KEYS = {
+        'bash_operators': ['task_id', 'command'],
+        'python_operators': ['task_id', 'function_def', 'function_name'],
+        'kubernetes_pod_operators': ['task_id', 'name', 'image']
+    }
+    KUBERNETES_SECRET_KEYS = ['deploy_type', 'deploy_target', 'secret', 'key']
+    # [END global variable definitions]
+
+    # gets the logger for this module
+    logger = log_service.get_module_logger(__name__)
+
+    # [START DagStaticValidator constructor]
+    def __init__(self, payload):
+        """
+        DagStaticValidator constructor.
+        Args:
+            payload (dict): the JSON DSL definition of the dag
+        """
+        self.payload = payload
+        self.errors = []
+        # the findings which do not make the payload invalid, such as tasks without dependencies
+        self.warnings = []
+        # the task_ids of the operators of the dag, and of each foreach operator mapped to its expanded task_ids
+        self.task_ids = set()
+        self.task_groups = {}
+        # the number of operators of the dag once its foreach operators are expanded, see dag_dsl.get_max_expanded_tasks
+        self.task_count = 0
+        # the (source, name) of the python code which has already been checked, the code of a foreach operator
+        # is the same for each of its expanded operators
+        self.checked_code = set()
+    # [END DagStaticValidator constructor]
+
+    # [START check_code]
+    def check_code(self, source_lines, function_name, location):
+        """
+        Checks that python code compiles and that it defines a function at its module scope.
+        Args:
+            source_lines (list): the lines of python code
+            function_name (string): the name of the function which must be defined by the code
+            location (string): the location of the code in the payload, used for the error messages
+        """
+        if not isinstance(source_lines, list) or not all(isinstance(line, str) for line in source_lines):
+            self.errors.append(f"{location} must be a list of lines of python code")
+            return
+        source = "\n".join(source_lines)
+        if (source, function_name) in self.checked_code:
+            return
+        self.checked_code.add((source, function_name))
+
+        try:
+            tree = ast.parse(source, filename=location)
+            compile(tree, location, 'exec')
+        except SyntaxError as e:
+            self.errors.append(f"{location} contains a syntax error at line {e.lineno}: {e.msg}")
+            return
+
+        names = get_module_names(tree)
+        if names is not None and function_name not in names:
+            self.errors.append(f"{location} does not define the function '{function_name}'")
+    # [END check_code]
+
+    # [START check_operators]
+    def check_operators(self):
+        """
+        Checks the operator families of the payload and collects the task_ids of their (expanded) operators.
+        """
+        families = [family for family in self.REQUIRED_KEYS if family in self.payload]
+        if not families:
+            self.errors.append(
+                "A DAG definition must contain at least one of; "
+                "bash_operators, python_operators or kubernetes_pod_operators."
+            )
+            return
+
+        max_tasks = dag_dsl.get_max_expanded_tasks()
+        for family in families:
+            operators_ref = self.payload[family]
+            if not isinstance(operators_ref, list) or not operators_ref:
+                self.errors.append(f"'{family}' defined but it contains no elements")
+                continue
+            for i, operator_template in enumerate(operators_ref):
+                if not isinstance(operator_template, dict):
+                    self.errors.append(f"{family}[{i}] is not an operator definition: {operator_template}")
+                    continue
+                missing_keys = [key for key in self.REQUIRED_KEYS[family] if key not in operator_template]
+                if missing_keys:
+                    self.errors.append(f"{family}[{i}] does not contain {', '.join(missing_keys)}")
+                    continue
+                # the operators are checked as they are expanded, one at a time
+                task_group = []
+                try:
+                    for operator_ref in dag_dsl.expand_operator(operator_template):
+                        self.task_count += 1
+                        dag_dsl.assert_expanded_tasks(self.task_count, max_tasks)
+                        task_group.append(operator_ref['task_id'])
+                        self.check_operator(family, operator_ref)
+                except ValueError as e:
+                    self.errors.append(f"{family}[{i}]: {e}")
+                    if self.task_count > max_tasks:
+                        return
+                    continue
+                if 'foreach' in operator_template:
+                    self.task_groups[operator_template['task_id']] = task_group
+    # [END check_operators]
+
+    # [START check_operator]
+    def check_operator(self, family, operator_ref):
+        """
+        Checks an (expanded) operator.
+        Args:
+            family (string): the operator family of the operator
+            operator_ref (dict): the definition of the operator
+        """
+        task_id = operator_ref['task_id']
+        if task_id in self.task_ids:
+            self.errors.append(f"Task {task_id} is defined more than once")
+        self.task_ids.add(task_id)
+
+        if family == 'bash_operators':
+            if not isinstance(operator_ref['command'], list) or not operator_ref['command']:
+                self.errors.append(f"Task {task_id} does not contain any commands")
+        elif family == 'python_operators':
+            self.check_code(operator_ref['function_def'], operator_ref['function_name'], f"Task {task_id} function_def")
+        elif family == 'kubernetes_pod_operators':
+            self.check_kubernetes_secrets(operator_ref)
+    # [END check_operator]
+
+    # [START check_kubernetes_secrets]
+    def check_kubernetes_secrets(self, operator_ref):
+        """
+        Checks that the kubernetes secrets referenced by a kubernetes pod operator are defined.
+        Args:
+            operator_ref (dict): the definition of the kubernetes pod operator
+        """
+        kubernetes_secrets_ref = self.payload.get('kubernetes_secrets', {})
+        for ref_key in ['pod_secret_refs', 'image_pull_secret_refs']:
+            for secret_ref in operator_ref.get(ref_key, []):
+                if secret_ref not in kubernetes_secrets_ref:
+                    self.errors.append(
+                        f"Pod {operator_ref['name']} declares secret '{secret_ref}' in '{ref_key}' "
+                        "but it has not been defined in 'kubernetes_secrets'"
+                    )
+    # [END check_kubernetes_secrets]
+
+    # [START check_kubernetes_secret_definitions]
+    def check_kubernetes_secret_definitions(self):
+        """
+        Checks that each kubernetes secret definition contains the attributes of a kubernetes secret.
+        """
+        for secret_ref, secret_entry_ref in self.payload.get('kubernetes_secrets', {}).items():
+            missing_keys = [
+                key for key in self.KUBERNETES_SECRET_KEYS
+                if not isinstance(secret_entry_ref, dict) or key not in secret_entry_ref
+            ]
+            if missing_keys:
+                self.errors.append(f"Kubernetes secret '{secret_ref}' does not contain {', '.join(missing_keys)}")
+    # [END check_kubernetes_secret_definitions]
+
+    # [START check_dynamic_functions]
+    def check_dynamic_functions(self):
+        """
+        Checks the dynamic functions (start_date, schedule_interval, retry_delay and dagrun_timeout) of the payload.
+        """
+        dynamic_functions = self.payload.get('dynamic_functions', {})
+        for key_name in self.DYNAMIC_FUNCTIONS:
+            if key_name not in dynamic_functions:
+                continue
+            func_dict = dynamic_functions[key_name]
+            func_def = f"{key_name}_def"
+            func_name = f"{key_name}_name"
+            if func_def not in func_dict:
+                self.errors.append(f"{key_name} dynamic function requested but '{func_def}' was not found.")
+            elif func_name not in func_dict:
+                self.errors.append(f"{key_name} dynamic function requested but '{func_name}' was not found.")
+            else:
+                self.check_code(func_dict[func_def], func_dict[func_name], f"Dynamic function {func_def}")
+    # [END check_dynamic_functions]
+
+    # [START resolve_task]
+    def resolve_task(self, task, section):
+        """
+        Resolves a task_id referenced by the dag dependencies to the task_ids of the operators it refers to.
+        Args:
+            task (string): the referenced task_id, a foreach operator refers to all of its expanded operators
+            section (string): the payload section which references the task, used for the error message
+        Returns:
+            a list of task_ids, empty when the task is not defined
+        """
+        if task in self.task_groups:
+            return self.task_groups[task]
+        if task not in self.task_ids:
+            self.errors.append(
+                f"Task {task} is specified as a task in the '{section}' but it has not been defined as a DAG task"
+            )
+            return []
+        return [task]
+    # [END resolve_task]
+
+    # [START get_edges]
+    def get_edges(self):
+        """
+        Gets the upstream to downstream edges defined by the execution_sequence and the dependencies of the payload.
+        Returns:
+            a list of (upstream task_id, downstream task_id) tuples
+        """
+        edges = []
+        if 'execution_sequence' in self.payload:
+            execution_sequence_ref = self.payload['execution_sequence']
+            if not isinstance(execution_sequence_ref, list):
+                self.errors.append("'execution_sequence' defined but it is not a list of task_ids")
+            else:
+                sequence = [self.resolve_task(task, 'execution_sequence') for task in execution_sequence_ref]
+                for upstream_tasks, downstream_tasks in zip(sequence, sequence[1:]):
+                    edges.extend(
+                        (upstream, downstream) for upstream in upstream_tasks for downstream in downstream_tasks
+                    )
+
+        if 'dependencies' in self.payload:
+            dependencies_ref = self.payload['dependencies']
+            if not isinstance(dependencies_ref, dict):
+                self.errors.append("'dependencies' defined but it is not a task_id to upstream task_ids object")
+            else:
+                for task, upstream_tasks in dependencies_ref.items():
+                    if not isinstance(upstream_tasks, list):
+                        self.errors.append(f"'dependencies' defined but the upstream tasks of {task} are not a list")
+                        continue
+                    downstream_tasks = self.resolve_task(task, 'dependencies')
+                    for upstream in upstream_tasks:
+                        edges.extend(
+                            (elem, downstream)
+                            for elem in self.resolve_task(upstream, 'dependencies')
+                            for downstream in downstream_tasks
+                        )
+        return edges
+    # [END get_edges]
+
+    # [START check_graph]
+    def check_graph(self, edges):
+        """
+        Checks that the dependencies of the tasks do not form a cycle, and warns of the tasks which are not part of
+        the dependencies when the payload declares dependencies.
+        Args:
+            edges (list): the (upstream task_id, downstream task_id) edges of the dag
+        """
+        graph = dag_graph.DagGraph(self.task_ids, edges)
+        cycle = graph.find_cycle()
+        if cycle is not None:
+            self.errors.append(f"The dependencies of the tasks form a cycle: {' >> '.join(cycle + [cycle[0]])}")
+
+        if edges:
+            orphan_tasks = graph.get_orphan_tasks()
+            if orphan_tasks:
+                self.warnings.append(
+                    f"Tasks {', '.join(orphan_tasks)} are not part of the 'execution_sequence' or the 'dependencies'"
+                )
+    # [END check_graph]
+
+    # [START validate]
+    def validate(self):
+        """
+        Validates the payload statically.
+        Returns:
+            a list of the error messages of the payload, empty when the payload is statically valid
+        """
+        self.logger.log(logging.DEBUG, f"Statically validating the dag: {self.payload.get('dag_name')}")
+        self.errors = []
+        self.warnings = []
+        self.task_ids = set()
+        self.task_groups = {}
+        self.task_count = 0
+        self.checked_code = set()
+
+        if 'dag_name' not in self.payload:
+            self.errors.append("Json payload does not contain 'dag_name'")
+        self.check_operators()
+        if self.task_count > dag_dsl.get_max_expanded_tasks():
+            # the tasks of the dag are not all known, so the rest of the payload is not validated
+            return self.errors
+        self.check_kubernetes_secret_definitions()
+        self.check_dynamic_functions()
+        self.check_graph(self.get_edges())
+        return self.errors
+    # [END validate]
+
+    # [START assert_valid]
+    def assert_valid(self):
+        """
+        Validates the payload statically, raising a single error which reports every error of the payload.
+        Returns:
+            True when the payload is statically valid, otherwise an exception
+        """
+        errors = self.validate()
+        if errors:
+            raise ValueError(f"The dag definition is not valid: {'; '.join(errors)}")
+        return True
+    # [END assert_valid]
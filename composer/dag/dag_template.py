@@ -14,15 +14,17 @@ from pprint import pprint
 import os
 import ntpath
 import datetime
+import hashlib
+import marshal
+import importlib.util
 from pathlib import Path
 import airflow
-from airflow.operators import bash_operator
-from airflow.operators import python_operator
-from airflow.contrib.kubernetes import secret
-from airflow.contrib.operators import kubernetes_pod_operator
 """
 NOTE: the above import statements are used dynamically within the template. Even though an IDE may indicate 
 they are not used, please only remove the following imports if you are absolutely sure they are not required.
+
+The operator modules are imported by the build_*_operator functions, so that a dag only pays for the import
+of the operators that it uses. The kubernetes pod operator in particular imports the kubernetes client.
 """
 
 # [START insertion of dynamic code]
@@ -31,32 +33,183 @@ they are not used, please only remove the following imports if you are absolutel
 # [END insertion of dynamic code]
 
 
-# [START find_key_in_dict]
-def find_key_in_dict(key, dictionary):
+# [START index_payload]
+def index_payload(dictionary, index=None):
     """
-    Finds a key in a Python dictionary.
+    Indexes every key of a Python dictionary, including the keys of nested dictionaries and lists, in a single pass.
     Args:
-        key (string): the key to find in the dictionary
-        dictionary (string): the dictionary in which to search for the key
+        dictionary (dict): the dictionary to be indexed
+        index (dict): the index to be populated, used for the recursive calls
 
-    Returns a generator which should be cast as a list
-        * The list will be empty if the key is NOT found
-        * The list will contain the key value if it is found
+    Returns a dictionary of key to a list of all the values found for that key
+        * A key is absent from the index if it is NOT found
+        * The list contains the key values, in document order, if it is found
 
-    Usage: list(find_key_in_dict('my_key', my_dict))
+    Usage: index_payload(my_dict).get('my_key', [])
     """
+    if index is None:
+        index = {}
     for k, v in dictionary.items():
-        if k == key:
-            yield v
-        elif isinstance(v, dict):
-            for result in find_key_in_dict(key, v):
-                yield result
+        index.setdefault(k, []).append(v)
+        if isinstance(v, dict):
+            index_payload(v, index)
         elif isinstance(v, list):
             for d in v:
                 if isinstance(d, dict):
-                    for result in find_key_in_dict(key, d):
-                        yield result
-# [END find_key_in_dict]
+                    index_payload(d, index)
+    return index
+# [END index_payload]
+
+
+# [START foreach operator expansion]
+# copy of the functions of composer/dag/dag_dsl.py, which is not deployed with the dag
+
+# the default maximum number of tasks of a dag once its foreach operators are expanded, see get_max_expanded_tasks
+DEFAULT_MAX_EXPANDED_TASKS = 10000
+
+
+# [START get_max_expanded_tasks]
+def get_max_expanded_tasks():
+    """
+    Gets the maximum number of tasks of a dag once its foreach operators are expanded, from the MAX_EXPANDED_TASKS
+    env var, so that a foreach range can not make the expansion of a payload unbounded.
+    Returns:
+        the maximum number of tasks of a dag
+    """
+    return int(os.environ.get('MAX_EXPANDED_TASKS', DEFAULT_MAX_EXPANDED_TASKS))
+# [END get_max_expanded_tasks]
+
+
+# [START assert_expanded_tasks]
+def assert_expanded_tasks(task_count, max_tasks):
+    """
+    Asserts that a dag does not define more tasks than the maximum, as its operators are expanded one at a time.
+    Args:
+        task_count (int): the number of tasks of the dag expanded so far
+        max_tasks (int): the maximum number of tasks of a dag, see get_max_expanded_tasks
+    """
+    if task_count > max_tasks:
+        raise ValueError(f"The DAG defines more than {max_tasks} tasks once its foreach operators are expanded")
+# [END assert_expanded_tasks]
+
+
+# [START get_foreach_placeholder]
+def get_foreach_placeholder(foreach_ref):
+    """
+    Gets the placeholder which is replaced by each value of a foreach operator.
+    Args:
+        foreach_ref (dict): the foreach definition of the operator
+    Returns:
+        the placeholder string, {{foreach.<name>}}
+    """
+    if 'name' not in foreach_ref:
+        raise ValueError(f"'foreach' defined but it does not contain a 'name': {foreach_ref}")
+    return "{{foreach." + foreach_ref['name'] + "}}"
+# [END get_foreach_placeholder]
+
+
+# [START get_foreach_values]
+def get_foreach_values(foreach_ref):
+    """
+    Gets the values of a foreach operator, either the list of values or a lazy range of integers.
+    Args:
+        foreach_ref (dict): the foreach definition of the operator
+    Returns:
+        an iterable of the values of the foreach operator
+    """
+    if 'values' in foreach_ref and 'range' not in foreach_ref:
+        if not isinstance(foreach_ref['values'], list):
+            raise ValueError(f"'foreach.values' defined but it is not a list: {foreach_ref}")
+        return foreach_ref['values']
+    if 'range' in foreach_ref and 'values' not in foreach_ref:
+        range_ref = foreach_ref['range']
+        if (
+                not isinstance(range_ref, list)
+                or len(range_ref) not in [2, 3]
+                or not all(isinstance(elem, int) for elem in range_ref)
+        ):
+            raise ValueError(f"'foreach.range' defined but it is not a list of [start, stop] or [start, stop, step] "
+                             f"integers: {foreach_ref}")
+        return range(*range_ref)
+    raise ValueError(f"'foreach' defined but it does not contain exactly one of 'values' or 'range': {foreach_ref}")
+# [END get_foreach_values]
+
+
+# [START substitute_foreach]
+def substitute_foreach(value, placeholder, replacement):
+    """
+    Replaces the placeholder of a foreach operator in every string of a JSON value.
+    A string which is exactly the placeholder is replaced by the value itself, which keeps its JSON type.
+    Args:
+        value (object): a JSON compatible value (str, int, float, bool, None, list or dict)
+        placeholder (string): the placeholder of the foreach operator
+        replacement (object): the foreach value which replaces the placeholder
+    Returns:
+        a copy of the value with the placeholder replaced
+    """
+    if isinstance(value, str):
+        if value == placeholder:
+            return replacement
+        return value.replace(placeholder, str(replacement))
+    if isinstance(value, list):
+        return [substitute_foreach(elem, placeholder, replacement) for elem in value]
+    if isinstance(value, dict):
+        return {k: substitute_foreach(v, placeholder, replacement) for k, v in value.items()}
+    return value
+# [END substitute_foreach]
+
+
+# [START expand_operator]
+def expand_operator(operator_ref):
+    """
+    Expands an operator definition. An operator without a foreach definition is yielded as is, a foreach operator
+    is yielded once per value, one operator at a time, so the expanded operators are never held in memory together.
+    Args:
+        operator_ref (dict): the definition of the operator
+    Returns:
+        a generator of operator definitions
+    """
+    if 'foreach' not in operator_ref:
+        yield operator_ref
+        return
+
+    foreach_ref = operator_ref['foreach']
+    placeholder = get_foreach_placeholder(foreach_ref)
+    values = get_foreach_values(foreach_ref)
+    if placeholder not in operator_ref.get('task_id', ''):
+        raise ValueError(f"'foreach' defined but the 'task_id' does not contain the placeholder {placeholder}: "
+                         f"{operator_ref.get('task_id')}")
+
+    operator_template = {k: v for k, v in operator_ref.items() if k != 'foreach'}
+    for value in values:
+        yield substitute_foreach(operator_template, placeholder, value)
+# [END expand_operator]
+# [END foreach operator expansion]
+
+
+# [START load_code]
+# code objects of the DSL python code blocks, keyed by the sha256 of their source code
+compiled_code = {}
+
+
+def load_code(source):
+    """
+    Gets the code object of a block of DSL python code.
+    The code is unmarshalled from the code_cache shipped by the generator when it was compiled by the same
+    python version, otherwise it is compiled. Identical blocks of code are only loaded once.
+    Args:
+        source (string): the python source code
+
+    Returns a code object which can be passed to exec
+    """
+    key = hashlib.sha256(source.encode('utf-8')).hexdigest()
+    if key not in compiled_code:
+        if key in code_cache and code_cache_magic == importlib.util.MAGIC_NUMBER:
+            compiled_code[key] = marshal.loads(code_cache[key])
+        else:
+            compiled_code[key] = compile(source, '<string>', 'exec')
+    return compiled_code[key]
+# [END load_code]
 
 
 # [START dynamic function declarations]
@@ -72,28 +225,103 @@ def get_dynamic_function(key_name, func_def, func_name, func_dict):
         func_name (string): the json element name of the function name
         func_dict (string): the global dictionary in which to store the dynamic function
     """
-    if not list(find_key_in_dict(func_def, func_dict)):
+    if func_def not in func_dict:
         raise ValueError(
             f"{key_name} dynamic function requested but '{func_def}' was not found."
         )
-    if not list(find_key_in_dict(func_name, func_dict)):
+    if func_name not in func_dict:
         raise ValueError(
             f"{key_name} dynamic function requested but '{func_name}' was not found."
         )
 
-    exec("\n".join(func_dict[func_def]), dynamic_functions)
+    exec(load_code("\n".join(func_dict[func_def])), dynamic_functions)
     return dynamic_functions[func_dict[func_name]]()
 # [END dynamic function declarations]
 
 
+# [START resolve_kubernetes_secrets]
+# the Secret objects of every dag of the module, interned by their definition
+kubernetes_secrets = {}
+
+
+def resolve_kubernetes_secrets(payload_ref, payload_index):
+    """
+    Resolves the kubernetes secrets referenced by the kubernetes pod operators of a DAG, once per DAG.
+    Every undefined secret reference is reported in a single error.
+    Args:
+        payload_ref (dict): the payload of the dag
+        payload_index (dict): the key index of the payload of the dag
+
+    Returns a dictionary of secret name to Secret, shared by every pod which references the secret
+    """
+    from airflow.contrib.kubernetes import secret
+
+    kubernetes_secrets_ref = payload_ref['kubernetes_secrets'] if 'kubernetes_secrets' in payload_index else {}
+    resolved_secrets = {}
+    undefined_secrets = []
+    max_tasks = get_max_expanded_tasks()
+    pod_count = 0
+
+    for operator_template in payload_ref['kubernetes_pod_operators']:
+        # only the secret references of a foreach operator are expanded to find its referenced secrets
+        secret_refs_template = {
+            k: v for k, v in operator_template.items()
+            if k in ['task_id', 'name', 'foreach', 'pod_secret_refs', 'image_pull_secret_refs']
+        }
+        for operator_ref in expand_operator(secret_refs_template):
+            pod_count += 1
+            assert_expanded_tasks(pod_count, max_tasks)
+            for ref_key in ['pod_secret_refs', 'image_pull_secret_refs']:
+                for secret_ref in operator_ref.get(ref_key, []):
+                    if secret_ref in resolved_secrets:
+                        continue
+                    if secret_ref not in kubernetes_secrets_ref:
+                        undefined_secrets.append(
+                            f"Pod {operator_ref.get('name')} declares secret '{secret_ref}' in '{ref_key}'"
+                        )
+                        continue
+
+                    secret_entry_ref = kubernetes_secrets_ref[secret_ref]
+                    secret_key = (
+                        secret_entry_ref['deploy_type'],
+                        secret_entry_ref['deploy_target'],
+                        secret_entry_ref['secret'],
+                        secret_entry_ref['key']
+                    )
+                    if secret_key not in kubernetes_secrets:
+                        kubernetes_secrets[secret_key] = secret.Secret(
+                            # Deploy type: 'env' for environment  variable or 'volume'
+                            deploy_type=secret_entry_ref['deploy_type'],
+                            # The name of the environment variable or the path of the volume
+                            deploy_target=secret_entry_ref['deploy_target'],
+                            # Name of the Kubernetes Secret
+                            secret=secret_entry_ref['secret'],
+                            # Key of a secret stored in this Secret object or key in the form of service account file name
+                            key=secret_entry_ref['key']
+                        )
+                    resolved_secrets[secret_ref] = kubernetes_secrets[secret_key]
+
+    if undefined_secrets:
+        raise ValueError(
+            "Kubernetes secrets are referenced but they have not been defined in 'kubernetes_secrets': "
+            + "; ".join(undefined_secrets)
+        )
+
+    return resolved_secrets
+# [END resolve_kubernetes_secrets]
+
+
 # [START build_kubernetes_pod_operator]
-def build_kubernetes_pod_operator(operator_ref, dag_ref):
+def build_kubernetes_pod_operator(operator_ref, dag_ref, kubernetes_secrets_ref):
     """
     Builds a DAG operator of type: KubernetesPodOperator.
     Args:
         operator_ref (string): the definition of the operator
         dag_ref (string): the reference to the dag to associate this operator
+        kubernetes_secrets_ref (dict): the resolved secrets of the dag, see resolve_kubernetes_secrets
     """
+    from airflow.contrib.operators import kubernetes_pod_operator
+
     op = kubernetes_pod_operator.KubernetesPodOperator(
         task_id=operator_ref['task_id'],
         name=operator_ref['name'],
@@ -113,7 +341,7 @@ def build_kubernetes_pod_operator(operator_ref, dag_ref):
         op.env_vars = operator_ref['env_vars']
 
     if 'labels' in operator_ref:
-        op.env_vars = operator_ref['labels']
+        op.labels = operator_ref['labels']
 
     if 'startup_timeout_seconds' in operator_ref:
         op.startup_timeout_seconds = operator_ref['startup_timeout_seconds']
@@ -140,7 +368,7 @@ def build_kubernetes_pod_operator(operator_ref, dag_ref):
         op.volumes = operator_ref['volumes']
 
     if 'volume_mounts' in operator_ref:
-        op.volumes = operator_ref['volume_mounts']
+        op.volume_mounts = operator_ref['volume_mounts']
 
     if 'affinity' in operator_ref:
         op.affinity = operator_ref['affinity']
@@ -148,58 +376,19 @@ def build_kubernetes_pod_operator(operator_ref, dag_ref):
     if 'configmaps' in operator_ref:
         op.configmaps = operator_ref['configmaps']
 
-    # define pod secrets
-    pod_secrets = []
-    if 'pod_secret_refs' in operator_ref:
-        for pod_secret in operator_ref['pod_secret_refs']:
-            if not list(find_key_in_dict('kubernetes_secrets', payload)):
-                raise ValueError(
-                    f"Pod {operator_ref['name']} declares 'pod_secret_refs' but 'kubernetes_secrets' has not been defined."
-                )
-
-            secret_entry_ref = payload['kubernetes_secrets'][pod_secret]
-            secret_entry = secret.Secret(
-                # Deploy type: 'env' for environment  variable or 'volume'
-                deploy_type=secret_entry_ref['deploy_type'],
-                # The name of the environment variable or the path of the volume
-                deploy_target=secret_entry_ref['deploy_target'],
-                # Name of the Kubernetes Secret
-                secret=secret_entry_ref['secret'],
-                # Key of a secret stored in this Secret object or key in the form of service account file name
-                key=secret_entry_ref['key']
-            )
-            pod_secrets.append(secret_entry)
-
-        op.secrets = pod_secrets
+    if 'image_pull_policy' in operator_ref:
+        op.image_pull_policy = operator_ref['image_pull_policy']
 
-        if 'image_pull_policy' in operator_ref:
-            op.image_pull_policy = operator_ref['image_pull_policy']
+    # the secrets are shared by every pod, they are resolved once per dag by resolve_kubernetes_secrets
+    if 'pod_secret_refs' in operator_ref:
+        op.secrets = [kubernetes_secrets_ref[pod_secret] for pod_secret in operator_ref['pod_secret_refs']]
 
-        # define pull secrets
-        image_pull_secrets = []
-        if 'image_pull_secret_refs' in operator_ref:
-            for image_pull_secret in operator_ref['image_pull_secret_refs']:
-                if not list(find_key_in_dict('kubernetes_secrets', payload)):
-                    raise ValueError(
-                        f"Pod {operator_ref['name']} declares 'image_pull_secret_refs' but 'kubernetes_secrets' has not been defined."
-                    )
+    if 'image_pull_secret_refs' in operator_ref:
+        op.image_pull_secrets = [
+            kubernetes_secrets_ref[image_pull_secret] for image_pull_secret in operator_ref['image_pull_secret_refs']
+        ]
 
-                secret_entry_ref = payload['kubernetes_secrets'][image_pull_secret]
-                secret_entry = secret.Secret(
-                    # Deploy type: 'env' for environment  variable or 'volume'
-                    deploy_type=secret_entry_ref['deploy_type'],
-                    # The name of the environment variable or the path of the volume
-                    deploy_target=secret_entry_ref['deploy_target'],
-                    # Name of the Kubernetes Secret
-                    secret=secret_entry_ref['secret'],
-                    # Key of a secret stored in this Secret object or key in the form of service account file name
-                    key=secret_entry_ref['key']
-                )
-                image_pull_secrets.append(secret_entry)
-
-            op.image_pull_secrets = image_pull_secrets
-
-    return operator
+    return op
 # [END build_kubernetes_pod_operator]
 
 
@@ -211,8 +400,10 @@ def build_python_operator(operator_ref, dag_ref):
         operator_ref (string): the definition of the operator
         dag_ref (string): the reference to the dag to associate this operator
     """
+    from airflow.operators import python_operator
+
     dynamic_func = {}
-    exec("\n".join(operator_ref['function_def']), dynamic_func)
+    exec(load_code("\n".join(operator_ref['function_def'])), dynamic_func)
 
     op = python_operator.PythonOperator(
         task_id=operator_ref['task_id'],
@@ -232,6 +423,8 @@ def build_bash_operator(operator_ref, dag_ref):
         operator_ref (string): the definition of the operator
         dag_ref (string): the reference to the dag to associate this operator
     """
+    from airflow.operators import bash_operator
+
     op = bash_operator.BashOperator(
         task_id=operator_ref['task_id'],
         bash_command=";".join(operator_ref['command']),
@@ -242,117 +435,203 @@ def build_bash_operator(operator_ref, dag_ref):
 # [END build_bash_operator]
 
 
-# [START default_args definitions]
-default_args = {}
+# [START build_default_args]
+def build_default_args(payload_ref, payload_index):
+    """
+    Builds the default_args of a DAG.
+    Args:
+        payload_ref (dict): the payload of the dag
+        payload_index (dict): the key index of the payload of the dag
+    """
+    default_args = {}
+
+    # add default arguments if they have been specified
+    if 'default_args' in payload_index:
+        for key in payload_ref['default_args']:
+            default_args[key] = payload_ref['default_args'][key]
+
+    # add the retry_delay if it has been specified
+    if 'retry_delay' in payload_index:
+        default_args['retry_delay'] = get_dynamic_function(
+            'retry_delay',
+            'retry_delay_def',
+            'retry_delay_name',
+            payload_ref['dynamic_functions']['retry_delay']
+        )
+
+    return default_args
+# [END build_default_args]
 
-# add default arguments if they have been specified
-if list(find_key_in_dict('default_args', payload)):
-    for key in payload['default_args']:
-        default_args[key] = payload['default_args'][key]
 
-# add the retry_delay if it has been specified
-if list(find_key_in_dict('retry_delay', payload)):
-    default_args['retry_delay'] = get_dynamic_function(
-        'retry_delay',
-        'retry_delay_def',
-        'retry_delay_name',
-        payload['dynamic_functions']['retry_delay']
-    )
-# [END default_args definitions]
-
-
-# [START DAG definition]
-dag = airflow.DAG(
-    payload['dag_name'],
-    default_args=default_args
-)
-
-# add the start_date
-if not list(find_key_in_dict('start_date', payload)):
-    dag.start_date = datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(days=1)
-else:
-    dag.start_date = get_dynamic_function(
-        'start_date',
-        'start_date_def',
-        'start_date_name',
-        payload['dynamic_functions']['start_date']
+# [START build_dag_definition]
+def build_dag_definition(payload_ref, payload_index):
+    """
+    Builds a DAG, without operators.
+    Args:
+        payload_ref (dict): the payload of the dag
+        payload_index (dict): the key index of the payload of the dag
+    """
+    dag = airflow.DAG(
+        payload_ref['dag_name'],
+        default_args=build_default_args(payload_ref, payload_index)
     )
 
+    # add the start_date
+    if 'start_date' not in payload_index:
+        dag.start_date = datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(days=1)
+    else:
+        dag.start_date = get_dynamic_function(
+            'start_date',
+            'start_date_def',
+            'start_date_name',
+            payload_ref['dynamic_functions']['start_date']
+        )
 
-# add the schedule_interval
-if list(find_key_in_dict('schedule_interval', payload)):
-    dag.schedule_interval = get_dynamic_function(
-        'schedule_interval',
-        'schedule_interval_def',
-        'schedule_interval_name',
-        payload['dynamic_functions']['schedule_interval']
-    )
+    # add the schedule_interval
+    if 'schedule_interval' in payload_index:
+        dag.schedule_interval = get_dynamic_function(
+            'schedule_interval',
+            'schedule_interval_def',
+            'schedule_interval_name',
+            payload_ref['dynamic_functions']['schedule_interval']
+        )
 
-# add the dag run timeout
-if list(find_key_in_dict('dagrun_timeout', payload)):
-    dag.dagrun_timeout = get_dynamic_function(
-        'dagrun_timeout',
-        'dagrun_timeout_def',
-        'dagrun_timeout_name',
-        payload['dynamic_functions']['dagrun_timeout']
-    )
+    # add the dag run timeout
+    if 'dagrun_timeout' in payload_index:
+        dag.dagrun_timeout = get_dynamic_function(
+            'dagrun_timeout',
+            'dagrun_timeout_def',
+            'dagrun_timeout_name',
+            payload_ref['dynamic_functions']['dagrun_timeout']
+        )
 
-if 'dag_tags' in payload:
-    dag.tags = payload['dag_tags']
+    if 'dag_tags' in payload_ref:
+        dag.tags = payload_ref['dag_tags']
 
-if 'dag_params' in payload:
-    dag.params = payload['dag_params']
+    if 'dag_params' in payload_ref:
+        dag.params = payload_ref['dag_params']
 
-if 'dag_doc_md' in payload:
-    dag.doc_md = "\n".join(payload['dag_doc_md'])
-# [END DAG definition]
+    if 'dag_doc_md' in payload_ref:
+        dag.doc_md = "\n".join(payload_ref['dag_doc_md'])
 
+    return dag
+# [END build_dag_definition]
 
-# [START add operators to DAG]
-if (
-        not list(find_key_in_dict('bash_operators', payload))
-        and not list(find_key_in_dict('python_operators', payload))
-        and not list(find_key_in_dict('kubernetes_pod_operators', payload))
-):
-    raise ValueError(
-        "A DAG definition must contain at least one of; bash_operators, python_operators or kubernetes_pod_operators."
-    )
 
-if (
-        ('bash_operators' in payload and not len(payload['bash_operators']) > 0)
-        or ('python_operators' in payload and not len(payload['python_operators']) > 0)
-        or ('kubernetes_pod_operators' in payload and not len(payload['kubernetes_pod_operators']) > 0)
-):
-    raise ValueError(
-        "A DAG definition must contain at least one element in; bash_operators, python_operators or kubernetes_pod_operators."
-    )
+# [START add_operators]
+def add_operators(tasks, operators_ref, build_operator, task_count=0):
+    """
+    Builds the operators of an operator family, expanding the foreach operators one operator at a time.
+    Args:
+        tasks (dict): the task_id to operator dictionary of the dag, populated with the built operators
+        operators_ref (list): the definitions of the operators of the family
+        build_operator (function): the function which builds an operator from its definition
+        task_count (int): the number of operators of the dag built so far, by the other operator families
+
+    Returns the number of operators of the dag built so far, see get_max_expanded_tasks
+    """
+    max_tasks = get_max_expanded_tasks()
+    for operator_template in operators_ref:
+        if 'foreach' in operator_template:
+            tasks[operator_template['task_id']] = []
+        for operator in expand_operator(operator_template):
+            task_count += 1
+            assert_expanded_tasks(task_count, max_tasks)
+            op = build_operator(operator)
+            if 'foreach' in operator_template:
+                tasks[operator_template['task_id']].append(op)
+            tasks[op.task_id] = op
+    return task_count
+# [END add_operators]
+
+
+# [START get_tasks]
+def get_tasks(task, tasks):
+    """
+    Gets the operators referenced by a task_id, several operators when the task_id is a foreach operator.
+    Args:
+        task (string): the task_id
+        tasks (dict): the task_id to operator dictionary of the dag
+    Returns a list of operators
+    """
+    ops = tasks[task]
+    return ops if isinstance(ops, list) else [ops]
+# [END get_tasks]
 
-if list(find_key_in_dict('bash_operators', payload)):
-    bash_operators = payload['bash_operators']
-    for operator in bash_operators:
-        build_bash_operator(operator, dag)
 
-if list(find_key_in_dict('python_operators', payload)):
-    python_operators = payload['python_operators']
-    for operator in python_operators:
-        build_python_operator(operator, dag)
+# [START add_operators_to_dag]
+def add_operators_to_dag(payload_ref, payload_index, dag_ref):
+    """
+    Builds the operators of a DAG.
+    Args:
+        payload_ref (dict): the payload of the dag
+        payload_index (dict): the key index of the payload of the dag
+        dag_ref (string): the reference to the dag to associate the operators
+
+    Returns a dictionary of task_id to operator, used to define the dependencies of the tasks without a lookup
+    of each task in the dag. The task_id of a foreach operator, which contains the placeholder, is mapped to the
+    list of its expanded operators.
+    """
+    if (
+            'bash_operators' not in payload_index
+            and 'python_operators' not in payload_index
+            and 'kubernetes_pod_operators' not in payload_index
+    ):
+        raise ValueError(
+            "A DAG definition must contain at least one of; bash_operators, python_operators or kubernetes_pod_operators."
+        )
+
+    if (
+            ('bash_operators' in payload_ref and not len(payload_ref['bash_operators']) > 0)
+            or ('python_operators' in payload_ref and not len(payload_ref['python_operators']) > 0)
+            or ('kubernetes_pod_operators' in payload_ref and not len(payload_ref['kubernetes_pod_operators']) > 0)
+    ):
+        raise ValueError(
+            "A DAG definition must contain at least one element in; bash_operators, python_operators or kubernetes_pod_operators."
+        )
+
+    tasks = {}
+    task_count = 0
+
+    if 'bash_operators' in payload_index:
+        task_count = add_operators(
+            tasks,
+            payload_ref['bash_operators'],
+            lambda operator: build_bash_operator(operator, dag_ref),
+            task_count
+        )
+
+    if 'python_operators' in payload_index:
+        task_count = add_operators(
+            tasks,
+            payload_ref['python_operators'],
+            lambda operator: build_python_operator(operator, dag_ref),
+            task_count
+        )
+
+    if 'kubernetes_pod_operators' in payload_index:
+        kubernetes_secrets_ref = resolve_kubernetes_secrets(payload_ref, payload_index)
+        add_operators(
+            tasks,
+            payload_ref['kubernetes_pod_operators'],
+            lambda operator: build_kubernetes_pod_operator(operator, dag_ref, kubernetes_secrets_ref),
+            task_count
+        )
 
-if list(find_key_in_dict('kubernetes_pod_operators', payload)):
-    kubernetes_pod_operators = payload['kubernetes_pod_operators']
-    for operator in kubernetes_pod_operators:
-        build_kubernetes_pod_operator(operator, dag)
-# [END add operators to DAG]
+    return tasks
+# [END add_operators_to_dag]
 
 
 # [START validate_execution_sequence]
-def validate_execution_sequence(task_list):
+def validate_execution_sequence(task_list, tasks):
     """
     Validates a DAG execution sequence.
     Args:
-        task_list (string): the list of tasks to be validated within a dag
+        task_list (list): the list of tasks to be validated within a dag
+        tasks (dict): the task_id to operator dictionary of the dag
     """
     for task in task_list:
-        if not dag.has_task(task):
+        if task not in tasks:
             raise ValueError(
                 f"Task {task} is specified as a task in the 'execution_sequence' "
                 "but it has not been defined as a DAG task"
@@ -360,18 +639,117 @@ def validate_execution_sequence(task_list):
 # [END validate_execution_sequence]
 
 
-# [START define the sequence of task execution]
-if list(find_key_in_dict('execution_sequence', payload)):
-    execution_sequence_ref = payload['execution_sequence']
+# [START define_execution_sequence]
+def define_execution_sequence(payload_ref, payload_index, tasks):
+    """
+    Defines the sequence of task execution of a DAG.
+    Args:
+        payload_ref (dict): the payload of the dag
+        payload_index (dict): the key index of the payload of the dag
+        tasks (dict): the task_id to operator dictionary of the dag
+    """
+    if 'execution_sequence' in payload_index:
+        execution_sequence_ref = payload_ref['execution_sequence']
+
+        # validate that the tasks exist in the dag
+        validate_execution_sequence(execution_sequence_ref, tasks)
+
+        # chain each task of the sequence to the next one, equivalent to task_0 >> task_1 >> ... >> task_n
+        for upstream, downstream in zip(execution_sequence_ref, execution_sequence_ref[1:]):
+            downstream_ops = get_tasks(downstream, tasks)
+            for op in get_tasks(upstream, tasks):
+                op.set_downstream(downstream_ops)
+# [END define_execution_sequence]
+
+
+# [START validate_dependencies]
+def validate_dependencies(dependencies_ref, tasks):
+    """
+    Validates the dependencies of a DAG, reporting every unknown task in a single error.
+    Args:
+        dependencies_ref (dict): the task_id to list of upstream task_ids dictionary of the dag
+        tasks (dict): the task_id to operator dictionary of the dag
+    """
+    # a dict is used as an ordered set, so that each unknown task is reported once in document order
+    unknown_tasks = {}
+    for task, upstream_tasks in dependencies_ref.items():
+        for elem in [task] + upstream_tasks:
+            if elem not in tasks:
+                unknown_tasks[elem] = None
+
+    if unknown_tasks:
+        raise ValueError(
+            f"Tasks {', '.join(unknown_tasks)} are specified as tasks in the 'dependencies' "
+            "but they have not been defined as DAG tasks"
+        )
+# [END validate_dependencies]
+
+
+# [START define_dependencies]
+def define_dependencies(payload_ref, payload_index, tasks):
+    """
+    Defines the upstream tasks of each task of a DAG, which allows tasks to fan out and fan in.
+    Args:
+        payload_ref (dict): the payload of the dag
+        payload_index (dict): the key index of the payload of the dag
+        tasks (dict): the task_id to operator dictionary of the dag
+    """
+    if 'dependencies' in payload_index:
+        dependencies_ref = payload_ref['dependencies']
+
+        # validate that the tasks exist in the dag
+        validate_dependencies(dependencies_ref, tasks)
+
+        # add all of the upstream tasks of a task in a single call
+        for task, upstream_tasks in dependencies_ref.items():
+            upstream_ops = [op for elem in upstream_tasks for op in get_tasks(elem, tasks)]
+            if upstream_ops:
+                for op in get_tasks(task, tasks):
+                    op.set_upstream(upstream_ops)
+# [END define_dependencies]
+
+
+# [START build_dag]
+def build_dag(payload_ref):
+    """
+    Builds a DAG, its operators and its sequence of task execution from a JSON DSL payload.
+    Args:
+        payload_ref (dict): the payload of the dag
+    """
+    # index the payload once, every key lookup made while building the dag is answered from the index
+    payload_index = index_payload(payload_ref)
+    dag = build_dag_definition(payload_ref, payload_index)
+    tasks = add_operators_to_dag(payload_ref, payload_index, dag)
+    define_execution_sequence(payload_ref, payload_index, tasks)
+    define_dependencies(payload_ref, payload_index, tasks)
+    return dag
+# [END build_dag]
+
+
+# the dags of the module, by dag id
+registered_dags = {}
+
+
+# [START register_dag]
+def register_dag(dag_ref):
+    """
+    Registers a DAG of this module, it becomes a global of the module once every DAG of the module is built.
+    Args:
+        dag_ref (string): the reference to the dag to be registered
+    """
+    if dag_ref.dag_id in registered_dags:
+        raise ValueError(
+            f"DAG {dag_ref.dag_id} can not be registered, the name is already in use within the DAG module."
+        )
+    registered_dags[dag_ref.dag_id] = dag_ref
+# [END register_dag]
 
-    # validate that the tasks exist in the dag
-    validate_execution_sequence(execution_sequence_ref)
 
-    # define the sequence using the >> operator
-    execution_sequence_str = ' >> '.join([f"dag.get_task('{elem}')" for elem in execution_sequence_ref])
-    execution_sequence_def = ["def execution_sequence_def(dag):", f"    {execution_sequence_str}"]
+# [START DAG definitions]
+for payload in payloads:
+    register_dag(build_dag(payload))
 
-    # create and execute sequence dynamic function
-    exec("\n".join(execution_sequence_def), dynamic_functions)
-    dynamic_functions["execution_sequence_def"](dag)
-# [END define the sequence of task execution]
+# the globals of the module are where the Airflow scheduler looks for DAGs, they are only assigned once every DAG
+# is built as a DAG may be named like one of the globals used to build the DAGs, e.g. json or payload
+globals().update(registered_dags)
+# [END DAG definitions]
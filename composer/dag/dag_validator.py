@@ -11,10 +11,29 @@ __status__ = "Development"
 
 import logging
 import os
+import sys
+import gc
 import json
+import uuid
+import contextlib
 import importlib.util
+import types
+import airflow
 from airflow import models
-from composer.utils import log_service
+from airflow.serialization.serialized_objects import SerializedDAG
+from composer.utils import log_service, timing_service
+from composer.dag import dag_serializer
+
+
+# [START get_airflow_version]
+def get_airflow_version():
+    """
+    Gets the version of Airflow which validates the dags.
+    Returns:
+        the Airflow version string
+    """
+    return airflow.__version__
+# [END get_airflow_version]
 
 
 class DagValidator:
@@ -24,27 +43,94 @@ class DagValidator:
     logger = log_service.get_module_logger(__name__)
 
     # [START DagValidator constructor]
-    def __init__(self, dag_file):
+    def __init__(self, dag_file, serialized_file=None, source=None):
         # set class logger
         self.dag_file = dag_file
+        # the source code of the dag module, as rendered by DagGenerator.render, which is then loaded from memory
+        # instead of from the dag file
+        self.source = source
+        # the serialized representation of the dag, which allows a dag to be inspected without being imported
+        self.serialized_file = serialized_file
     # [END DagValidator constructor]
 
     # [START load_dag_module]
     def load_dag_module(self):
         """
-        Dynamically loads a concrete DAG file as a python module
+        Dynamically loads a concrete DAG file, or the in-memory source code of a DAG file, as a python module.
+        The module has a unique name and is not registered in sys.modules, see unload_dag_module.
         Returns:
             an instance of airflow.models.DAG
         """
         self.logger.log(logging.DEBUG, "Loading the dag module.")
-        module_name = os.path.splitext(self.dag_file)[0]
-        self.logger.log(logging.INFO, f"Loading dag module name: {module_name} from dag file: {self.dag_file}")
-        spec = importlib.util.spec_from_file_location(module_name, self.dag_file)
-        dag_module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(dag_module)
+        # a unique name, so that the modules of two validations never share any state
+        module_name = f"composer_dag_{uuid.uuid4().hex}"
+        if self.source is not None:
+            self.logger.log(logging.INFO, f"Loading dag module name: {module_name} from memory")
+            dag_module = types.ModuleType(module_name)
+            dag_module.__file__ = self.dag_file
+        else:
+            self.logger.log(logging.INFO, f"Loading dag module name: {module_name} from dag file: {self.dag_file}")
+            spec = importlib.util.spec_from_file_location(module_name, self.dag_file)
+            dag_module = importlib.util.module_from_spec(spec)
+        try:
+            with timing_service.phase('module_import', os.path.basename(self.dag_file)):
+                if self.source is not None:
+                    exec(compile(self.source, self.dag_file, 'exec'), vars(dag_module))
+                else:
+                    spec.loader.exec_module(dag_module)
+        except BaseException:
+            # the traceback of an invalid dag references the partially loaded module
+            self.unload_dag_module(dag_module)
+            raise
         return dag_module
     # [END load_dag_module]
 
+    # [START unload_dag_module]
+    def unload_dag_module(self, dag_module):
+        """
+        Tears down a module loaded by load_dag_module, so that its dags, operators and the globals of its dynamic
+        functions are freed at once, rather than being left behind in a long-running process.
+        The dags of the module must not be used after the module is unloaded.
+        Args:
+            dag_module (module): the dag module
+        """
+        module_name = dag_module.__name__
+        self.logger.log(logging.DEBUG, f"Unloading the dag module: {module_name}")
+        module_vars = vars(dag_module)
+        dags = [dag for dag in module_vars.values() if isinstance(dag, models.DAG)]
+
+        # a dag entered as a context manager, which was never exited, is referenced by the Airflow settings
+        settings = getattr(airflow, 'settings', None)
+        if any(dag is getattr(settings, 'CONTEXT_MANAGER_DAG', None) for dag in dags):
+            settings.CONTEXT_MANAGER_DAG = None
+
+        # the dags and their operators, and the module and the functions defined in it, reference each other
+        for dag in dags:
+            dag.task_dict.clear()
+        module_vars.clear()
+        if sys.modules.get(module_name) is dag_module:
+            del sys.modules[module_name]
+        # the python_callable of an operator and the namespace in which it was defined form a reference cycle, the
+        # objects of a validation are young, so collecting the younger generations frees them without the cost of a
+        # full collection of the objects of Airflow
+        gc.collect(1)
+    # [END unload_dag_module]
+
+    # [START disposable_dag_module]
+    @contextlib.contextmanager
+    def disposable_dag_module(self):
+        """
+        Loads the dag module for the duration of a with block, and then unloads it, see unload_dag_module.
+        Returns:
+            a context manager which yields the dag module
+        """
+        dag_module = self.load_dag_module()
+        try:
+            yield dag_module
+        finally:
+            self.unload_dag_module(dag_module)
+    # [END disposable_dag_module]
+
     # [START assert_has_valid_dag]
     def assert_has_valid_dag(self):
         """
@@ -53,15 +139,15 @@ class DagValidator:
             a boolean indicating if a dag is found. True == found, False == not found
         """
         self.logger.log(logging.DEBUG, "Asserting if the provided dag is valid.")
-        dag_module = self.load_dag_module()
-
         no_dag_found = True
 
-        for dag in vars(dag_module).values():
-            if isinstance(dag, models.DAG):
-                self.logger.log(logging.INFO, f"{dag_module} is a DAG instance")
-                no_dag_found = False
-                dag.test_cycle()  # Throws if a task cycle is found.
+        with self.disposable_dag_module() as dag_module:
+            for dag in vars(dag_module).values():
+                if isinstance(dag, models.DAG):
+                    self.logger.log(logging.INFO, f"{dag_module} is a DAG instance")
+                    no_dag_found = False
+                    with timing_service.phase('cycle_test', dag.dag_id):
+                        dag.test_cycle()  # Throws if a task cycle is found.
 
         if no_dag_found:
             raise AssertionError(f"DAG file {self.dag_file} does not contain a valid DAG")
@@ -76,55 +162,125 @@ class DagValidator:
         self.assert_has_valid_dag()
     # [START validate_dag]
 
-    # [START safe_serialize]
-    def safe_serialize(self, obj):
+    # [START serialize_dags]
+    def serialize_dags(self):
         """
-        Safely serialize a Python object to json - even when there are non-serializable attributes.
-        Args:
-            obj (Object): the object to be serialized
+        Loads the DAGs of a module, validates them and converts them to their Airflow serialized representation.
         Returns:
-            a json string representing the serialized object
+            a list containing the serialized representation of each dag of the module
         """
-        self.logger.log(logging.DEBUG, "Safely serializing the provided dag.")
-        return json.dumps(obj, default=lambda o: f"<<non-serializable: {type(o).__qualname__}>>", indent=4)
-    # [END safe_serialize]
+        self.logger.log(logging.DEBUG, "Serializing the provided dag.")
+        serialized_dags = []
 
-    # [START inspect_dag]
-    def inspect_dag(self):
+        with self.disposable_dag_module() as dag_module:
+            for dag in vars(dag_module).values():
+                if isinstance(dag, models.DAG):
+                    self.logger.log(logging.INFO, f"{dag_module} is a DAG instance")
+                    with timing_service.phase('cycle_test', dag.dag_id):
+                        dag.test_cycle()  # Throws if a task cycle is found.
+                    serialized_dags.append(SerializedDAG.to_dict(dag))
+
+        if not serialized_dags:
+            raise AssertionError(f"DAG file {self.dag_file} does not contain a valid DAG")
+
+        return serialized_dags
+    # [END serialize_dags]
+
+    # [START iter_inspect_serialized_dag]
+    def iter_inspect_serialized_dag(self, view=None):
         """
-        Loads a DAG, validates the DAG and then dumps the DAG structure to a JSON string.
+        Dumps the DAG structure of the serialized representation of a DAG to JSON, without importing the dag.
+        The serialized dag is read before this method returns, and it is then encoded as the JSON is consumed.
+        Args:
+            view (dict): the fields and the page of tasks to dump, see dag_serializer.get_view
         Returns:
-            an instance of the validated dag represented as a json string
+            a generator of JSON strings, which concatenated form the serialized dag, with its tasks under tasks_details
         """
-        self.logger.log(logging.DEBUG, "Inspecting the provided dag.")
-        dag_module = self.load_dag_module()
+        self.logger.log(logging.DEBUG, f"Inspecting the serialized dag: {self.serialized_file}")
+        with open(self.serialized_file) as f:
+            serialized_dags = json.load(f)
 
-        no_dag_found = True
-
-        dag_as_str = ""
+        if not serialized_dags:
+            raise AssertionError(f"Serialized DAG file {self.serialized_file} does not contain a valid DAG")
 
-        for dag in vars(dag_module).values():
-            if isinstance(dag, models.DAG):
-                self.logger.log(logging.INFO, f"{dag_module} is a DAG instance")
+        # as with inspect_dag, the last dag of the module is inspected
+        return self.__iter_json(dag_serializer.DagSerializer.from_serialized_dag(serialized_dags[-1], view))
+    # [END iter_inspect_serialized_dag]
 
-                no_dag_found = False
-
-                # put the dag details into a dictionary
-                dag_dict = vars(dag)
+    # [START inspect_serialized_dag]
+    def inspect_serialized_dag(self, view=None):
+        """
+        Dumps the DAG structure of the serialized representation of a DAG to a JSON string, without importing the dag.
+        Args:
+            view (dict): the fields and the page of tasks to dump, see dag_serializer.get_view
+        Returns:
+            the serialized dag, with its tasks under tasks_details, represented as a json string
+        """
+        return "".join(self.iter_inspect_serialized_dag(view))
+    # [END inspect_serialized_dag]
 
-                # iterate the task details and add to array
-                tasks = []
-                for task in dag.tasks:
-                    tasks.append(vars(task))
+    # [START iter_inspect_dag]
+    def iter_inspect_dag(self, view=None):
+        """
+        Loads a DAG, validates the DAG and then dumps the DAG structure to JSON, one task at a time.
+        The DAG is validated before this method returns, so an invalid DAG raises before any JSON is produced. The
+        module of the DAG is unloaded once the JSON is consumed, or the generator is closed.
+        When a serialized dag file is available, the DAG structure is read from it instead.
+        Args:
+            view (dict): the fields and the page of tasks to dump, see dag_serializer.get_view
+        Returns:
+            a generator of JSON strings, which concatenated form the validated dag
+        """
+        self.logger.log(logging.DEBUG, "Inspecting the provided dag.")
+        if self.serialized_file is not None:
+            return self.iter_inspect_serialized_dag(view)
 
-                # inject the task details array into the dag details dictionary
-                dag_dict['tasks_details'] = tasks
+        dag_module = self.load_dag_module()
+        try:
+            # the last dag of the module is inspected, the dag is only read so it is not modified by the inspection
+            dags = [dag for dag in vars(dag_module).values() if isinstance(dag, models.DAG)]
+            if not dags:
+                raise AssertionError(f"DAG file {self.dag_file} does not contain a valid DAG")
 
-                # safely serialize the dict to json
-                dag_as_str = self.safe_serialize(dag_dict)
+            self.logger.log(logging.INFO, f"{dag_module} is a DAG instance")
+            for dag in dags:
+                with timing_service.phase('cycle_test', dag.dag_id):
+                    dag.test_cycle()  # Throws if a task cycle is found.
+            serializer = dag_serializer.DagSerializer.from_dag(dags[-1], view)
+        except BaseException:
+            self.unload_dag_module(dag_module)
+            raise
+        return self.__iter_json(serializer, dag_module)
+    # [END iter_inspect_dag]
 
-        if no_dag_found:
-            raise AssertionError(f"DAG file {self.dag_file} does not contain a valid DAG")
+    # [START __iter_json]
+    def __iter_json(self, serializer, dag_module=None):
+        """
+        Encodes a dag to JSON, timing the encoding as it is consumed, and then unloads the module of the dag,
+        see unload_dag_module.
+        Args:
+            serializer (DagSerializer): the serializer of the dag
+            dag_module (module): the dag module, which is unloaded once the dag is encoded, None when the dag is
+                                 read from its serialized representation
+        Returns:
+            a generator of JSON strings, see DagSerializer.iter_json
+        """
+        try:
+            with timing_service.phase('inspect_serialization'):
+                yield from serializer.iter_json()
+        finally:
+            if dag_module is not None:
+                self.unload_dag_module(dag_module)
+    # [END __iter_json]
 
-        return dag_as_str
+    # [START inspect_dag]
+    def inspect_dag(self, view=None):
+        """
+        Loads a DAG, validates the DAG and then dumps the DAG structure to a JSON string, see iter_inspect_dag.
+        Args:
+            view (dict): the fields and the page of tasks to dump, see dag_serializer.get_view
+        Returns:
+            an instance of the validated dag represented as a json string
+        """
+        return "".join(self.iter_inspect_dag(view))
     # [END inspect_dag]
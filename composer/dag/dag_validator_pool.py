@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+
+"""dag_validator_pool.py: Module that validates dags in a pool of warm, resource limited validator processes"""
+
+__author__ = "Damian McDonald"
+__credits__ = ["Damian McDonald"]
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Damian McDonald"
+__status__ = "Development"
+
+import os
+import sys
+import json
+import time
+import queue
+import select
+import signal
+import socket
+import logging
+import resource
+import traceback
+import subprocess
+from multiprocessing.connection import Connection
+from composer.utils import log_service
+
+# default limits of a validation job, when the VALIDATOR_* env vars are not defined
+DEFAULT_POOL_SIZE = 0
+DEFAULT_CPU_TIME_LIMIT = 30
+DEFAULT_MEMORY_LIMIT = 1024
+DEFAULT_TIMEOUT = 60
+# additional seconds a worker is given to reply, which covers the import of Airflow by a new worker
+WORKER_TIMEOUT_MARGIN = 60
+
+# gets the logger for this module
+logger = log_service.get_module_logger(__name__)
+
+
+# [START get_validator_pool_size]
+def get_validator_pool_size():
+    """
+    Gets the number of validator processes, from the VALIDATOR_POOL_SIZE env var.
+    Returns:
+        the number of validator processes, 0 when dags are validated in the calling process
+    """
+    if 'VALIDATOR_POOL_SIZE' in os.environ:
+        return int(os.environ['VALIDATOR_POOL_SIZE'])
+    return DEFAULT_POOL_SIZE
+# [END get_validator_pool_size]
+
+
+# [START set_job_limits]
+def set_job_limits(cpu_time_limit, memory_limit):
+    """
+    Limits the resources of the current (job) process. The memory limit is added to the memory which the
+    process has already mapped, as the job process inherits the imported Airflow modules of its worker.
+    Args:
+        cpu_time_limit (int): the CPU seconds of the job, the job is killed when they are exceeded
+        memory_limit (int): the additional MB of memory of the job, allocations fail when they are exceeded
+    """
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_time_limit, cpu_time_limit + 1))
+    try:
+        with open('/proc/self/statm') as f:
+            mapped_bytes = int(f.read().split()[0]) * resource.getpagesize()
+    except OSError:
+        mapped_bytes = 0
+    memory_bytes = mapped_bytes + memory_limit * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+# [END set_job_limits]
+
+
+# [START validate_job]
+def validate_job(dag_validator, job):
+    """
+    Validates, and optionally inspects, the dag of a job; executed by the job process.
+    Args:
+        dag_validator (module): the composer.dag.dag_validator module
+        job (dict): the dag_file name, the source of the dag module, the inspect indication and the view of the
+                    dag definition
+    Returns:
+        a dict containing the is_valid indication, the dag_definition when inspected, or the error
+    """
+    try:
+        validator = dag_validator.DagValidator(job['dag_file'], source=job['source'])
+        if job['inspect']:
+            # the dag definition is returned as the json string of the serializer, it is not decoded and encoded again
+            return {'is_valid': True, 'dag_definition': validator.inspect_dag(job['view'])}
+        validator.validate_dag()
+        return {'is_valid': True}
+    except Exception as e:
+        return {'is_valid': False, 'error': "".join(traceback.format_exception_only(type(e), e)).strip()}
+# [END validate_job]
+
+
+# [START run_job]
+def run_job(dag_validator, job, cpu_time_limit, memory_limit, timeout):
+    """
+    Runs a job in a process forked from the worker, so that the job is resource limited and any state which it
+    leaves behind, such as imported modules, is discarded with the process.
+    Args:
+        dag_validator (module): the composer.dag.dag_validator module
+        job (dict): the job, see validate_job
+        cpu_time_limit (int): the CPU seconds of the job
+        memory_limit (int): the additional MB of memory of the job
+        timeout (int): the wall clock seconds of the job
+    Returns:
+        the result of the job, see validate_job
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            set_job_limits(cpu_time_limit, memory_limit)
+            result = json.dumps(validate_job(dag_validator, job), default=str).encode('utf-8')
+        except BaseException as e:
+            result = json.dumps({'is_valid': False, 'error': f"{type(e).__name__}: {e}"}).encode('utf-8')
+        with os.fdopen(write_fd, 'wb') as f:
+            f.write(result)
+        os._exit(0)
+
+    os.close(write_fd)
+    chunks = []
+    timed_out = False
+    deadline = time.monotonic() + timeout
+    with os.fdopen(read_fd, 'rb', buffering=0) as f:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([f], [], [], remaining)[0]:
+                timed_out = True
+                break
+            chunk = f.read(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    if timed_out:
+        os.kill(pid, signal.SIGKILL)
+    _, status = os.waitpid(pid, 0)
+
+    if timed_out:
+        return {'is_valid': False, 'error': f"Validation exceeded the timeout of {timeout} seconds"}
+    if os.WIFSIGNALED(status):
+        if os.WTERMSIG(status) in [signal.SIGXCPU, signal.SIGKILL]:
+            return {'is_valid': False, 'error': f"Validation exceeded the CPU time limit of {cpu_time_limit} seconds"}
+        return {'is_valid': False, 'error': f"Validation was terminated by signal {os.WTERMSIG(status)}"}
+    if not chunks:
+        return {'is_valid': False, 'error': "Validation exited without a result"}
+    return json.loads(b"".join(chunks))
+# [END run_job]
+
+
+# [START run_worker]
+def run_worker(conn, cpu_time_limit, memory_limit, timeout):
+    """
+    The main loop of a worker process; imports Airflow once and then runs each job that it receives.
+    Args:
+        conn (multiprocessing.connection.Connection): the connection to the pool
+        cpu_time_limit (int): the CPU seconds of a job
+        memory_limit (int): the additional MB of memory of a job
+        timeout (int): the wall clock seconds of a job
+    """
+    # imported once, the job processes forked by the worker inherit the imported Airflow modules
+    from composer.dag import dag_validator
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        conn.send(run_job(dag_validator, job, cpu_time_limit, memory_limit, timeout))
+# [END run_worker]
+
+
+class DagValidatorPool:
+    """Class used to validate dags in a pool of worker processes, which have already imported Airflow"""
+
+    # [START DagValidatorPool constructor]
+    def __init__(self, size, cpu_time_limit=DEFAULT_CPU_TIME_LIMIT, memory_limit=DEFAULT_MEMORY_LIMIT,
+                 timeout=DEFAULT_TIMEOUT):
+        """
+        DagValidatorPool constructor, which starts the worker processes.
+        Args:
+            size (int): the number of worker processes
+            cpu_time_limit (int): the CPU seconds of a validation
+            memory_limit (int): the additional MB of memory of a validation
+            timeout (int): the wall clock seconds of a validation
+        """
+        if size < 1:
+            raise ValueError(f"The size of a validator pool must be at least 1: {size}")
+        self.cpu_time_limit = cpu_time_limit
+        self.memory_limit = memory_limit
+        self.timeout = timeout
+        self.idle_workers = queue.Queue()
+        for _ in range(size):
+            self.idle_workers.put(self.start_worker())
+    # [END DagValidatorPool constructor]
+
+    # [START from_env]
+    @classmethod
+    def from_env(cls, size=None):
+        """
+        Creates a pool configured by the VALIDATOR_POOL_SIZE, VALIDATOR_CPU_TIME_LIMIT, VALIDATOR_MEMORY_LIMIT (MB)
+        and VALIDATOR_TIMEOUT env vars.
+        Args:
+            size (int): the number of worker processes, VALIDATOR_POOL_SIZE when None
+        Returns:
+            an instance of DagValidatorPool
+        """
+        return cls(
+            get_validator_pool_size() if size is None else size,
+            cpu_time_limit=int(os.environ.get('VALIDATOR_CPU_TIME_LIMIT', DEFAULT_CPU_TIME_LIMIT)),
+            memory_limit=int(os.environ.get('VALIDATOR_MEMORY_LIMIT', DEFAULT_MEMORY_LIMIT)),
+            timeout=int(os.environ.get('VALIDATOR_TIMEOUT', DEFAULT_TIMEOUT))
+        )
+    # [END from_env]
+
+    # [START start_worker]
+    def start_worker(self):
+        """
+        Starts a worker process. Workers are started as new interpreters, not forked, so that they do not inherit
+        the state (threads, gevent hub, open sockets) of the calling process.
+        Returns:
+            a tuple of the worker process and the connection to the worker
+        """
+        sock, worker_sock = socket.socketpair()
+        process = subprocess.Popen(
+            [
+                sys.executable, '-m', __name__, str(worker_sock.fileno()),
+                str(self.cpu_time_limit), str(self.memory_limit), str(self.timeout)
+            ],
+            pass_fds=[worker_sock.fileno()],
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        )
+        worker_sock.close()
+        logger.log(logging.DEBUG, f"Started validator worker: {process.pid}")
+        return process, Connection(sock.detach())
+    # [END start_worker]
+
+    # [START validate]
+    def validate(self, dag_file, source, inspect=False, view=None):
+        """
+        Validates, and optionally inspects, the in-memory source of a dag module, or a dag file, in a worker process.
+        Args:
+            dag_file (string): the path of the dag file, used to name the dag module
+            source (bytes): the source code of the dag module, see DagGenerator.render, None to load the dag file
+            inspect (bool): also returns the dag_definition of the dag, see DagValidator.inspect_dag
+            view (dict): the fields and the page of tasks of the dag_definition, see dag_serializer.get_view
+        Returns:
+            a dict containing the is_valid indication, the dag_definition json string when inspected, or the error
+        """
+        process, conn = self.idle_workers.get()
+        try:
+            conn.send({'dag_file': dag_file, 'source': source, 'inspect': inspect, 'view': view})
+            # polling, instead of a blocking recv, lets other greenlets run while the job is running
+            if not conn.poll(self.timeout + WORKER_TIMEOUT_MARGIN):
+                raise TimeoutError(f"Validator worker {process.pid} did not reply")
+            return conn.recv()
+        except (EOFError, OSError) as e:
+            # the worker is replaced, as it is not known whether it can still run jobs
+            logger.log(logging.WARNING, f"Validator worker {process.pid} failed: {e}")
+            process.kill()
+            conn.close()
+            process, conn = self.start_worker()
+            return {'is_valid': False, 'error': f"Validator worker failed: {e}"}
+        finally:
+            self.idle_workers.put((process, conn))
+    # [END validate]
+
+    # [START close]
+    def close(self):
+        """Stops the idle worker processes of the pool"""
+        while not self.idle_workers.empty():
+            process, conn = self.idle_workers.get()
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            conn.close()
+    # [END close]
+
+
+if __name__ == '__main__':
+    # started by DagValidatorPool.start_worker with the fd of its connection and the limits of a job
+    run_worker(Connection(int(sys.argv[1])), int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]))
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+
+"""cache_service.py: Service module that provides in-memory and on-disk caching functionalities"""
+
+__author__ = "Damian McDonald"
+__credits__ = ["Damian McDonald"]
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Damian McDonald"
+__status__ = "Development"
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from composer.utils import log_service
+
+# default number of entries of a cache, when the CACHE_SIZE env var is not defined
+DEFAULT_CACHE_SIZE = 128
+# default directory of the on-disk tier of the validation cache, when the VALIDATION_CACHE_DIR env var is not
+# defined the validation cache is only held in memory
+DEFAULT_VALIDATION_CACHE_DIR = None
+
+# gets the logger for this module
+logger = log_service.get_module_logger(__name__)
+
+
+class LruCache:
+    """Class used to cache a bounded number of entries, evicting the least recently used entry when full"""
+
+    # [START LruCache constructor]
+    def __init__(self, max_size):
+        """
+        LruCache constructor.
+        Args:
+            max_size (int): the maximum number of entries of the cache
+        """
+        if max_size < 1:
+            raise ValueError(f"The size of a cache must be at least 1: {max_size}")
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    # [END LruCache constructor]
+
+    # [START get]
+    def get(self, key, default=None):
+        """
+        Gets the value of a cache entry, marking the entry as the most recently used.
+        Args:
+            key (object): the key of the entry
+            default (object): the value returned when the key is not cached
+        Returns:
+            the cached value, otherwise default
+        """
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+    # [END get]
+
+    # [START put]
+    def put(self, key, value):
+        """
+        Caches a value, evicting the least recently used entry when the cache is full.
+        Args:
+            key (object): the key of the entry
+            value (object): the value of the entry
+        """
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                evicted_key, _ = self.entries.popitem(last=False)
+                logger.log(logging.DEBUG, f"Evicted cache entry: {evicted_key}")
+    # [END put]
+
+    # [START remove]
+    def remove(self, key):
+        """
+        Removes a cache entry, if it is cached.
+        Args:
+            key (object): the key of the entry
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+    # [END remove]
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+
+class DiskCache:
+    """
+    Class used to cache JSON compatible values as files of a directory, so that the entries are shared by the
+    worker processes of the API and kept when they are restarted
+    """
+
+    # [START DiskCache constructor]
+    def __init__(self, cache_dir):
+        """
+        DiskCache constructor, which creates the cache directory if it does not exist.
+        Args:
+            cache_dir (string): the directory in which the entries are written
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+    # [END DiskCache constructor]
+
+    # [START get_entry_file]
+    def get_entry_file(self, key):
+        """
+        Gets the path of the file of a cache entry.
+        Args:
+            key (object): the JSON compatible key of the entry
+        Returns:
+            the path of the file of the entry, named by the hash of the key
+        """
+        key_hash = hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key_hash}.json")
+    # [END get_entry_file]
+
+    # [START get]
+    def get(self, key, default=None):
+        """
+        Gets the value of a cache entry.
+        Args:
+            key (object): the JSON compatible key of the entry
+            default (object): the value returned when the key is not cached
+        Returns:
+            the cached value, otherwise default
+        """
+        try:
+            with open(self.get_entry_file(key), 'rb') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return default
+        # the key is stored with the value, so that a hash collision is never returned as a cache hit
+        if entry.get('key') != json.loads(json.dumps(key)):
+            return default
+        return entry['value']
+    # [END get]
+
+    # [START put]
+    def put(self, key, value):
+        """
+        Caches a value. The entry is written to a temporary file which then replaces the entry file, so that a
+        concurrent reader never reads a partially written entry.
+        Args:
+            key (object): the JSON compatible key of the entry
+            value (object): the JSON compatible value of the entry
+        """
+        entry_file = self.get_entry_file(key)
+        fd, temp_file = tempfile.mkstemp(dir=self.cache_dir, prefix=f".{os.path.basename(entry_file)}.")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'key': key, 'value': value}, f)
+            os.replace(temp_file, entry_file)
+        except BaseException:
+            os.remove(temp_file)
+            raise
+    # [END put]
+
+    # [START remove]
+    def remove(self, key):
+        """
+        Removes a cache entry, if it is cached.
+        Args:
+            key (object): the JSON compatible key of the entry
+        """
+        try:
+            os.remove(self.get_entry_file(key))
+        except FileNotFoundError:
+            pass
+    # [END remove]
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+class TieredCache:
+    """Class used to cache entries in a bounded in-memory LruCache, backed by an optional DiskCache"""
+
+    # [START TieredCache constructor]
+    def __init__(self, max_size, cache_dir=None):
+        """
+        TieredCache constructor.
+        Args:
+            max_size (int): the maximum number of entries of the in-memory tier
+            cache_dir (string): the directory of the on-disk tier, None when the entries are only held in memory
+        """
+        self.memory_cache = LruCache(max_size)
+        self.disk_cache = DiskCache(cache_dir) if cache_dir is not None else None
+    # [END TieredCache constructor]
+
+    # [START get]
+    def get(self, key, default=None):
+        """
+        Gets the value of a cache entry from the in-memory tier, then from the on-disk tier. An entry which is
+        only found on disk is added to the in-memory tier.
+        Args:
+            key (object): the key of the entry, JSON compatible when the on-disk tier is used
+            default (object): the value returned when the key is not cached
+        Returns:
+            the cached value, otherwise default
+        """
+        value = self.memory_cache.get(key)
+        if value is None and self.disk_cache is not None:
+            value = self.disk_cache.get(key)
+            if value is not None:
+                self.memory_cache.put(key, value)
+        return default if value is None else value
+    # [END get]
+
+    # [START put]
+    def put(self, key, value):
+        """
+        Caches a value in both tiers.
+        Args:
+            key (object): the key of the entry, JSON compatible when the on-disk tier is used
+            value (object): the value of the entry, JSON compatible when the on-disk tier is used
+        """
+        self.memory_cache.put(key, value)
+        if self.disk_cache is not None:
+            self.disk_cache.put(key, value)
+    # [END put]
+
+    # [START remove]
+    def remove(self, key):
+        """
+        Removes a cache entry from both tiers, if it is cached.
+        Args:
+            key (object): the key of the entry
+        """
+        self.memory_cache.remove(key)
+        if self.disk_cache is not None:
+            self.disk_cache.remove(key)
+    # [END remove]
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self.memory_cache)
+
+
+# [START get_cache_size]
+def get_cache_size():
+    """
+    Gets the number of entries of a cache, from the CACHE_SIZE env var.
+    Returns:
+        the number of entries of a cache
+    """
+    if 'CACHE_SIZE' in os.environ:
+        return int(os.environ['CACHE_SIZE'])
+    return DEFAULT_CACHE_SIZE
+# [END get_cache_size]
+
+
+# [START get_payload_hash]
+def get_payload_hash(payload, excluded_keys=None):
+    """
+    Gets the canonical hash of a JSON payload. The payload is serialized with sorted keys and without whitespace
+    between its elements, so payloads which only differ by key order or formatting have the same hash.
+    Args:
+        payload (dict): the JSON payload
+        excluded_keys (list): top level keys of the payload which are not part of the hash
+    Returns:
+        the sha256 hex digest of the canonical payload
+    """
+    excluded_keys = excluded_keys or []
+    canonical_payload = json.dumps(
+        {k: v for k, v in payload.items() if k not in excluded_keys},
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False
+    )
+    return hashlib.sha256(canonical_payload.encode('utf-8')).hexdigest()
+# [END get_payload_hash]
+
+
+# [START get_validation_cache_dir]
+def get_validation_cache_dir():
+    """
+    Gets the directory of the on-disk tier of the validation cache, from the VALIDATION_CACHE_DIR env var.
+    Returns:
+        the directory of the on-disk tier, None when the validation cache is only held in memory
+    """
+    return os.environ.get('VALIDATION_CACHE_DIR', DEFAULT_VALIDATION_CACHE_DIR)
+# [END get_validation_cache_dir]
+
+
+# [START get_artifact_hash]
+def get_artifact_hash(files):
+    """
+    Gets the hash of the files of a dag, the artifact which is validated. The name of each file is part of the hash,
+    as it names the dag module.
+    Args:
+        files (dict): file name to file contents as bytes
+    Returns:
+        the sha256 hex digest of the files
+    """
+    artifact_hash = hashlib.sha256()
+    for file_name in sorted(files):
+        file_name_bytes = file_name.encode('utf-8')
+        artifact_hash.update(len(file_name_bytes).to_bytes(8, 'big') + file_name_bytes)
+        artifact_hash.update(len(files[file_name]).to_bytes(8, 'big') + files[file_name])
+    return artifact_hash.hexdigest()
+# [END get_artifact_hash]
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+"""timing_service.py: Service module that records the timings of the phases of a request, such as the generation,
+                      the import and the upload of a dag"""
+
+__author__ = "Damian McDonald"
+__credits__ = ["Damian McDonald"]
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Damian McDonald"
+__status__ = "Development"
+
+import os
+import time
+import threading
+
+# the request header which enables the timings of a request, e.g. X-Debug-Timings: true
+TIMINGS_HEADER = 'X-Debug-Timings'
+# the values of the request header, and of the DEBUG_TIMINGS env var, which enable the timings
+ENABLED_VALUES = ['1', 'true', 'yes']
+
+# the timings of the request handled by the current thread, or greenlet when the threads are monkey patched
+recording = threading.local()
+
+
+class Phase:
+    """Class used to time a phase of a request, as a context manager"""
+
+    # [START Phase constructor]
+    def __init__(self, timings, name, description=None):
+        """
+        Phase constructor.
+        Args:
+            timings (dict): the timings of the request, see start_timings
+            name (string): the name of the phase
+            description (string): the description of the phase, such as the name of an uploaded file
+        """
+        self.timings = timings
+        self.name = name
+        self.description = description
+        self.start = None
+    # [END Phase constructor]
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        phase = {'phase': self.name, 'duration_ms': round((time.perf_counter() - self.start) * 1000, 3)}
+        if self.description is not None:
+            phase['description'] = self.description
+        self.timings['phases'].append(phase)
+        return False
+
+
+class NullPhase:
+    """Class used in place of a Phase when the timings are not recorded, so that timing a phase costs nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+
+# the phase of every request whose timings are not recorded
+NULL_PHASE = NullPhase()
+
+
+# [START is_enabled]
+def is_enabled(header_value=None):
+    """
+    Determines if the timings of a request are recorded, either for every request by the DEBUG_TIMINGS env var or
+    for a single request by the X-Debug-Timings header.
+    Args:
+        header_value (string): the value of the X-Debug-Timings header of the request, None when it is not sent
+    Returns:
+        a boolean indicating if the timings are recorded
+    """
+    if os.environ.get('DEBUG_TIMINGS', '').lower() in ENABLED_VALUES:
+        return True
+    return header_value is not None and header_value.lower() in ENABLED_VALUES
+# [END is_enabled]
+
+
+# [START start_timings]
+def start_timings():
+    """
+    Starts recording the timings of the phases of the request handled by the current thread.
+    Returns:
+        the timings of the request, a dict containing the start time and the list of the timed phases
+    """
+    recording.timings = {'start': time.perf_counter(), 'phases': []}
+    return recording.timings
+# [END start_timings]
+
+
+# [START stop_timings]
+def stop_timings():
+    """
+    Stops recording the timings of the request handled by the current thread.
+    Returns:
+        the timings block of the request, see get_timings, None when the timings were not recorded
+    """
+    timings = get_timings()
+    recording.timings = None
+    return timings
+# [END stop_timings]
+
+
+# [START get_timings]
+def get_timings():
+    """
+    Gets the timings block of the request handled by the current thread.
+    Returns:
+        a dict containing the total_ms of the request so far and its phases, in the order in which they completed,
+        None when the timings are not recorded
+    """
+    timings = getattr(recording, 'timings', None)
+    if timings is None:
+        return None
+    return {
+        'total_ms': round((time.perf_counter() - timings['start']) * 1000, 3),
+        'phases': list(timings['phases'])
+    }
+# [END get_timings]
+
+
+# [START phase]
+def phase(name, description=None):
+    """
+    Times a phase of the request handled by the current thread.
+    Usage:
+        with timing_service.phase('gcs_upload', blob_name):
+            ...
+    Args:
+        name (string): the name of the phase
+        description (string): the description of the phase, such as the name of an uploaded file
+    Returns:
+        a context manager which times the phase, which does nothing when the timings are not recorded
+    """
+    timings = getattr(recording, 'timings', None)
+    if timings is None:
+        return NULL_PHASE
+    return Phase(timings, name, description)
+# [END phase]
+
+
+# [START get_server_timing]
+def get_server_timing(timings):
+    """
+    Formats a timings block as the value of a Server-Timing response header.
+    Args:
+        timings (dict): the timings block, see get_timings
+    Returns:
+        the value of the Server-Timing header, e.g. generation;dur=1.2, gcs_upload;desc="dags/dag.py";dur=80.1
+    """
+    metrics = []
+    for elem in timings['phases']:
+        metric = elem['phase']
+        if 'description' in elem:
+            description = str(elem['description']).replace('\\', '\\\\').replace('"', '\\"')
+            metric += f";desc=\"{description}\""
+        metrics.append(f"{metric};dur={elem['duration_ms']}")
+    metrics.append(f"total;dur={timings['total_ms']}")
+    return ", ".join(metrics)
+# [END get_server_timing]
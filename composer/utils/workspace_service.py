@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""workspace_service.py: Service module that provides isolated, temporary workspace directories"""
+
+__author__ = "Damian McDonald"
+__credits__ = ["Damian McDonald"]
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Damian McDonald"
+__status__ = "Development"
+
+import os
+import stat
+import shutil
+import logging
+import tempfile
+import contextlib
+from composer.utils import log_service
+
+# prefix of the workspace directories, which are created in the system temp directory
+WORKSPACE_PREFIX = "composer-workspace-"
+
+# gets the logger for this module
+logger = log_service.get_module_logger(__name__)
+
+
+# [START create_workspace]
+def create_workspace():
+    """
+    Creates a new, uniquely named workspace directory, so that concurrent requests never share their files.
+    Returns:
+        the absolute path to the workspace directory
+    """
+    workspace_dir = tempfile.mkdtemp(prefix=WORKSPACE_PREFIX)
+    logger.log(logging.DEBUG, f"Created workspace: {workspace_dir}")
+    return workspace_dir
+# [END create_workspace]
+
+
+# [START remove_workspace]
+def remove_workspace(workspace_dir):
+    """
+    Removes a workspace directory and all of its contents.
+    Args:
+        workspace_dir (string): the absolute path to the workspace directory
+    """
+    def set_write_permission(func, path, exc_info):
+        # files cloned by git can be read only, we need to set write permissions in order to delete them
+        os.chmod(path, stat.S_IWRITE)
+        func(path)
+
+    if os.path.isdir(workspace_dir):
+        shutil.rmtree(workspace_dir, onerror=set_write_permission)
+        logger.log(logging.DEBUG, f"Removed workspace: {workspace_dir}")
+# [END remove_workspace]
+
+
+# [START workspace]
+@contextlib.contextmanager
+def workspace():
+    """
+    Context manager which creates a workspace directory and removes it on exit.
+    Usage:
+        with workspace_service.workspace() as workspace_dir:
+            ...
+    """
+    workspace_dir = create_workspace()
+    try:
+        yield workspace_dir
+    finally:
+        remove_workspace(workspace_dir)
+# [END workspace]